@@ -0,0 +1,187 @@
+"""
+Pronóstico de consumo y de agotamiento por SKU sobre la historia de
+escaneos (requiere NumPy: se importa recién al usarlo, ver
+ScanLogger.forecast).
+
+    rows = lg.forecast(limit=50)
+    # (sku, product, stock, ma7, ma28, rate, days_left, runout) de lo que se acaba antes
+
+Consumo = lo que baja el nivel de un SKU (qty + fracción abierta) en cada
+output/set, con las reglas de step_stock: esa parte depende del estado de
+cada SKU y va escaneo por escaneo. La historia se lee en tramos de CHUNK
+filas pasadas a arrays por columna y se acumula en una matriz SKU x día de
+la ventana (WINDOW_DAYS); promedios móviles, tasa (EWMA) y fecha de
+agotamiento son operaciones sobre esa matriz.
+
+Incremental: la primera vez parte del stock al inicio de la ventana
+(replay.state_at, desde el snapshot más cercano) y lee solo la ventana;
+después, solo los escaneos con id > el último procesado. Un undo, un import
+o clear_all (eventos 'scans' delete/reload) fuerzan a recargar.
+"""
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from barcode_lib.db import replay
+from barcode_lib.db.logger import step_stock
+from barcode_lib.db.schema import MODE_ID
+
+WINDOW_DAYS = 90       # días de historia que entran en la tasa
+HALF_LIFE_DAYS = 14.0  # EWMA: el consumo de hace 14 días pesa la mitad que el de hoy
+CHUNK = 50_000         # filas por tramo de lectura
+DAY = 86400            # días por offset desde la medianoche local del origen (un cambio de horario corre 1 h)
+
+_NAMES = {i: m for m, i in MODE_ID.items()}
+_INPUT = MODE_ID["input"]
+
+def level(row) -> float:
+    """Nivel de una fila de stock: unidades cerradas + fracción abierta."""
+    if row is None:
+        return 0.0
+    qty, pct = row
+    pct = 100 if pct is None else int(pct)
+    return (qty or 0) + (pct / 100.0 if 0 < pct < 100 else 0.0)
+
+def _midnight(d: date) -> int:
+    return int(datetime(d.year, d.month, d.day).timestamp())
+
+# -------------------- Forecaster --------------------
+class Forecaster:
+    def __init__(self, lg, window_days: int = WINDOW_DAYS, half_life: float = HALF_LIFE_DAYS):
+        self.lg = lg
+        self.window = max(7, int(window_days))
+        self.half_life = half_life
+        self._lock = threading.Lock()
+        self._stale = True
+        lg.bus.subscribe(self._on_event)
+
+    def _on_event(self, ev):
+        _, topic, op, _key = ev
+        if topic == "scans" and op in ("delete", "reload"):
+            self._stale = True
+
+    # ---------- carga ----------
+    def _reset(self, today: date):
+        self.origin = today - timedelta(days=self.window - 1)
+        self._origin_ts = _midnight(self.origin)
+        self._rows: Dict[int, int] = {}                           # sku_id -> fila de la matriz
+        self._ids = np.zeros(0, dtype=np.int64)                   # fila -> sku_id
+        self._daily = np.zeros((0, self.window))                  # consumo por SKU y día
+        self._first = np.zeros(0, dtype=np.int64)                 # primer día con historia de cada fila
+        with self.lg.scans.snapshot() as conn:
+            self._state = replay.state_at(self.lg.scans, self._origin_ts - 1)
+            self._add_rows(np.fromiter(self._state, dtype=np.int64), first=0)  # ya tenían stock al empezar
+            start = conn.execute("SELECT MIN(id) FROM scan_log WHERE ts >= ?", (self._origin_ts,)).fetchone()[0]
+            self._last_id = conn.execute("SELECT MAX(id) FROM scan_log").fetchone()[0] or 0
+            if start is not None:
+                # desde el primer escaneo de la ventana por rowid; +ts descarta historia importada más vieja
+                self._consume(conn.execute(
+                    "SELECT id, sku_id, mode, ts, value FROM scan_log WHERE id >= ? AND +ts >= ? ORDER BY id",
+                    (start, self._origin_ts)))
+
+    def _update(self):
+        cur = self.lg.scans.execute("SELECT id, sku_id, mode, ts, value FROM scan_log WHERE id > ? ORDER BY id",
+                                    (self._last_id,))
+        self._consume(cur)
+
+    def _consume(self, cur):
+        state, get = self._state, self._state.get
+        while True:
+            chunk = cur.fetchmany(CHUNK)
+            if not chunk:
+                return
+            ids, skus, modes, ts, values = zip(*chunk)
+            amount = np.zeros(len(chunk))
+            for i, (sku, mode, value) in enumerate(zip(skus, modes, values)):
+                name = _NAMES.get(mode)
+                if name is None:
+                    continue
+                before = get(sku)
+                new, _ = step_stock(before, name, replay.parse_pct(value) if name == "set" else None)
+                if new is not None:
+                    state[sku] = new
+                    amount[i] = level(before) - level(new)
+            self._last_id = max(self._last_id, ids[-1])
+            day = (np.asarray(ts, dtype=np.int64) - self._origin_ts) // DAY
+            day -= self._slide(int(day.max()))
+            keep = day >= 0  # historia importada más vieja que la ventana
+            skus, day, amount = np.asarray(skus, dtype=np.int64)[keep], day[keep], amount[keep]
+            rows = self._row_of(skus, day)
+            # consumo: bajas de nivel de output/set (un input o un set que sube es reposición)
+            take = (amount > 0) & (np.asarray(modes, dtype=np.int64)[keep] != _INPUT)
+            np.add.at(self._daily, (rows[take], day[take]), amount[take])
+
+    def _add_rows(self, skus: np.ndarray, first):
+        n = len(self._ids)
+        for k, sku in enumerate(skus.tolist()):
+            self._rows[sku] = n + k
+        self._ids = np.concatenate([self._ids, skus])
+        self._daily = np.vstack([self._daily, np.zeros((len(skus), self.window))])
+        self._first = np.concatenate([self._first, np.broadcast_to(np.asarray(first, dtype=np.int64), len(skus))])
+
+    def _row_of(self, skus: np.ndarray, day: np.ndarray) -> np.ndarray:
+        """Fila de cada sku_id (agrega las nuevas) y actualiza el primer día con historia."""
+        uniq, inv = np.unique(skus, return_inverse=True)
+        new = np.array([s for s in uniq.tolist() if s not in self._rows], dtype=np.int64)
+        if len(new):
+            self._add_rows(new, first=self.window)
+        rows = np.fromiter((self._rows[s] for s in uniq.tolist()), dtype=np.int64, count=len(uniq))[inv]
+        np.minimum.at(self._first, rows, day)
+        return rows
+
+    def _slide(self, last_day: int) -> int:
+        """Corre la ventana si last_day (índice desde el origen) cae después del final; devuelve cuántos días."""
+        s = max(0, last_day - self.window + 1)
+        if s:
+            if s < self.window:
+                self._daily[:, :-s] = self._daily[:, s:]
+            self._daily[:, -s:] = 0
+            self._first = np.maximum(self._first - s, 0)
+            self.origin += timedelta(days=s)
+            self._origin_ts = _midnight(self.origin)
+        return s
+
+    # ---------- pronóstico ----------
+    def forecast(self, limit: int = 50, today: Optional[date] = None) -> List[Tuple[Any, ...]]:
+        """
+        SKUs con consumo en la ventana, primero los que se acaban antes:
+        (sku, product, stock, ma7, ma28, rate, days_left, runout). ma7/ma28 y
+        rate en unidades por día (sobre los días con historia del SKU);
+        days_left = stock / rate (0 si ya no queda), runout = fecha ISO.
+        """
+        today = today or date.today()
+        with self._lock:
+            if self._stale or today < getattr(self, "origin", today):
+                self._stale = False
+                self._reset(today)
+            else:
+                self._update()
+            self._slide((today - self.origin).days)
+            if not len(self._ids):
+                return []
+            t = (today - self.origin).days + 1   # columnas hasta hoy inclusive
+            daily, first = self._daily[:, :t], self._first
+            span = np.clip(t - first, 1, None)   # días con historia de cada SKU
+            ma7 = daily[:, -7:].sum(1) / np.minimum(span, 7)
+            ma28 = daily[:, -28:].sum(1) / np.minimum(span, 28)
+            w = 0.5 ** (np.arange(t - 1, -1, -1) / self.half_life)     # peso por antigüedad
+            seen = np.arange(t)[None, :] >= first[:, None]             # sin días antes del primer escaneo
+            rate = (daily * w).sum(1) / np.maximum((seen * w).sum(1), 1e-9)
+            ids = self._ids
+        stock = self._levels(ids)
+        active = np.flatnonzero(rate > 0)
+        days_left = np.maximum(stock[active], 0) / rate[active]
+        pick = np.argsort(days_left, kind="stable")[:limit]
+        info = self.lg.catalog.by_ids(ids[active[pick]].tolist())
+        out = []
+        for i, left in zip(active[pick].tolist(), days_left[pick].tolist()):
+            sku, product = info.get(int(ids[i]), (None, None))[:2]
+            out.append((sku, product, round(float(stock[i]), 2), round(float(ma7[i]), 3), round(float(ma28[i]), 3),
+                        round(float(rate[i]), 3), round(left, 1), (today + timedelta(days=int(left))).isoformat()))
+        return out
+
+    def _levels(self, ids: np.ndarray) -> np.ndarray:
+        """Nivel actual (stock en vivo, no el replay) de cada fila."""
+        cur = self.lg.stock.execute("SELECT sku_id, qty, percent FROM stock_level")
+        live = {sku: level((qty, pct)) for sku, qty, pct in cur}
+        return np.fromiter((live.get(s, 0.0) for s in ids.tolist()), dtype=float, count=len(ids))
@@ -0,0 +1,142 @@
+"""
+Benchmark de punta a punta: BarcodeReader._dispatch sobre DBs temporales.
+
+    python -m barcode_lib.bench.dispatch [--sizes 10000,100000,1000000] [--write-behind] [--out run.json]
+
+Por cada tamaño alimenta un flujo sintético (ráfagas de input/output, pares
+SKU + % en modo set y comandos de cambio de modo intercalados) y reporta en
+JSON: throughput, latencias p50/p95/p99 por modo, crecimiento de los .db,
+tiempos de rebuild_stock (sin y con checkpoints) y de Catalog.search.
+"""
+import os, sys, json, time, random, sqlite3, argparse, platform, tempfile, shutil, subprocess
+from array import array
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from barcode_lib.db.logger import ScanLogger
+from barcode_lib.db import replay
+from barcode_lib.reader import BarcodeReader
+from barcode_lib.bench.search import populate, QUERIES
+
+SIZES = (10_000, 100_000, 1_000_000)
+MIX = (("input", 0.55), ("output", 0.30), ("set", 0.15))
+SKU_RATIO = 0.05  # SKUs distintos por escaneo
+
+def offline_scrape(sku, force_refresh=False, session=None):
+    return None
+
+# -------------------- Flujo sintético --------------------
+def stream(n: int, n_skus: int, seed: int = 1) -> Iterator[Tuple[str, str]]:
+    """(modo, código) hasta completar n escaneos; los cambios de modo salen como ('command', modo)."""
+    rnd = random.Random(seed)
+    kinds, weights = zip(*MIX)
+    pick = lambda: f"780{int(n_skus * rnd.random() ** 2):010d}"  # sesgado: pocos SKUs muy frecuentes
+    mode, done = "input", 0
+    while done < n:
+        kind = rnd.choices(kinds, weights)[0]
+        if kind != mode:
+            mode = kind
+            yield "command", kind
+        for _ in range(min(rnd.randint(1, 20), n - done)):
+            yield kind, pick()
+            if kind == "set":
+                yield kind, f"{rnd.choice((0, 25, 50, 75))}%"
+            done += 1
+
+# -------------------- Medición --------------------
+def percentiles(samples) -> Dict[str, Any]:
+    lat = sorted(samples)
+    if not lat:
+        return {"count": 0}
+    pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000, 3)
+    return {"count": len(lat), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": pick(1.0)}
+
+def db_bytes(d: Path) -> int:
+    return sum(p.stat().st_size for p in d.iterdir() if p.name.endswith((".db", ".db-wal", ".journal")))
+
+def timed(fn, reps: int = 1) -> float:
+    t = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - t) / reps
+
+def run_size(n: int, write_behind: bool = False, sku_ratio: float = SKU_RATIO, seed: int = 1) -> Dict[str, Any]:
+    d = Path(tempfile.mkdtemp(prefix="bench-dispatch-"))
+    try:
+        lg = ScanLogger(db_dir=d, write_behind=write_behind, enrich_workers=1, scrape=offline_scrape)
+        n_skus = max(1, int(n * sku_ratio))
+        populate(lg.catalog, n_skus, seed)
+        reader = BarcodeReader(logger=lg)
+        for pool in (lg.scans, lg.stock, lg.catalog.db):
+            pool.checkpoint()
+        size0 = db_bytes(d)
+        lat: Dict[str, array] = {k: array("d") for k, _ in MIX + (("command", 0),)}
+        clock = time.perf_counter
+        with open(os.devnull, "w") as null, redirect_stdout(null):
+            t0 = clock()
+            for kind, code in stream(n, n_skus, seed):
+                t = clock()
+                reader._dispatch(code)
+                lat[kind].append(clock() - t)
+            lg.flush()
+            elapsed = clock() - t0
+        lg.enricher.join(30)
+        for pool in (lg.scans, lg.stock, lg.catalog.db):
+            pool.checkpoint()  # medir filas + índices, no el WAL que queda sin truncar
+        size1 = db_bytes(d)
+
+        live = dict((r[0], (r[6], r[7])) for r in lg.stock.execute("SELECT * FROM stock"))
+        with lg.scans.write() as c:
+            replay.drop_checkpoints(c)
+        cold = timed(lg.rebuild_stock)
+        warm = timed(lg.rebuild_stock)
+        rebuilt = dict((r[0], (r[6], r[7])) for r in lg.stock.execute("SELECT * FROM stock"))
+        search = {q: round(timed(lambda: lg.catalog.search(q, 200), 5) * 1000, 3) for q in QUERIES}
+        lg.close()
+        return {
+            "scans": n,
+            "skus": n_skus,
+            "dispatches": sum(len(v) for v in lat.values()),
+            "seconds": round(elapsed, 3),
+            "scans_per_s": round(n / elapsed, 1),
+            "latency_ms": {k: percentiles(v) for k, v in lat.items()},
+            "db_bytes": {"before": size0, "after": size1, "per_scan": round((size1 - size0) / n, 1)},
+            "rebuild_stock_s": {"cold": round(cold, 4), "warm": round(warm, 4)},
+            "rebuild_matches_live": rebuilt == live,
+            "search_ms": search,
+        }
+    finally:
+        shutil.rmtree(d, ignore_errors=True)
+
+def environment(write_behind: bool) -> Dict[str, Any]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=Path(__file__).parent, timeout=5).stdout.strip() or None
+    except Exception:
+        rev = None
+    return {"date": datetime.now().isoformat(timespec="seconds"), "git": rev,
+            "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(), "write_behind": write_behind}
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="python -m barcode_lib.bench.dispatch")
+    ap.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma separated scan counts")
+    ap.add_argument("--write-behind", action="store_true")
+    ap.add_argument("--sku-ratio", type=float, default=SKU_RATIO)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    args = ap.parse_args(argv)
+
+    result = {"env": environment(args.write_behind), "runs": []}
+    for n in (int(s) for s in args.sizes.split(",") if s.strip()):
+        print(f"{n} scans...", file=sys.stderr)
+        result["runs"].append(run_size(n, args.write_behind, args.sku_ratio, args.seed))
+    text = json.dumps(result, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Benchmark de Catalog.search: FTS5 rankeado vs LIKE por subcadena.
+
+    python -m barcode_lib.bench.search [N_ROWS]
+"""
+import sys, time, random, tempfile
+from pathlib import Path
+from barcode_lib.db.logger import Catalog
+
+WORDS = ["arroz", "azúcar", "fideos", "leche", "café", "té", "aceite", "harina", "galletas", "jugo",
+         "yogur", "mantequilla", "sal", "atún", "porotos", "lentejas", "jabón", "champú", "pañales", "vino"]
+BRANDS = ["Iansa", "Tucapel", "Carozzi", "Colun", "Soprole", "Nestlé", "Costa", "Watts", "Lucchetti", "Chef"]
+QUERIES = ["azucar", "cafe nestle", "atun", "78000000123", "7800000012345", "lentejas 1kg", "pan"]
+
+def populate(cat: Catalog, n: int, seed: int = 1):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        name = f"{rnd.choice(WORDS).title()} {rnd.choice(WORDS)} {rnd.randint(1, 5)}kg"
+        rows.append((f"780{i:010d}", name, rnd.choice(BRANDS), "Despensa", None, None,
+                     f"2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} 12:00:00"))
+    with cat.db.write() as c:
+        c.executemany("INSERT INTO products (sku,product,brand,category,image,url,updated_at) VALUES (?,?,?,?,?,?,?)", rows)
+
+def timeit(fn, reps: int) -> float:
+    t = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - t) / reps * 1000
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    cat = Catalog(Path(tempfile.mkdtemp()) / "catalog.db")
+    populate(cat, n)
+    print(f"{n} productos")
+    print(f"{'query':16} {'fts ms':>8} {'like ms':>8} {'hits':>5}")
+    for q in QUERIES:
+        fts = timeit(lambda: cat.search(q, 200), 20)
+        like = timeit(lambda: cat.search_like(q, 200), 5)
+        print(f"{q:16} {fts:8.2f} {like:8.2f} {len(cat.search(q, 200)):5}")
+
+if __name__ == "__main__":
+    main()
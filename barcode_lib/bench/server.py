@@ -0,0 +1,168 @@
+"""
+Prueba de carga del servidor de ingesta con muchas estaciones simuladas.
+
+    python -m barcode_lib.bench.server [--clients 50] [--scans 2000] [--http-clients 10] [--out run.json]
+
+Levanta un IngestServer en un hilo (DBs temporales, sin scraping) y conecta
+--clients estaciones TCP que mandan todas sus líneas con pipelining, más
+--http-clients estaciones que postean lotes a /scan sobre keep-alive. Cada
+estación usa sus propios SKUs y alterna input/output: al final el stock
+debe coincidir exactamente con lo que cada una mandó (si el modo de una
+estación se mezclara con el de otra, no coincidiría).
+"""
+import json, time, asyncio, argparse, tempfile, shutil, threading
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from barcode_lib.bench.dispatch import environment, offline_scrape, percentiles
+from barcode_lib.db.logger import ScanLogger
+from barcode_lib.server import IngestServer
+
+SKUS_PER_STATION = 10
+CHUNK = 64  # líneas por write del cliente TCP
+
+def start_background(srv: IngestServer) -> asyncio.AbstractEventLoop:
+    """Arranca srv en un event loop propio en un hilo daemon; devuelve ese loop."""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(srv.start())
+        ready.set()
+        loop.run_forever()
+        loop.close()
+
+    threading.Thread(target=run, daemon=True, name="ingest-loop").start()
+    ready.wait()
+    return loop
+
+def stop_background(srv: IngestServer, loop: asyncio.AbstractEventLoop):
+    asyncio.run_coroutine_threadsafe(srv.close(), loop).result(30)
+    loop.call_soon_threadsafe(loop.stop)
+
+def workload(name: str, scans: int) -> Tuple[List[str], Counter]:
+    """Códigos de una estación y el stock neto que deberían dejar."""
+    skus = [f"{name}-{k}" for k in range(SKUS_PER_STATION)]
+    n_in = scans * 3 // 4
+    ins = [skus[i % len(skus)] for i in range(n_in)]
+    outs = [skus[i % len(skus)] for i in range(scans - n_in)]
+    net = Counter(ins)
+    net.subtract(outs)
+    return ["input"] + ins + ["output"] + outs + ["input"], net
+
+# -------------------- Clientes --------------------
+async def tcp_station(port: int, name: str, codes: List[str], lat: List[float]) -> Counter:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    sent: deque = deque()
+    status: Counter = Counter()
+
+    async def send():
+        writer.write(f"STATION {name}\n".encode())
+        sent.append(time.perf_counter())
+        for i in range(0, len(codes), CHUNK):
+            chunk = codes[i:i + CHUNK]
+            now = time.perf_counter()
+            sent.extend([now] * len(chunk))
+            writer.write(("\n".join(chunk) + "\n").encode())
+            await writer.drain()  # backpressure del servidor
+
+    task = asyncio.create_task(send())
+    for _ in range(len(codes) + 1):
+        line = await reader.readline()
+        lat.append(time.perf_counter() - sent.popleft())
+        status[line.split(b" ", 1)[0].decode()] += 1
+    await task
+    writer.write(b"QUIT\n")
+    writer.close()
+    return status
+
+async def http_station(port: int, name: str, codes: List[str], batch: int, lat: List[float]) -> Counter:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    status: Counter = Counter()
+    for i in range(0, len(codes), batch):
+        body = json.dumps({"station": name, "codes": codes[i:i + batch]}).encode()
+        t = time.perf_counter()
+        writer.write(b"POST /scan HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+                     b"Content-Length: %d\r\n\r\n" % len(body) + body)
+        await writer.drain()
+        await reader.readline()
+        size = 0
+        while True:
+            h = await reader.readline()
+            if h in (b"\r\n", b""):
+                break
+            if h.lower().startswith(b"content-length:"):
+                size = int(h.split(b":")[1])
+        payload = json.loads(await reader.readexactly(size))
+        lat.append(time.perf_counter() - t)
+        status.update(r["status"] for r in payload["results"])
+    writer.close()
+    return status
+
+# -------------------- Medición --------------------
+def run(clients: int = 50, scans: int = 2000, http_clients: int = 10, http_batch: int = 100) -> Dict[str, Any]:
+    d = Path(tempfile.mkdtemp(prefix="bench-server-"))
+    lg = ScanLogger(db_dir=d, enrich_workers=1, scrape=offline_scrape)
+    srv = IngestServer(lg, port=0, http_port=0)
+    loop = start_background(srv)
+    try:
+        tcp_lat: List[float] = []
+        http_lat: List[float] = []
+        expected: Counter = Counter()
+        jobs = []
+        for i in range(clients):
+            codes, net = workload(f"T{i:03d}", scans)
+            expected.update(net)
+            jobs.append((tcp_station, (srv.port, f"T{i:03d}", codes, tcp_lat)))
+        for i in range(http_clients):
+            codes, net = workload(f"H{i:03d}", scans)
+            expected.update(net)
+            jobs.append((http_station, (srv.http_port, f"H{i:03d}", codes, http_batch, http_lat)))
+
+        async def all_clients():
+            return await asyncio.gather(*(fn(*args) for fn, args in jobs))
+
+        t0 = time.perf_counter()
+        statuses = asyncio.run(all_clients())
+        elapsed = time.perf_counter() - t0
+        stop_background(srv, loop)
+        lg.flush()
+        stock = dict(lg.stock.execute("SELECT sku, qty FROM stock").fetchall())
+        total = sum(statuses, Counter())
+        n = (clients + http_clients) * scans
+        return {
+            "clients": {"tcp": clients, "http": http_clients, "http_batch": http_batch},
+            "scans": n,
+            "seconds": round(elapsed, 3),
+            "scans_per_s": round(n / elapsed, 1),
+            "status": dict(total),
+            "tcp_line_latency_ms": percentiles(tcp_lat),
+            "http_request_latency_ms": percentiles(http_lat),
+            "batch_ms": {"count": srv._batch_hist.count,
+                         "p50": round((srv._batch_hist.quantile(0.5) or 0) * 1000, 3),
+                         "p99": round((srv._batch_hist.quantile(0.99) or 0) * 1000, 3)},
+            "stock_matches": stock == {k: v for k, v in expected.items() if v},
+        }
+    finally:
+        lg.close()
+        shutil.rmtree(d, ignore_errors=True)
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="python -m barcode_lib.bench.server")
+    ap.add_argument("--clients", type=int, default=50, help="estaciones TCP concurrentes")
+    ap.add_argument("--scans", type=int, default=2000, help="escaneos por estación")
+    ap.add_argument("--http-clients", type=int, default=10)
+    ap.add_argument("--http-batch", type=int, default=100, help="códigos por POST /scan")
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    args = ap.parse_args(argv)
+    result = {"env": environment(False),
+              "server": run(args.clients, args.scans, args.http_clients, args.http_batch)}
+    text = json.dumps(result, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
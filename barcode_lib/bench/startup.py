@@ -0,0 +1,77 @@
+"""
+Benchmark de arranque: cuánto tarda una estación --no-gui en quedar lista para escanear.
+
+    python -m barcode_lib.bench.startup [RUNS] [--out run.json]
+
+Lanza `python -m barcode_lib.main --no-gui` contra DBs temporales y mide
+desde el spawn hasta la línea "Barcode reader ready". Como referencia mide
+también un `python -c pass` (costo fijo del intérprete y de site) y qué
+módulos pesados quedaron cargados al estar listo.
+"""
+import os, sys, json, time, tempfile, shutil, subprocess, argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from barcode_lib.bench.dispatch import environment
+
+READY = "Barcode reader ready"
+HEAVY = ("tkinter", "PIL", "requests", "bs4", "tabulate", "concurrent.futures.process", "barcode_lib.gui")
+PROBE = ("import sys, time; t=time.perf_counter(); from barcode_lib import main; from barcode_lib.db.logger import ScanLogger; "
+         "i=time.perf_counter(); r=main.BarcodeReader(logger=ScanLogger(db_dir=sys.argv[1])); d=time.perf_counter(); "
+         "print(round((i-t)*1000, 2), round((d-i)*1000, 2), ','.join(m for m in %r if m in sys.modules))" % (HEAVY,))
+
+def stats(xs: List[float]) -> Dict[str, float]:
+    xs = sorted(xs)
+    return {"min": round(xs[0], 1), "p50": round(xs[len(xs) // 2], 1), "max": round(xs[-1], 1)}
+
+def spawn_ready(args: List[str], cwd: Path) -> float:
+    t = time.perf_counter()
+    p = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                         text=True, cwd=cwd)
+    for line in p.stdout:
+        if READY in line:
+            break
+    ms = (time.perf_counter() - t) * 1000
+    p.stdin.write("exit\n"); p.stdin.close()
+    p.wait(10)
+    return ms
+
+def run(runs: int = 10) -> Dict[str, Any]:
+    root = Path(__file__).resolve().parents[2]
+    d = Path(tempfile.mkdtemp(prefix="bench-startup-"))
+    try:
+        spawn_ready([sys.executable, "-m", "barcode_lib.main", "--no-gui", "--db-dir", str(d)], root)  # crea las DBs
+        ready = [spawn_ready([sys.executable, "-m", "barcode_lib.main", "--no-gui", "--db-dir", str(d)], root)
+                 for _ in range(runs)]
+        base = []
+        for _ in range(runs):
+            t = time.perf_counter()
+            subprocess.run([sys.executable, "-c", "pass"], check=True)
+            base.append((time.perf_counter() - t) * 1000)
+        out = subprocess.run([sys.executable, "-c", PROBE, str(d)], capture_output=True, text=True,
+                             cwd=root, check=True).stdout.split()
+        return {
+            "runs": runs,
+            "ready_ms": stats(ready),
+            "interpreter_ms": stats(base),
+            "over_interpreter_ms": round(stats(ready)["p50"] - stats(base)["p50"], 1),
+            "import_ms": float(out[0]),
+            "init_ms": float(out[1]),
+            "heavy_modules_loaded": out[2].split(",") if len(out) > 2 else [],
+        }
+    finally:
+        shutil.rmtree(d, ignore_errors=True)
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="python -m barcode_lib.bench.startup")
+    ap.add_argument("runs", nargs="?", type=int, default=10)
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    args = ap.parse_args(argv)
+    result = {"env": environment(False), "startup": run(args.runs)}
+    text = json.dumps(result, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
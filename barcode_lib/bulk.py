@@ -0,0 +1,279 @@
+"""
+Import/export masivo de productos, stock y escaneos (CSV o JSONL, en streaming).
+
+    python -m barcode_lib.bulk import products feed.csv [--enrich]
+    python -m barcode_lib.bulk import scans historial.jsonl
+    python -m barcode_lib.bulk export stock stock.csv
+    python -m barcode_lib.bulk export scans - --format jsonl      # '-' = stdin/stdout
+
+Las filas se leen de a lotes de --batch y se escriben con executemany +
+INSERT ... ON CONFLICT DO UPDATE, una transacción por lote: memoria constante
+sin importar el tamaño del archivo. En productos las celdas vacías no pisan
+lo que ya hay en el catálogo.
+"""
+import sys, csv, json, time, argparse
+from datetime import datetime
+from itertools import chain, islice
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, List, Optional, TextIO
+from barcode_lib.db.logger import ScanLogger, _now, _clamp_pct
+from barcode_lib.db import archive, schema, search
+
+BATCH = 50_000
+PRODUCT_COLS = ("sku", "product", "brand", "category", "image", "url")
+STOCK_COLS = PRODUCT_COLS + ("qty", "percent")
+SCAN_COLS = ("id",) + PRODUCT_COLS + ("mode", "ts", "value")
+MODES = schema.MODES
+
+UPSERT_PRODUCT = """INSERT INTO products (sku,product,brand,category,image,url,updated_at)
+    VALUES (?,?,?,?,?,?,?)
+    ON CONFLICT(sku) DO UPDATE SET
+        product=COALESCE(excluded.product, product),
+        brand=COALESCE(excluded.brand, brand),
+        category=COALESCE(excluded.category, category),
+        image=COALESCE(excluded.image, image),
+        url=COALESCE(excluded.url, url),
+        updated_at=excluded.updated_at"""
+
+# productos que solo conoce el historial importado: no pisan lo que ya está en el catálogo
+ADOPT_PRODUCT = """INSERT OR IGNORE INTO products (sku,product,brand,category,image,url,updated_at)
+    VALUES (?,?,?,?,?,?,?)"""
+
+UPSERT_STOCK = """INSERT INTO stock_level (sku_id,qty,percent) VALUES (?,?,?)
+    ON CONFLICT(sku_id) DO UPDATE SET qty=excluded.qty, percent=excluded.percent"""
+
+INSERT_SCAN = "INSERT INTO scan_log (sku_id,mode,ts,value) VALUES (?,?,?,?)"
+
+# stock y scans: vistas de las lectoras (join con el catálogo, ver db/schema.py)
+EXPORTS = {
+    "products": (PRODUCT_COLS, "SELECT sku,product,brand,category,image,url FROM products ORDER BY sku"),
+    "stock": (STOCK_COLS, "SELECT sku,product,brand,category,image,url,qty,percent FROM stock ORDER BY sku"),
+    "scans": (SCAN_COLS, "SELECT id,sku,product,brand,category,image,url,mode,ts,value FROM scans ORDER BY id"),
+}
+
+# -------------------- Formatos --------------------
+def guess_format(path: str, fmt: Optional[str] = None) -> str:
+    if fmt:
+        return fmt
+    return "jsonl" if str(path).endswith((".jsonl", ".ndjson")) else "csv"
+
+def read_rows(f: TextIO, fmt: str) -> Iterator[Dict[str, Any]]:
+    if fmt == "jsonl":
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(f)
+
+def write_rows(f: TextIO, fmt: str, cols, rows: Iterable[tuple]) -> int:
+    n = 0
+    if fmt == "jsonl":
+        for r in rows:
+            f.write(json.dumps(dict(zip(cols, r)), ensure_ascii=False) + "\n")
+            n += 1
+    else:
+        w = csv.writer(f)
+        w.writerow(cols)
+        for r in rows:
+            w.writerow(r)
+            n += 1
+    return n
+
+def batches(rows: Iterable, size: int) -> Iterator[List]:
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _val(row: Dict[str, Any], key: str):
+    v = row.get(key)
+    if isinstance(v, str):
+        v = v.strip()
+    return None if v == "" else v  # celda vacía del CSV = NULL
+
+def _sku(row: Dict[str, Any]) -> Optional[str]:
+    v = _val(row, "sku")
+    return None if v is None else str(v)
+
+def _product(sku: str, row: Dict[str, Any], ts: str) -> Optional[tuple]:
+    # columnas de producto de la fila (None si vienen todas vacías)
+    info = tuple(_val(row, k) for k in PRODUCT_COLS[1:])
+    return (sku,) + info + (ts,) if any(v is not None for v in info) else None
+
+def _write_products(lg: ScanLogger, sql: str, rows: List[tuple]):
+    if rows:
+        with lg.catalog.db.write() as c:
+            c.executemany(sql, rows)
+
+# -------------------- Import --------------------
+def import_products(lg: ScanLogger, rows: Iterable[Dict[str, Any]], batch: int = BATCH) -> Dict[str, int]:
+    """
+    Si llega más de un lote completo, el índice FTS se suspende durante la
+    carga y se reconstruye una sola vez al final (mucho más barato que
+    mantenerlo fila a fila con los triggers).
+    """
+    n = skipped = 0
+    ts = _now()
+    suspended = False
+    try:
+        for chunk in batches(rows, batch):
+            vals = []
+            for r in chunk:
+                sku = _sku(r)
+                if sku is None:
+                    skipped += 1
+                    continue
+                vals.append((sku,) + tuple(_val(r, k) for k in PRODUCT_COLS[1:]) + (ts,))
+            with lg.catalog.db.write() as c:
+                if not suspended and len(chunk) == batch:
+                    search.suspend_fts(c)
+                    suspended = True
+                c.executemany(UPSERT_PRODUCT, vals)
+            n += len(vals)
+    finally:
+        if suspended:
+            with lg.catalog.db.write() as c:
+                search.ensure_fts(c)
+        lg.bus.publish("products", "reload")
+    return {"rows": n, "skipped": skipped}
+
+def import_stock(lg: ScanLogger, rows: Iterable[Dict[str, Any]], batch: int = BATCH) -> Dict[str, int]:
+    """
+    Fija qty/percent tal cual (no genera escaneos): un rebuild_stock posterior
+    vuelve a calcular el stock desde el historial de escaneos. Las columnas de
+    producto que traiga la fila se cargan en el catálogo (celdas vacías no pisan).
+    """
+    n = skipped = 0
+    ts = _now()
+    for chunk in batches(rows, batch):
+        vals, products = [], []
+        for r in chunk:
+            sku = _sku(r)
+            try:
+                qty = int(_val(r, "qty") or 0)
+                pct = _val(r, "percent")
+                pct = 100 if pct is None else _clamp_pct(pct)
+            except (TypeError, ValueError):
+                sku = None
+            if sku is None:
+                skipped += 1
+                continue
+            vals.append((sku, qty, pct))
+            products.append(_product(sku, r, ts))
+        _write_products(lg, UPSERT_PRODUCT, [p for p in products if p])
+        ids = lg.catalog.sku_ids(v[0] for v in vals)
+        with lg.stock.write() as c:
+            c.executemany(UPSERT_STOCK, ((ids[sku], qty, pct) for sku, qty, pct in vals))
+        n += len(vals)
+    with lg.scans.write() as c:
+        lg.undo.clear(c)  # las inversas guardadas ya no aplican sobre el stock importado
+    lg.bus.publish("products", "reload")
+    lg.bus.publish("stock", "reload")
+    return {"rows": n, "skipped": skipped}
+
+def import_scans(lg: ScanLogger, rows: Iterable[Dict[str, Any]], batch: int = BATCH,
+                 rebuild: bool = True) -> Dict[str, int]:
+    """
+    Agrega escaneos al final del historial (ids nuevos) y reconstruye el stock.
+    Los productos de las filas solo entran al catálogo si el SKU no estaba.
+    """
+    n = skipped = 0
+    now = _now()
+    for chunk in batches(rows, batch):
+        vals, products = [], {}
+        for r in chunk:
+            sku, mode = _sku(r), _val(r, "mode")
+            try:
+                ts = schema.epoch(_val(r, "ts"))
+            except ValueError:
+                sku = None
+            if sku is None or mode not in MODES:
+                skipped += 1
+                continue
+            vals.append((sku, schema.MODE_ID[mode], ts, _val(r, "value")))
+            products[sku] = _product(sku, r, now) or products.get(sku)
+        _write_products(lg, ADOPT_PRODUCT, [p for p in products.values() if p])
+        ids = lg.catalog.sku_ids(v[0] for v in vals)
+        with lg.scans.write() as c:
+            c.executemany(INSERT_SCAN, ((ids[v[0]],) + v[1:] for v in vals))
+        n += len(vals)
+    lg.bus.publish("products", "reload")
+    lg.bus.publish("scans", "reload")
+    if rebuild and n:
+        lg.rebuild_stock()
+    return {"rows": n, "skipped": skipped}
+
+IMPORTS = {"products": import_products, "stock": import_stock, "scans": import_scans}
+
+def enrich_missing(lg: ScanLogger) -> int:
+    """Encola el autocompletado de los productos sin nombre (enriquecimiento diferido)."""
+    n = 0
+    for (sku,) in lg.catalog.db.execute("SELECT sku FROM products WHERE product IS NULL OR product=''"):
+        lg.queue_enrich(sku)
+        n += 1
+    return n
+
+# -------------------- Export --------------------
+def _archived_scans(lg: ScanLogger) -> Iterator[tuple]:
+    """Escaneos ya archivados (db/archive.py), con las columnas del export de scans."""
+    for chunk in batches(archive.iter_all(lg.scans, archive.directory(lg.scans)), BATCH):
+        info = lg.catalog.by_ids({int(r["sku_id"]) for r in chunk})
+        for r in chunk:
+            product = info.get(int(r["sku_id"]), (r["sku"],) + (None,) * 5)[1:]
+            ts = datetime.fromtimestamp(int(r["ts"])).strftime("%Y-%m-%d %H:%M:%S")
+            yield (int(r["id"]), r["sku"]) + product + (r["mode"], ts, r["value"] or None)
+
+def export_table(lg: ScanLogger, table: str, f: TextIO, fmt: str) -> int:
+    cols, sql = EXPORTS[table]
+    pool = {"products": lg.catalog.db, "stock": lg.stock, "scans": lg.scans}[table]
+    rows = pool.execute(sql)
+    if table == "scans":  # la historia completa: lo archivado y después lo que sigue en scan_log
+        rows = chain(_archived_scans(lg), rows)
+    return write_rows(f, fmt, cols, rows)
+
+# -------------------- CLI --------------------
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="python -m barcode_lib.bulk", description="Bulk import/export (CSV/JSONL).")
+    ap.add_argument("action", choices=("import", "export"))
+    ap.add_argument("table", choices=tuple(EXPORTS))
+    ap.add_argument("path", help="file, or '-' for stdin/stdout")
+    ap.add_argument("--format", choices=("csv", "jsonl"), help="default: by file extension (csv)")
+    ap.add_argument("--batch", type=int, default=BATCH, help="rows per transaction")
+    ap.add_argument("--enrich", action="store_true", help="after a products import, autofill the rows without a name")
+    ap.add_argument("--no-rebuild", action="store_true", help="scans import: do not rebuild stock")
+    ap.add_argument("--db-dir", type=Path, help="directory with the .db files")
+    args = ap.parse_args(argv)
+
+    fmt = guess_format(args.path, args.format)
+    lg = ScanLogger(db_dir=args.db_dir)
+    t0 = time.perf_counter()
+    try:
+        if args.action == "export":
+            out = sys.stdout if args.path == "-" else open(args.path, "w", encoding="utf-8", newline="")
+            try:
+                n = export_table(lg, args.table, out, fmt)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            print(f"Exported {n} {args.table} rows in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+            return
+        src = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8-sig", newline="")
+        try:
+            kw = {"rebuild": not args.no_rebuild} if args.table == "scans" else {}
+            res = IMPORTS[args.table](lg, read_rows(src, fmt), batch=args.batch, **kw)
+        finally:
+            if src is not sys.stdin:
+                src.close()
+        print(f"Imported {res['rows']} {args.table} rows ({res['skipped']} skipped) "
+              f"in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+        if args.enrich and args.table == "products":
+            queued = enrich_missing(lg)
+            print(f"Enriching {queued} products...", file=sys.stderr)
+            lg.enricher.join()
+    finally:
+        lg.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 def enable_sound(reader): 
-    print('[Config] Sound enabled')
+    reader.say('[Config] Sound enabled')
 
 def disable_sound(reader):
-    print('[Config] Sound disabled')
+    reader.say('[Config] Sound disabled')
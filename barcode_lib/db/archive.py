@@ -0,0 +1,220 @@
+"""
+Compactación de la historia de escaneos: lo anterior a la ventana de
+retención sale de scan_log a archivos .csv.gz de solo agregado y queda
+resumido por SKU y día en scan_daily.
+
+    python -m barcode_lib.db.archive [--db-dir DIR] [--retention-days 365]
+
+Se archiva siempre un prefijo por id: hasta el último escaneo anterior al
+primero que cae dentro de la ventana (un import con fechas viejas llega con
+ids nuevos y espera su turno) y nunca un escaneo que undo/redo todavía
+pueden tocar. Antes de borrar se guarda un snapshot de stock en el borde,
+así rebuild_stock y stock_as_of siguen partiendo de ahí; si faltara (o para
+un instante anterior al borde) replay.py lee los archivos.
+
+Cada archivo cubre un tramo de ids y se escribe completo (nombre temporal +
+rename) antes de la transacción que lo anota en archive_files, suma el tramo
+a scan_daily y borra las filas: un corte en el medio deja a lo sumo un
+archivo huérfano que la pasada siguiente reescribe. Una transacción por
+tramo de ARCHIVE_ROWS filas: el escaneo en vivo espera unos ms como mucho.
+
+Columnas de los archivos: id, sku_id, sku, mode, ts (epoch), value; se
+pueden importar de vuelta con bulk (import scans).
+"""
+import os, sys, csv, gzip, time, argparse, threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from barcode_lib.db import replay
+from barcode_lib.db.schema import MODES, MODE_ID, epoch
+
+RETENTION_DAYS = 365     # historia que queda en scan_log
+MIN_RETENTION_DAYS = 120  # > ventana de analytics.WINDOW_DAYS: el pronóstico lee solo scan_log
+ARCHIVE_ROWS = 20_000    # filas por archivo (y por transacción)
+ARCHIVE_POLL = 3600.0    # s entre pasadas del hilo
+
+COLS = ("id", "sku_id", "sku", "mode", "ts", "value")
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS archive_files (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        first_id INTEGER NOT NULL,
+        last_id INTEGER NOT NULL,
+        min_ts INTEGER,
+        max_ts INTEGER,
+        rows INTEGER NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_archive_files_last ON archive_files(last_id)",
+    # escaneos archivados por SKU y día local ('YYYY-MM-DD')
+    """CREATE TABLE IF NOT EXISTS scan_daily (
+        sku_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        inputs INTEGER NOT NULL DEFAULT 0,
+        outputs INTEGER NOT NULL DEFAULT 0,
+        sets INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (sku_id, day)
+    ) WITHOUT ROWID""",
+)
+
+def directory(pool) -> Path:
+    """Carpeta de los archivos: archive/ junto a scans.db."""
+    return Path(pool.path).parent / "archive"
+
+def boundary(conn) -> int:
+    """Último id archivado (0 si no hay nada archivado)."""
+    return conn.execute("SELECT MAX(last_id) FROM archive_files").fetchone()[0] or 0
+
+def _day(ts: int) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+# -------------------- lectura --------------------
+def rows(conn, folder: Path, after_id: int, upto_id: int,
+         upto_ts: Optional[int] = None) -> Iterator[Tuple[int, int, Optional[str]]]:
+    """(sku_id, mode, value) archivados con after_id < id <= upto_id (y ts <= upto_ts), en orden de id."""
+    files = conn.execute("SELECT name FROM archive_files WHERE last_id > ? AND first_id <= ? ORDER BY first_id",
+                         (after_id, upto_id)).fetchall()
+    for (name,) in files:
+        for r in read_file(folder / name):
+            i, ts = int(r["id"]), int(r["ts"])
+            if after_id < i <= upto_id and (upto_ts is None or ts <= upto_ts):
+                yield int(r["sku_id"]), MODE_ID.get(r["mode"], 0), r["value"] or None
+
+def read_file(path: Path) -> Iterator[Dict[str, str]]:
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+def iter_all(conn, folder: Path) -> Iterator[Dict[str, str]]:
+    """Todas las filas archivadas, en orden de id (export de la historia completa)."""
+    for (name,) in conn.execute("SELECT name FROM archive_files ORDER BY first_id").fetchall():
+        yield from read_file(folder / name)
+
+# -------------------- compactación --------------------
+def cutoff(conn, before_ts: int) -> int:
+    """Último id del prefijo archivable: escaneos anteriores a before_ts que undo/redo ya no alcanzan."""
+    first_kept = conn.execute("SELECT MIN(id) FROM scan_log WHERE ts >= ?", (before_ts,)).fetchone()[0]
+    upto = (first_kept - 1) if first_kept is not None else (
+        conn.execute("SELECT MAX(id) FROM scan_log").fetchone()[0] or 0)
+    undo = conn.execute("SELECT MIN(scan_id) FROM undo_log WHERE scan_id IS NOT NULL").fetchone()[0]
+    return upto if undo is None else min(upto, undo - 1)
+
+def _write_file(folder: Path, rows: List[tuple]) -> Tuple[str, int, int]:
+    name = f"scans-{rows[0][0]:012d}-{rows[-1][0]:012d}.csv.gz"
+    tmp = folder / (name + ".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(COLS)
+        for i, sku_id, sku, mode, ts, value in rows:
+            w.writerow((i, sku_id, sku, MODES[mode - 1] if 1 <= mode <= len(MODES) else "", ts, value))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, folder / name)
+    ts = [r[4] for r in rows]
+    return name, min(ts), max(ts)
+
+def _daily(rows: List[tuple]) -> List[tuple]:
+    acc: Dict[Tuple[int, str], List[int]] = {}
+    for _, sku_id, _, mode, ts, _ in rows:
+        c = acc.setdefault((sku_id, _day(ts)), [0, 0, 0])
+        if 1 <= mode <= 3:
+            c[mode - 1] += 1
+    return [k + tuple(v) for k, v in acc.items()]
+
+def compact(pool, retention_days: float = RETENTION_DAYS, batch: int = ARCHIVE_ROWS,
+            now: Optional[int] = None, halt: Optional[threading.Event] = None) -> int:
+    """Archiva lo anterior a la ventana de retención; devuelve cuántos escaneos movió."""
+    days = max(MIN_RETENTION_DAYS, float(retention_days))
+    upto = cutoff(pool, (now or epoch()) - int(days * 86400))
+    last = boundary(pool)
+    if upto <= last:
+        return 0
+    # snapshot en el borde: rebuild_stock/stock_as_of no necesitan leer lo archivado
+    replay.replay(pool, upto_id=upto)
+    folder = directory(pool)
+    folder.mkdir(parents=True, exist_ok=True)
+    moved = 0
+    while last < upto and not (halt and halt.is_set()):
+        # lectora (adjunta catalog.db): el sku en texto hace al archivo legible/importable por sí solo
+        chunk = pool.execute(
+            """SELECT s.id, s.sku_id, k.sku, s.mode, s.ts, s.value FROM scan_log s
+               LEFT JOIN catalog.skus k ON k.id = s.sku_id
+               WHERE s.id > ? AND s.id <= ? ORDER BY s.id LIMIT ?""",
+            (last, upto, batch)).fetchall()
+        if not chunk:
+            break
+        hi = upto if len(chunk) < batch else chunk[-1][0]
+        name, min_ts, max_ts = _write_file(folder, chunk)
+        with pool.write() as c:
+            # entre la lectura y acá solo pudo cambiar el tramo un clear_all: entonces no se archiva nada
+            if c.execute("SELECT COUNT(*) FROM scan_log WHERE id > ? AND id <= ?", (last, hi)).fetchone()[0] != len(chunk):
+                break
+            c.execute("INSERT INTO archive_files (name, first_id, last_id, min_ts, max_ts, rows) VALUES (?,?,?,?,?,?)",
+                      (name, last + 1, hi, min_ts, max_ts, len(chunk)))
+            c.executemany(
+                """INSERT INTO scan_daily (sku_id, day, inputs, outputs, sets) VALUES (?,?,?,?,?)
+                   ON CONFLICT(sku_id, day) DO UPDATE SET inputs=inputs+excluded.inputs,
+                       outputs=outputs+excluded.outputs, sets=sets+excluded.sets""",
+                _daily(chunk))
+            c.execute("DELETE FROM scan_log WHERE id > ? AND id <= ?", (last, hi))
+        moved += len(chunk)
+        last = hi
+    return moved
+
+def clear(c, folder: Path) -> List[Path]:
+    """Dentro de la escritora de scans.db (clear_all): olvida lo archivado; devuelve los archivos a borrar tras el commit."""
+    names = [folder / r[0] for r in c.execute("SELECT name FROM archive_files")]
+    c.execute("DELETE FROM archive_files")
+    c.execute("DELETE FROM scan_daily")
+    return names
+
+# -------------------- hilo --------------------
+class Compactor(threading.Thread):
+    """Corre compact() cada `poll` segundos mientras ready() (sin migración en curso)."""
+    def __init__(self, scans_pool, retention_days: float = RETENTION_DAYS, poll: float = ARCHIVE_POLL,
+                 ready: Callable[[], bool] = lambda: True):
+        super().__init__(daemon=True, name="scan-archive")
+        self.pool = scans_pool
+        self.retention_days, self.poll = retention_days, poll
+        self.ready = ready
+        self.moved = 0
+        self.error: Optional[BaseException] = None
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.poll):
+            try:
+                self.compact()
+            except Exception as e:  # se reintenta en la próxima pasada
+                self.error = e
+
+    def compact(self) -> int:
+        if not self.ready():
+            return 0
+        n = compact(self.pool, self.retention_days, halt=self._halt)
+        self.moved += n
+        return n
+
+    def stop(self):
+        self._halt.set()
+        if self.is_alive():
+            self.join()
+
+# -------------------- CLI --------------------
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="python -m barcode_lib.db.archive")
+    ap.add_argument("--db-dir", type=Path, help="directory with the .db files (default barcode_lib/db)")
+    ap.add_argument("--retention-days", type=float, default=RETENTION_DAYS,
+                    help=f"days of history kept in scans.db (min {MIN_RETENTION_DAYS})")
+    args = ap.parse_args(argv)
+    from barcode_lib.db.logger import ScanLogger
+    lg = ScanLogger(db_dir=args.db_dir, enrich_workers=1, archive_retention_days=None)
+    t0 = time.perf_counter()
+    try:
+        lg._wait_migration()
+        n = compact(lg.scans, args.retention_days)
+    finally:
+        lg.close()
+    print(f"Archived {n} scans in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import time, threading
+from collections import deque
+from typing import Callable, Dict, Any, Optional, TYPE_CHECKING
+from barcode_lib import metrics
+if TYPE_CHECKING:
+    from barcode_lib.db.imagestore import ImageStore
+    from barcode_lib.web.http import HostRateLimiter
+
+FIELDS = ("product", "brand", "category", "image", "url")
+LATENCY_SAMPLES = 512  # ventana para percentiles de latencia
+CLOSE_TIMEOUT = 10.0   # close(): espera máxima a los lookups en vuelo
+
+# -------------------- Enrichment Pool --------------------
+class EnrichmentPool:
+    """
+    Workers de autocompletado de productos.
+
+      - un SKU se procesa una sola vez mientras está en cola o en vuelo
+        (12 escaneos seguidos del mismo producto = 1 lookup); un force que
+        llega durante un lookup normal se re-encola al terminar
+      - cada worker tiene su propia LimitedSession (keep-alive) y todas
+        comparten el rate limit por host
+      - stats(): profundidad de cola, en vuelo, coalescidos, latencias
+      - los hilos (y requests) arrancan con el primer submit, no al crear el pool
+      - con `images` (db/imagestore.py) la imagen encontrada se descarga al
+        almacén antes de guardar el producto; si falla queda la URL
+      - close(): descarta lo encolado, deja terminar lo que está en vuelo
+        (hasta `timeout`) y no acepta más; va antes de cerrar las DBs
+    """
+    def __init__(self, catalog, scrape: Callable, workers: int = 2,
+                 limiter: Optional["HostRateLimiter"] = None, images: Optional["ImageStore"] = None):
+        self.catalog = catalog
+        self.images = images
+        self.scrape = scrape
+        self.limiter = limiter
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._pending: Dict[str, bool] = {}    # en cola: sku -> force
+        self._inflight: Dict[str, bool] = {}   # en vuelo: sku -> re-encolar con force al terminar
+        self._latency = deque(maxlen=LATENCY_SAMPLES)
+        self._counts = {"submitted": 0, "coalesced": 0, "done": 0, "errors": 0}
+        self._threads = [threading.Thread(target=self._run, daemon=True, name=f"enrich-{i}")
+                         for i in range(max(1, int(workers)))]
+        self._started = False
+        self._closed = False
+
+    def submit(self, sku: str, force: bool = False) -> bool:
+        """Encola sku; False si se coalesció con un pedido ya pendiente."""
+        with self._cond:
+            if self._closed:
+                return False
+            if not self._started:
+                self._started = True
+                for t in self._threads:
+                    t.start()
+            self._counts["submitted"] += 1
+            if sku in self._pending:
+                self._pending[sku] = self._pending[sku] or force
+                self._counts["coalesced"] += 1
+                metrics.counter("enrich_coalesced_total").inc()
+                return False
+            if sku in self._inflight:
+                if force:
+                    self._inflight[sku] = True
+                self._counts["coalesced"] += 1
+                metrics.counter("enrich_coalesced_total").inc()
+                return False
+            self._pending[sku] = force
+            self._queue.append(sku)
+            self._cond.notify()
+            return True
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que no quede nada en cola ni en vuelo."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._inflight, timeout)
+
+    def close(self, timeout: Optional[float] = CLOSE_TIMEOUT) -> bool:
+        """Deja de tomar trabajo y espera a los workers; False si alguno sigue en vuelo al vencer timeout."""
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._pending.clear()  # se vuelven a pedir al escanearlos
+            self._cond.notify_all()
+            started = self._started
+        if not started:
+            return True
+        end = None if timeout is None else time.monotonic() + timeout
+        for t in self._threads:
+            t.join(None if end is None else max(0.0, end - time.monotonic()))
+        return not any(t.is_alive() for t in self._threads)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            lat = sorted(self._latency)
+            out = dict(self._counts, queued=len(self._pending), inflight=len(self._inflight),
+                       workers=len(self._threads))
+        pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000, 1) if lat else None
+        out["latency_ms"] = {"p50": pick(0.5), "p95": pick(0.95), "max": pick(1.0)}
+        return out
+
+    # ---------- internals ----------
+    def _run(self):
+        from barcode_lib.web.http import LimitedSession
+        session = LimitedSession(self.limiter) if self.limiter else LimitedSession()
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                sku = self._queue.popleft()
+                force = self._pending.pop(sku)
+                self._inflight[sku] = False
+            t0 = time.monotonic()
+            ok = True
+            try:
+                self._enrich(sku, force, session)
+            except Exception:
+                ok = False
+            dt = time.monotonic() - t0
+            metrics.histogram("enrich_seconds", "lookup + merge por SKU", outcome="ok" if ok else "error").observe(dt)
+            with self._cond:
+                self._latency.append(dt)
+                self._counts["done" if ok else "errors"] += 1
+                again = self._inflight.pop(sku)
+                if again and not self._closed:
+                    self._pending[sku] = True
+                    self._queue.append(sku)
+                self._cond.notify_all()
+
+    def _enrich(self, sku: str, force: bool, session):
+        if force:
+            self.catalog.invalidate(sku)  # refresco forzado: releer de la DB, no del LRU
+        info = self.catalog.get(sku)
+        if force or not info or not info.get("product"):
+            data = self.scrape(sku, force_refresh=force, session=session) or {}
+            merged = (info or {}).copy()
+            for k in FIELDS:
+                if not merged.get(k) and data.get(k):
+                    merged[k] = data[k]
+            if self.images is not None and merged.get("image"):
+                try:
+                    merged["image"] = self.images.ingest(merged["image"], session)  # ya en el almacén: igual
+                except ValueError:
+                    pass  # queda la URL: el adopt de imagestore la reintenta
+            self.catalog.upsert(sku, merged)
@@ -0,0 +1,75 @@
+import threading
+from collections import deque
+from typing import Callable, List, Optional, Tuple, Any
+
+# (version, topic, op, key)
+#   topic: "scans" | "stock" | "products"
+#   op:    "upsert" | "delete" | "reload"   (reload ⇒ key None, recargar la tabla entera)
+Event = Tuple[int, str, str, Any]
+
+EVENT_BACKLOG = 2048  # eventos retenidos para consumidores que van atrasados
+
+# -------------------- Change Bus --------------------
+class ChangeBus:
+    """
+    Bus de cambios a nivel de fila con versión monotónica. Los productores
+    (ScanLogger, Catalog) publican después de cada commit; la GUI guarda la
+    última versión vista y pide since(v) para aplicar solo los diffs.
+    """
+    def __init__(self, backlog: int = EVENT_BACKLOG):
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=backlog)
+        self._subs: List[Callable[[Event], None]] = []
+        self.version = 0
+
+    def publish(self, topic: str, op: str, key: Any = None) -> int:
+        with self._lock:
+            self.version += 1
+            ev = (self.version, topic, op, key)
+            self._events.append(ev)
+            subs = list(self._subs)
+        for fn in subs:
+            try:
+                fn(ev)
+            except Exception:
+                pass
+        return ev[0]
+
+    def publish_many(self, topic: str, op: str, keys) -> int:
+        v = self.version
+        for k in keys:
+            v = self.publish(topic, op, k)
+        return v
+
+    def subscribe(self, fn: Callable[[Event], None]):
+        with self._lock:
+            self._subs.append(fn)
+
+    def since(self, version: int) -> Tuple[int, Optional[List[Event]]]:
+        """(versión actual, eventos > version); None si ya se perdieron (hay que recargar todo)."""
+        with self._lock:
+            current = self.version
+            if version >= current:
+                return current, []
+            if not self._events or self._events[0][0] > version + 1:
+                return current, None
+            return current, [e for e in self._events if e[0] > version]
+
+class DataVersionWatch:
+    """
+    Detecta commits de otros procesos (p.ej. un import masivo) con
+    PRAGMA data_version sobre la conexión escritora del pool: solo cambia
+    cuando escribe otra conexión.
+    """
+    def __init__(self, pool, bus: ChangeBus, topics: Tuple[str, ...]):
+        self.pool, self.bus, self.topics = pool, bus, topics
+        self._last = pool.data_version()
+
+    def poll(self) -> bool:
+        v = self.pool.data_version()
+        if v is None or v == self._last:
+            return False
+        self._last = v
+        for t in self.topics:
+            self.bus.publish(t, "reload")
+        return True
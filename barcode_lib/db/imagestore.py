@@ -0,0 +1,265 @@
+"""
+Almacén de imágenes por contenido: cada imagen (subida desde el diálogo Add
+o traída por el enrichment) se copia una vez a IMAGE_DIR con su sha256 como
+nombre y products.image pasa a ser la referencia "sha256:<hex>". Dos
+productos con la misma foto comparten el archivo; mostrarla ya no depende
+del archivo original ni de la red.
+
+    <images>/orig/ab/<hex>.jpg       tal cual se subió/descargó
+    <images>/display/ab/<hex>.jpg    entra en DISPLAY_SIZE, fondo blanco
+    <images>/thumb/ab/<hex>.png      exactamente THUMB_SIZE (centrada, transparente)
+
+Las variantes se generan en un pool de procesos (spawn, Pillow fuera del
+GIL); hasta que están, path() devuelve el original. image_sources recuerda
+qué URL dio qué hash: la misma URL no se vuelve a descargar.
+
+    python -m barcode_lib.db.imagestore [--db-dir DIR]
+
+pasa al almacén las imágenes de products que todavía son rutas o URLs.
+"""
+import io, os, sys, hashlib, argparse, threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+REF_PREFIX = "sha256:"
+THUMB_SIZE = (260, 260)    # el de thumbs.ThumbnailLoader: la miniatura va directo a PhotoImage
+DISPLAY_SIZE = (800, 800)
+MAX_BYTES = 20 * 1024 * 1024   # tope de una imagen subida/descargada
+FETCH_TIMEOUT = 10
+RENDER_WORKERS = 2
+
+# variante -> (tamaño, formato, extensión)
+VARIANTS: Dict[str, Tuple[Tuple[int, int], str, str]] = {
+    "display": (DISPLAY_SIZE, "JPEG", "jpg"),
+    "thumb": (THUMB_SIZE, "PNG", "png"),
+}
+_EXT = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp", "BMP": "bmp", "TIFF": "tif"}
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS image_blobs (
+        hash TEXT PRIMARY KEY,
+        ext TEXT NOT NULL,
+        bytes INTEGER NOT NULL,
+        width INTEGER,
+        height INTEGER,
+        added_at TEXT
+    ) WITHOUT ROWID""",
+    # URL -> hash (los archivos locales se vuelven a hashear: pueden cambiar)
+    """CREATE TABLE IF NOT EXISTS image_sources (
+        source TEXT PRIMARY KEY,
+        hash TEXT NOT NULL
+    ) WITHOUT ROWID""",
+)
+
+def is_ref(src) -> bool:
+    return isinstance(src, str) and src.startswith(REF_PREFIX)
+
+def _is_url(src: str) -> bool:
+    return src.startswith(("http://", "https://"))
+
+def _save(im, path: Path, fmt: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    im.save(tmp, fmt, **({"quality": 85, "optimize": True} if fmt == "JPEG" else {}))
+    os.replace(tmp, path)
+
+def make_variants(src: str, outputs: Dict[str, str]) -> str:
+    """En un proceso del pool: variante -> ruta de salida, a partir del original `src`."""
+    from PIL import Image, ImageOps
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im).convert("RGBA")
+    for name, out in outputs.items():
+        size, fmt, _ = VARIANTS[name]
+        fit = im.copy()
+        fit.thumbnail(size, Image.LANCZOS)
+        if fmt == "JPEG":
+            canvas = Image.new("RGB", fit.size, "white")
+            canvas.paste(fit, mask=fit.getchannel("A"))
+        else:
+            canvas = Image.new("RGBA", size, (0, 0, 0, 0))
+            canvas.paste(fit, ((size[0] - fit.width) // 2, (size[1] - fit.height) // 2))
+        _save(canvas, Path(out), fmt)
+    return src
+
+# -------------------- ImageStore --------------------
+class ImageStore:
+    def __init__(self, root: Path, catalog, workers: int = RENDER_WORKERS):
+        self.root = Path(root)
+        self.catalog = catalog
+        self.workers = max(1, int(workers))
+        self._pool: Optional["ProcessPoolExecutor"] = None  # arranca con el primer render
+        self._pending: Dict[str, "Future"] = {}            # hash -> render en curso
+        self._lock = threading.Lock()
+
+    # ---------- rutas ----------
+    def _path(self, kind: str, h: str, ext: str) -> Path:
+        return self.root / kind / h[:2] / f"{h}.{ext}"
+
+    def _original(self, h: str) -> Optional[Path]:
+        row = self.catalog.db.execute("SELECT ext FROM image_blobs WHERE hash=?", (h,)).fetchone()
+        return self._path("orig", h, row[0]) if row else None
+
+    def path(self, ref: str, variant: str = "thumb") -> Optional[Path]:
+        """Archivo local de la variante (el original mientras se genera); None si ref no es del almacén."""
+        if not is_ref(ref):
+            return None
+        h = ref[len(REF_PREFIX):]
+        out = self._path(variant, h, VARIANTS[variant][2])
+        if out.exists():
+            return out
+        self.render(h)
+        return self._original(h)
+
+    # ---------- alta ----------
+    def ingest(self, src: str, session=None) -> str:
+        """Copia (o descarga) src al almacén y devuelve su referencia; ValueError si no es una imagen."""
+        if is_ref(src):
+            return src
+        src = str(src).strip()
+        if _is_url(src):
+            row = self.catalog.db.execute("SELECT hash FROM image_sources WHERE source=?", (src,)).fetchone()
+            if row and self._original(row[0]):
+                self.render(row[0])
+                return REF_PREFIX + row[0]
+        data = self._read(src, session)
+        h = hashlib.sha256(data).hexdigest()
+        ext, width, height = self._probe(data, src)
+        orig = self._path("orig", h, ext)
+        if not orig.exists():
+            orig.parent.mkdir(parents=True, exist_ok=True)
+            tmp = orig.with_name(orig.name + ".tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, orig)
+        with self.catalog.db.write() as c:
+            c.execute("INSERT OR IGNORE INTO image_blobs (hash, ext, bytes, width, height, added_at) VALUES (?,?,?,?,?,?)",
+                      (h, ext, len(data), width, height, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            if _is_url(src):
+                c.execute("INSERT OR REPLACE INTO image_sources (source, hash) VALUES (?,?)", (src, h))
+        self.render(h)
+        return REF_PREFIX + h
+
+    @staticmethod
+    def _read(src: str, session=None) -> bytes:
+        try:
+            if _is_url(src):
+                if session is None:
+                    import requests
+                    session = requests
+                r = session.get(src, timeout=FETCH_TIMEOUT)
+                r.raise_for_status()
+                data = r.content
+            else:
+                with open(src, "rb") as f:
+                    data = f.read(MAX_BYTES + 1)
+        except Exception as e:
+            raise ValueError(f"cannot read image {src}: {e}") from e
+        if len(data) > MAX_BYTES:
+            raise ValueError(f"image too large: {src}")
+        return data
+
+    @staticmethod
+    def _probe(data: bytes, src: str) -> Tuple[str, int, int]:
+        from PIL import Image
+        try:
+            with Image.open(io.BytesIO(data)) as im:
+                fmt, (w, h) = im.format, im.size
+                im.verify()
+        except Exception as e:
+            raise ValueError(f"not an image: {src}") from e
+        return _EXT.get(fmt, (fmt or "bin").lower()), w, h
+
+    # ---------- variantes ----------
+    def render(self, h: str) -> Optional["Future"]:
+        """Genera en segundo plano las variantes que falten de h (una sola vez aunque se pida varias)."""
+        outputs = {name: str(self._path(name, h, ext)) for name, (_, _, ext) in VARIANTS.items()
+                   if not self._path(name, h, ext).exists()}
+        if not outputs:
+            return None
+        with self._lock:
+            fut = self._pending.get(h)
+            if fut is not None:
+                return fut
+            orig = self._original(h)
+            if orig is None:
+                return None
+            fut = self._executor().submit(make_variants, str(orig), outputs)
+            self._pending[h] = fut
+        fut.add_done_callback(lambda f, h=h: self._done(h))
+        return fut
+
+    def _executor(self) -> "ProcessPoolExecutor":
+        # con self._lock tomado; el pool (y multiprocessing) no se cargan al arrancar
+        if self._pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _done(self, h: str):
+        with self._lock:
+            self._pending.pop(h, None)
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Espera los renders en curso; False si alguno falló o no terminó a tiempo."""
+        with self._lock:
+            futs = list(self._pending.values())
+        ok = True
+        for f in futs:
+            try:
+                f.result(timeout)
+            except Exception:
+                ok = False
+        return ok
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    # ---------- catálogo ----------
+    def adopt(self, session=None) -> Tuple[int, int]:
+        """Pasa al almacén las imágenes de products que son rutas o URLs; (movidas, fallidas)."""
+        rows = self.catalog.db.execute(
+            "SELECT sku, image FROM products WHERE image IS NOT NULL AND image != '' AND image NOT LIKE ?",
+            (REF_PREFIX + "%",)).fetchall()
+        done = failed = 0
+        for sku, src in rows:
+            try:
+                ref = self.ingest(src, session)
+            except ValueError:
+                failed += 1
+                continue
+            if self.replace(sku, src, ref):
+                done += 1
+        return done, failed
+
+    def replace(self, sku: str, old: str, ref: str) -> bool:
+        """products.image old -> ref, solo si nadie la cambió mientras tanto."""
+        with self.catalog.db.write() as c:
+            n = c.execute("UPDATE products SET image=? WHERE sku=? AND image=?", (ref, sku, old)).rowcount
+        if n:
+            self.catalog.bus.publish("products", "upsert", sku)
+        return bool(n)
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m barcode_lib.db.imagestore")
+    ap.add_argument("--db-dir", type=Path, help="directory with the .db files (default barcode_lib/db)")
+    args = ap.parse_args(argv)
+    from barcode_lib.db.logger import ScanLogger
+    lg = ScanLogger(db_dir=args.db_dir, enrich_workers=1, archive_retention_days=None)
+    try:
+        done, failed = lg.images.adopt()
+        lg.images.join()
+    finally:
+        lg.close()
+    print(f"Stored {done} images ({failed} could not be read)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os, json, threading
+from pathlib import Path
+from typing import Dict, Any, List
+
+# -------------------- Scan Journal --------------------
+class ScanJournal:
+    """
+    Journal append-only para el modo write-behind de ScanLogger.
+
+    Cada escaneo se escribe como una línea JSON con un número de secuencia
+    creciente ('seq'). El write() va directo al sistema operativo (sin fsync),
+    así que sobrevive a un crash del proceso; el fsync se hace una vez por lote
+    en sync(). Las líneas truncadas por un corte a mitad de escritura se ignoran
+    al releer.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        entries = self.read()
+        self.last_seq = entries[-1]["seq"] if entries else 0
+
+    def read(self, after: int = 0) -> List[Dict[str, Any]]:
+        out = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        e = json.loads(line)
+                    except ValueError:
+                        continue  # línea incompleta (crash a mitad de write)
+                    if e.get("seq", 0) > after:
+                        out.append(e)
+        except FileNotFoundError:
+            pass
+        return out
+
+    def append(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.last_seq += 1
+            entry = dict(entry, seq=self.last_seq)
+            os.write(self._fd, (json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8"))
+            return entry
+
+    def bump(self, seq: int):
+        # tras un truncate, la secuencia debe seguir sobre la marca persistida en las DBs
+        with self._lock:
+            self.last_seq = max(self.last_seq, seq)
+
+    def sync(self):
+        os.fsync(self._fd)
+
+    def truncate_if(self, applied_seq: int) -> bool:
+        # solo se vacía si todo lo escrito ya está aplicado en SQLite
+        with self._lock:
+            if applied_seq < self.last_seq:
+                return False
+            os.ftruncate(self._fd, 0)
+            return True
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
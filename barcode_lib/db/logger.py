@@ -1,43 +1,87 @@
-import sqlite3, threading, queue
+import sqlite3, threading, functools
+from collections import deque, OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Dict, Any, List, Tuple
-from barcode_lib.web.scraper import scrape_product_info
-
-# --- Paths ---
+from typing import Optional, Dict, Any, Iterable, List, Tuple, Callable
+from barcode_lib.db.journal import ScanJournal
+from barcode_lib.db.pool import ConnectionPool
+from barcode_lib.db import archive, imagestore, migrate, pages, replay, schema, search, snapshots
+from barcode_lib.db.undo import UndoLog
+from barcode_lib.db.events import ChangeBus, DataVersionWatch
+from barcode_lib.db.enrich import EnrichmentPool
+from barcode_lib import metrics
+
+# --- Paths --- (los directorios se crean al abrir, no al importar)
 DB_DIR = Path(__file__).parent
-DB_DIR.mkdir(parents=True, exist_ok=True)
 SCANS_DB = DB_DIR / "scans.db"
 STOCK_DB = DB_DIR / "stock.db"
 CATALOG_DB = DB_DIR / "catalog.db"
 IMAGE_DIR = DB_DIR / "images"
-IMAGE_DIR.mkdir(exist_ok=True)
+
+CATALOG_CACHE_ITEMS = 4096  # filas de products en el LRU de Catalog
+SKU_ID_CACHE = 200_000      # sku -> id internado (los ids no cambian: sin invalidación)
 
 def _now() -> str:
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+def _web_scrape(sku: str, force_refresh: bool = False, session=None, cache_path: Optional[Path] = None):
+    # import diferido: requests/bs4 se cargan en el primer lookup, no al arrancar
+    from barcode_lib.web.scraper import scrape_product_info
+    return scrape_product_info(sku, force_refresh=force_refresh, session=session, cache_path=cache_path)
+
 # -------------------- Catalog --------------------
-class Catalog:
-    def __init__(self, path: Path = CATALOG_DB):
-        self.conn = sqlite3.connect(path)
-        self.conn.execute(
-            """CREATE TABLE IF NOT EXISTS products (
-                sku TEXT PRIMARY KEY,
-                product TEXT,
-                brand TEXT,
-                category TEXT,
-                image TEXT,
-                url TEXT,
-                updated_at TEXT
-            )"""
-        )
-        self.conn.commit()
+class ProductRec:
+    """Fila de products tal como vive en el caché (sin dict por llamada)."""
+    __slots__ = ("sku", "product", "brand", "category", "image", "url")
 
+    def __init__(self, sku, product, brand, category, image, url):
+        self.sku, self.product, self.brand = sku, product, brand
+        self.category, self.image, self.url = category, image, url
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+class Catalog:
+    """
+    Catálogo de productos con un LRU de lectura (record/get):
+
+      - guarda también los SKU ausentes (un escaneo desconocido no vuelve a la DB)
+      - se invalida con los eventos 'products' del bus: upsert/remove propios,
+        undo/redo, el worker de enriquecimiento y 'reload' de otro proceso
+      - dentro de un write() del catálogo se lee directo de la escritora
+
+    También interna los SKU (tabla skus): scan_log y stock_level guardan el id.
+    """
+    def __init__(self, path: Path = CATALOG_DB, bus: Optional[ChangeBus] = None,
+                 cache_items: int = CATALOG_CACHE_ITEMS):
+        self.db = ConnectionPool(path)
+        self.bus = bus or ChangeBus()
+        self.cache_items = cache_items
+        self._cache: "OrderedDict[str, Optional[ProductRec]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._gen = 0  # sube con cada invalidación: descarta lecturas que corrieron contra un cambio
+        self._hits = self._misses = 0
+        self._ids: Dict[str, int] = {}
+        self.bus.subscribe(self._on_event)
+        with self.db.write() as c:
+            migrate.upgrade(c, migrate.CATALOG_STEPS, self.db.path.name)
+            self._fts = search.ensure_fts(c)
+
+    @metrics.timed("catalog_seconds", op="upsert")
     def upsert(self, sku: str, info: Dict[str, Any]):
         info = info or {}
+        with self.db.write() as c:
+            self._upsert(c, sku, info)
+        self.bus.publish("products", "upsert", sku)
+
+    def _upsert(self, c: sqlite3.Connection, sku: str, info: Dict[str, Any]):
         row = self.get(sku)
         if row:
-            self.conn.execute(
+            c.execute(
                 """UPDATE products
                    SET product=?, brand=?, category=?, image=?, url=?, updated_at=?
                    WHERE sku=?""",
@@ -52,7 +96,7 @@ class Catalog:
                 ),
             )
         else:
-            self.conn.execute(
+            c.execute(
                 """INSERT OR REPLACE INTO products
                    (sku, product, brand, category, image, url, updated_at)
                    VALUES (?,?,?,?,?,?,?)""",
@@ -66,29 +110,141 @@ class Catalog:
                     _now(),
                 ),
             )
-        self.conn.commit()
 
     def get(self, sku: str) -> Optional[Dict[str, Any]]:
-        cur = self.conn.execute(
+        rec = self.record(sku)
+        return rec.as_dict() if rec else None
+
+    @metrics.timed("catalog_seconds", op="record")
+    def record(self, sku: str) -> Optional[ProductRec]:
+        if self.db.in_write():
+            return self._load(sku)
+        with self._cache_lock:
+            if sku in self._cache:
+                self._cache.move_to_end(sku)
+                self._hits += 1
+                return self._cache[sku]
+            self._misses += 1
+            gen = self._gen
+        rec = self._load(sku)
+        with self._cache_lock:
+            if gen == self._gen:
+                self._cache[sku] = rec
+                while len(self._cache) > self.cache_items:
+                    self._cache.popitem(last=False)
+        return rec
+
+    def _load(self, sku: str) -> Optional[ProductRec]:
+        r = self.db.execute(
             "SELECT sku,product,brand,category,image,url FROM products WHERE sku=?",
             (sku,),
-        )
-        r = cur.fetchone()
-        if not r:
-            return None
-        return {
-            "sku": r[0],
-            "product": r[1],
-            "brand": r[2],
-            "category": r[3],
-            "image": r[4],
-            "url": r[5],
-        }
+        ).fetchone()
+        return ProductRec(*r) if r else None
+
+    def sku_id(self, sku: str) -> int:
+        i = self._ids.get(sku)
+        return i if i is not None else self.sku_ids((sku,))[sku]
+
+    def sku_ids(self, skus: Iterable[str]) -> Dict[str, int]:
+        """Ids internados de skus; los nuevos se insertan en una sola transacción."""
+        out, missing = {}, []
+        for sku in skus:
+            i = self._ids.get(sku)
+            if i is None:
+                missing.append(sku)
+            else:
+                out[sku] = i
+        if missing:
+            if len(self._ids) + len(missing) > SKU_ID_CACHE:
+                self._ids.clear()
+            with self.db.write() as c:
+                c.executemany("INSERT OR IGNORE INTO skus (sku) VALUES (?)", ((k,) for k in missing))
+                for sku in missing:
+                    out[sku] = self._ids[sku] = c.execute("SELECT id FROM skus WHERE sku=?", (sku,)).fetchone()[0]
+        return out
+
+    def by_ids(self, ids: Iterable[int]) -> Dict[int, Tuple]:
+        """sku_id -> (sku, product, brand, category, image, url)."""
+        ids, out = list(ids), {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            cur = self.db.execute(
+                f"""SELECT k.id, k.sku, p.product, p.brand, p.category, p.image, p.url
+                    FROM skus k LEFT JOIN products p ON p.sku = k.sku
+                    WHERE k.id IN ({",".join("?" * len(chunk))})""",
+                chunk,
+            )
+            out.update((r[0], r[1:]) for r in cur)
+        return out
+
+    def invalidate(self, sku: Optional[str] = None):
+        """Saca sku del caché (None = vaciarlo)."""
+        with self._cache_lock:
+            self._gen += 1
+            if sku is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(sku, None)
+
+    def _on_event(self, ev):
+        _, topic, op, key = ev
+        if topic == "products":
+            self.invalidate(None if op == "reload" else key)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            hits, misses, items = self._hits, self._misses, len(self._cache)
+        total = hits + misses
+        return {"items": items, "capacity": self.cache_items, "hits": hits, "misses": misses,
+                "hit_ratio": round(hits / total, 3) if total else None}
 
+    @metrics.timed("catalog_seconds", op="search")
     def search(self, text: str, limit: int = 200) -> List[Tuple]:
+        """
+        Búsqueda rankeada: SKU exacto, luego prefijo de SKU, luego FTS5
+        (bm25 + recencia, sin distinguir tildes). Si FTS no encuentra nada
+        se cae al LIKE por subcadena.
+        """
+        text = (text or "").strip()
+        if not text or not self._fts:
+            return self.search_like(text, limit)
+        rows, seen = [], set()
+
+        def take(cur) -> bool:
+            for r in cur:
+                if r[0] not in seen:
+                    seen.add(r[0]); rows.append(r)
+                    if len(rows) >= limit:
+                        return True
+            return False
+
+        cols = "SELECT sku,product,brand,category,image,url FROM products"
+        if take(self.db.execute(f"{cols} WHERE sku=?", (text,))):
+            return rows
+        if not any(ch.isspace() for ch in text):
+            cur = self.db.execute(f"{cols} WHERE sku >= ? AND sku < ? ORDER BY sku LIMIT ?",
+                                  (text, search.sku_upper_bound(text), limit))
+            if take(cur):
+                return rows
+        q = search.match_query(text)
+        if q:
+            cur = self.db.execute(
+                f"""SELECT p.sku,p.product,p.brand,p.category,p.image,p.url
+                    FROM products_fts f JOIN products p ON p.rowid = f.rowid
+                    WHERE products_fts MATCH ?
+                    ORDER BY bm25(products_fts, {", ".join(map(str, search.BM25_WEIGHTS))})
+                             + ? * (julianday('now') - julianday(COALESCE(p.updated_at, '2000-01-01')))
+                    LIMIT ?""",
+                (q, search.RECENCY_WEIGHT, limit),
+            )
+            take(cur)
+        return rows or self.search_like(text, limit)
+
+    @metrics.timed("catalog_seconds", op="search_like")
+    def search_like(self, text: str, limit: int = 200) -> List[Tuple]:
         if text:
             q = f"%{text.lower()}%"
-            cur = self.conn.execute(
+            cur = self.db.execute(
                 """SELECT sku,product,brand,category,image,url
                    FROM products
                    WHERE LOWER(sku) LIKE ? OR LOWER(product) LIKE ? OR LOWER(brand) LIKE ?
@@ -96,209 +252,529 @@ class Catalog:
                 (q, q, q, limit),
             )
         else:
-            cur = self.conn.execute(
+            cur = self.db.execute(
                 """SELECT sku,product,brand,category,image,url
                    FROM products ORDER BY updated_at DESC LIMIT ?""",
                 (limit,),
             )
         return cur.fetchall()
 
+    @metrics.timed("catalog_seconds", op="page")
+    def page(self, sort: str = "updated_at", desc: bool = True, after: Optional[pages.Cursor] = None,
+             limit: int = pages.PAGE, back: bool = False, text: str = "") -> List[Tuple]:
+        """
+        Una página del catálogo ordenado por cualquier columna (ver
+        db/pages.py). Con texto filtra como search (prefijo de SKU o FTS;
+        LIKE si no hay FTS) pero sin ranking: el orden es el pedido.
+        """
+        text = (text or "").strip()
+        where, args = "1=1", ()
+        q = search.match_query(text) if self._fts else None
+        if q:
+            where = "(sku >= ? AND sku < ?) OR rowid IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)"
+            args = (text, search.sku_upper_bound(text), q)
+        elif text:
+            like = f"%{text.lower()}%"
+            where, args = "LOWER(sku) LIKE ? OR LOWER(product) LIKE ? OR LOWER(brand) LIKE ?", (like, like, like)
+        sql, args = pages.query(pages.CATALOG_SORTS, sort, desc, after, back,
+                                "sku,product,brand,category,image,url", "products", where, args, limit)
+        rows = self.db.execute(sql, args).fetchall()
+        return rows[::-1] if back else rows
+
+    @metrics.timed("catalog_seconds", op="remove")
     def remove(self, sku: str):
-        self.conn.execute("DELETE FROM products WHERE sku=?", (sku,))
-        self.conn.commit()
+        with self.db.write() as c:
+            c.execute("DELETE FROM products WHERE sku=?", (sku,))
+        self.bus.publish("products", "delete", sku)
+
+# -------------------- Stock rules --------------------
+def step_stock(row: Optional[Tuple[Any, Any]], mode: str, pct: Optional[int] = None):
+    """
+    Regla única de stock para input/output/set (la usan el camino síncrono,
+    el applier write-behind y los replays).
+      row  -> (qty, percent) actual o None si el SKU no tiene fila en stock
+      devuelve (nueva_fila | None, resultado); resultado es bool para
+      input/output y el delta de qty para set.
+    """
+    if row is None:
+        if mode == "input":
+            return (1, 100), True
+        if mode == "set":
+            return (0, pct), 0
+        return None, False
+
+    qty, cur_pct = row
+    qty = qty or 0
+    cur_pct = 100 if cur_pct is None else int(cur_pct)
+
+    if mode == "input":
+        return (qty + 1, cur_pct), True
+    if mode == "output":
+        # consumir fracción abierta primero
+        if 0 < cur_pct < 100:
+            return (qty, 100), True
+        if qty > 0:
+            return (qty - 1, cur_pct), True
+        return (qty, cur_pct), False
+    # set: reemplaza fracción abierta o abre el último item
+    if 0 < cur_pct < 100:
+        return (qty, pct), 0
+    if qty > 0:
+        return (qty - 1, pct), -1
+    return (qty, pct), 0
+
+def _clamp_pct(pct) -> int:
+    try:
+        pct = int(pct)
+    except Exception:
+        pct = 100
+    return max(0, min(100, pct))
 
 # -------------------- Scan Logger --------------------
 class ScanLogger:
-    def __init__(self):
-        self.catalog = Catalog()
-        self.scans = sqlite3.connect(SCANS_DB)
-        self.stock = sqlite3.connect(STOCK_DB)
-
-        # scans: agregamos 'value' para guardar info auxiliar (p.ej. "pct|delta" en set)
-        self.scans.execute(
-            """CREATE TABLE IF NOT EXISTS scans (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sku TEXT,
-                product TEXT,
-                brand TEXT,
-                category TEXT,
-                image TEXT,
-                url TEXT,
-                mode TEXT,
-                ts TEXT
-            )"""
-        )
-        if not self._has_column(self.scans, "scans", "value"):
-            self.scans.execute("ALTER TABLE scans ADD COLUMN value TEXT")
-        self.scans.commit()
+    """
+    write_behind=True: los escaneos se anotan en un journal append-only
+    (scans.journal) y retornan de inmediato; un hilo applier los vuelca a
+    SQLite en lotes (cada flush_ms o flush_every escaneos). Al iniciar se
+    re-aplica lo que haya quedado pendiente en el journal.
+
+    scrape: función de autocompletado (por defecto web.scraper, con su
+    caché en <db_dir>/product_cache.db; benchmarks y tests pasan una offline).
+
+    Esquema: ver db/schema.py; versiones y migración del formato viejo al
+    abrir en db/migrate.py (migrate_batch = filas de historia por lote).
+
+    snapshot_every / snapshot_interval: snapshots de stock para
+    stock_as_of() y rebuild_stock (ver db/snapshots.py).
+
+    archive_retention_days: días de historia que quedan en scan_log; lo
+    anterior se compacta en segundo plano (ver db/archive.py). None: no se
+    compacta.
+
+    Imágenes: upsert_product y el enrichment las pasan al almacén por
+    contenido de <db_dir>/images (ver db/imagestore.py).
+    """
+    def __init__(self, db_dir: Optional[Path] = None, write_behind: bool = False,
+                 flush_ms: int = 50, flush_every: int = 256, enrich_workers: int = 2,
+                 scrape: Optional[Callable] = None, migrate_batch: int = migrate.MOVE_BATCH,
+                 snapshot_every: int = snapshots.SNAPSHOT_EVERY, snapshot_interval: float = snapshots.SNAPSHOT_INTERVAL,
+                 archive_retention_days: Optional[float] = archive.RETENTION_DAYS):
+        db_dir = Path(db_dir) if db_dir else DB_DIR
+        db_dir.mkdir(parents=True, exist_ok=True)
+        self._scans_path = db_dir / SCANS_DB.name
+        self._stock_path = db_dir / STOCK_DB.name
+        self._catalog_path = db_dir / CATALOG_DB.name
+        # cambios por fila para la GUI (ver db/events.py)
+        self.bus = ChangeBus()
+        self.catalog = Catalog(self._catalog_path, bus=self.bus)
+        # una escritora + lectoras por hilo (GUI, stdin, enrichment) por cada DB
+        # las lectoras ven las vistas `scans` / `stock` (join con catalog.db)
+        self.scans = ConnectionPool(self._scans_path, schema.reader_setup(self._catalog_path, "scans"))
+        self.stock = ConnectionPool(self._stock_path, schema.reader_setup(self._catalog_path, "stock"))
+
+        # scans: value guarda info auxiliar (p.ej. "pct|delta" en set)
+        with self.scans.write() as c:
+            migrate.upgrade(c, migrate.SCANS_STEPS, self._scans_path.name)
+            legacy = schema.has_table(c, "scans_legacy")  # historia vieja a medio mover
+        self.migration: Optional[migrate.ScanMover] = None
+        if legacy:
+            self.migration = migrate.ScanMover(self.scans, self.catalog, self.bus, migrate_batch)
+            self.migration.start()
+        self.undo = UndoLog(self.scans)
+        self._watches = [DataVersionWatch(self.scans, self.bus, ("scans",)),
+                         DataVersionWatch(self.stock, self.bus, ("stock",)),
+                         DataVersionWatch(self.catalog.db, self.bus, ("products",))]
 
         # stock: qty y percent (percent=100 ⇒ no hay fracción abierta)
-        self.stock.execute("""CREATE TABLE IF NOT EXISTS stock (sku TEXT PRIMARY KEY)""")
-        self._ensure_stock_columns()
-        self.stock.commit()
-
-        # background enrichment queue
-        self._q = queue.Queue()
-        self._worker = threading.Thread(target=self._enrich_worker, daemon=True)
-        self._worker.start()
-
-    # ---------- helpers ----------
-    @staticmethod
-    def _has_column(conn: sqlite3.Connection, table: str, col: str) -> bool:
-        cur = conn.execute(f"PRAGMA table_info({table})")
-        return any(r[1] == col for r in cur.fetchall())
-
-    def _ensure_stock_columns(self):
-        for col in ("product", "brand", "category", "image", "url"):
-            if not self._has_column(self.stock, "stock", col):
-                self.stock.execute(f"ALTER TABLE stock ADD COLUMN {col} TEXT")
-        if not self._has_column(self.stock, "stock", "qty"):
-            self.stock.execute("ALTER TABLE stock ADD COLUMN qty INTEGER DEFAULT 0")
-        if not self._has_column(self.stock, "stock", "percent"):
-            self.stock.execute("ALTER TABLE stock ADD COLUMN percent INTEGER DEFAULT 100")
+        with self.stock.write() as c:
+            migrate.upgrade(c, migrate.STOCK_STEPS, self._stock_path.name, self.catalog)
+        self.stock.refresh()
+
+        # write-behind: journal + applier
+        self._journal = None
+        if write_behind:
+            self._start_write_behind(db_dir / "scans.journal", flush_ms, flush_every)
+
+        # snapshots periódicos: stock_as_of() replaya solo desde el más cercano
+        self.snapshots = snapshots.Snapshotter(self.scans, snapshot_every, snapshot_interval,
+                                               ready=lambda: self.migration is None or self.migration.done)
+        self.snapshots.start()
+        self.compactor: Optional[archive.Compactor] = None
+        if archive_retention_days is not None:
+            self.compactor = archive.Compactor(self.scans, archive_retention_days,
+                                               ready=lambda: self.migration is None or self.migration.done)
+            self.compactor.start()
+        self._forecaster = None  # analytics.Forecaster, al primer forecast()
+
+        # imágenes por hash; variantes en un pool de procesos que arranca con la primera
+        self.images = imagestore.ImageStore(db_dir / IMAGE_DIR.name, self.catalog)
+
+        # background enrichment (pool con dedup por SKU, ver db/enrich.py)
+        self.defer_enrich = False  # True: queue_enrich no encola (replay; después bulk.enrich_missing)
+        self.scrape = scrape or functools.partial(_web_scrape, cache_path=db_dir / "product_cache.db")
+        self.enricher = EnrichmentPool(self.catalog, self.scrape, workers=enrich_workers,
+                                       images=self.images)
+
+        # gauges: se leen al exportar (comando 'metrics' / archivo Prometheus)
+        metrics.gauge("enrich_queued", lambda: self.enricher.stats()["queued"], "SKUs esperando enrichment")
+        metrics.gauge("enrich_inflight", lambda: self.enricher.stats()["inflight"])
+        metrics.gauge("catalog_cache_hit_ratio", lambda: self.catalog.cache_stats()["hit_ratio"])
+        metrics.gauge("writebehind_pending", lambda: len(self._wb_pending) if self._journal else 0)
 
     # ---------- enrichment ----------
     def queue_enrich(self, sku: str, force: bool = False):
-        self._q.put((sku, force))
-
-    def _enrich_worker(self):
-        while True:
-            sku, force = self._q.get()
-            try:
-                info = self.catalog.get(sku)
-                if force or not info or not info.get("product"):
-                    data = scrape_product_info(sku, force_refresh=force) or {}
-                    merged = (info or {}).copy()
-                    for k in ("product", "brand", "category", "image", "url"):
-                        if not merged.get(k) and data.get(k):
-                            merged[k] = data[k]
-                    self.catalog.upsert(sku, merged)
-            except Exception:
-                pass
-            finally:
-                self._q.task_done()
+        if not self.defer_enrich:
+            self.enricher.submit(sku, force)
 
     # ---------- internals ----------
-    def _append_scan(self, sku: str, mode: str, value: Optional[str] = None):
-        info = self.catalog.get(sku) or {
-            "product": None,
-            "brand": None,
-            "category": None,
-            "image": None,
-            "url": None,
-        }
-        self.scans.execute(
-            """INSERT INTO scans (sku,product,brand,category,image,url,mode,ts,value)
-               VALUES (?,?,?,?,?,?,?,?,?)""",
-            (
-                sku,
-                info.get("product"),
-                info.get("brand"),
-                info.get("category"),
-                info.get("image"),
-                info.get("url"),
-                mode,
-                _now(),
-                value,
-            ),
-        )
-        self.scans.commit()
+    @staticmethod
+    def _insert_scan(conn: sqlite3.Connection, catalog: Catalog, sku: str, mode: str,
+                     value: Optional[str] = None, ts=None, scan_id: Optional[int] = None) -> int:
+        # ts: epoch, o texto de un journal/undo_log viejo
+        return conn.execute(
+            "INSERT INTO scan_log (id, sku_id, mode, ts, value) VALUES (?,?,?,?,?)",
+            (scan_id, catalog.sku_id(sku), schema.MODE_ID.get(mode, 0), schema.epoch(ts), value),
+        ).lastrowid
 
-    # ---------- public API ----------
-    def log_input(self, sku: str):
-        self._append_scan(sku, "input")
-        row = self.stock.execute("SELECT qty FROM stock WHERE sku=?", (sku,)).fetchone()
-        if row:
-            self.stock.execute("UPDATE stock SET qty=qty+1 WHERE sku=?", (sku,))
+    @staticmethod
+    def _get_stock(conn: sqlite3.Connection, catalog: Catalog, sku: str):
+        return conn.execute("SELECT qty, percent FROM stock_level WHERE sku_id=?", (catalog.sku_id(sku),)).fetchone()
+
+    @staticmethod
+    def _put_stock(conn: sqlite3.Connection, catalog: Catalog, sku: str, new):
+        # new: (qty, percent) o None (sin fila)
+        if new is None:
+            conn.execute("DELETE FROM stock_level WHERE sku_id=?", (catalog.sku_id(sku),))
         else:
-            info = self.catalog.get(sku) or {}
-            self.stock.execute(
-                """INSERT OR REPLACE INTO stock
-                   (sku,product,brand,category,image,url,qty,percent)
-                   VALUES (?,?,?,?,?,?,?,100)""",
-                (
-                    sku,
-                    info.get("product"),
-                    info.get("brand"),
-                    info.get("category"),
-                    info.get("image"),
-                    info.get("url"),
-                    1,
-                ),
+            conn.execute(
+                """INSERT INTO stock_level (sku_id, qty, percent) VALUES (?,?,?)
+                   ON CONFLICT(sku_id) DO UPDATE SET qty=excluded.qty, percent=excluded.percent""",
+                (catalog.sku_id(sku), new[0], new[1]),
             )
-        self.stock.commit()
-        self.queue_enrich(sku)
 
-    def log_output(self, sku: str) -> bool:
-        self._append_scan(sku, "output")
-        row = self.stock.execute("SELECT qty, percent FROM stock WHERE sku=?", (sku,)).fetchone()
-        if not row:
-            return False
-
-        qty, pct = row
-        pct = 100 if pct is None else int(pct)
+    @classmethod
+    def _apply_stock(cls, conn: sqlite3.Connection, catalog: Catalog, sku: str, mode: str,
+                     pct: Optional[int] = None):
+        """Aplica un escaneo sobre stock; devuelve (resultado, fila_antes, fila_después)."""
+        row = cls._get_stock(conn, catalog, sku)
+        new, result = step_stock(row, mode, pct)
+        if new is None or (mode == "output" and not result):
+            return result, row, row
+        cls._put_stock(conn, catalog, sku, new)
+        return result, row, new
+
+    def _record(self, sku: str, mode: str, pct: Optional[int] = None):
+        if self._journal is not None:
+            return self._journal_scan(sku, mode, pct)
+        ts = schema.epoch()
+        # stock primero (set necesita el delta); scan + undo en la misma transacción de scans.db
+        with self.stock.write() as sc:
+            result, before, after = self._apply_stock(sc, self.catalog, sku, mode, pct)
+            value = f"{pct}|{result}" if mode == "set" else None
+            with self.scans.write() as c:
+                scan_id = self._insert_scan(c, self.catalog, sku, mode, value, ts)
+                self.undo.record(c, "scan", sku, before, after, scan_id, mode, value, ts)
+        self.bus.publish("scans", "upsert", scan_id)
+        if after != before:
+            self.bus.publish("stock", "upsert", sku)
+        return result
+
+    # ---------- write-behind ----------
+    def _start_write_behind(self, journal_path: Path, flush_ms: int, flush_every: int):
+        self._flush_s = max(1, int(flush_ms)) / 1000.0
+        self._flush_every = max(1, int(flush_every))
+        self._wb_cond = threading.Condition()
+        self._wb_pending = deque()
+        self._wb_stop = False
+        for pool in (self.scans, self.stock):
+            with pool.write() as c:
+                c.execute("CREATE TABLE IF NOT EXISTS journal_state (id INTEGER PRIMARY KEY CHECK (id=0), seq INTEGER)")
+                c.execute("INSERT OR IGNORE INTO journal_state (id, seq) VALUES (0, 0)")
+
+        # replay de lo no aplicado (crash previo) antes de aceptar escaneos nuevos
+        journal = ScanJournal(journal_path)
+        marks = (self._journal_mark(self.scans), self._journal_mark(self.stock))
+        leftover = journal.read(after=min(marks))
+        if leftover:
+            self._apply_batch(leftover)
+        self._wb_applied = max(marks + (journal.last_seq,))
+        journal.bump(self._wb_applied)
+        journal.truncate_if(self._wb_applied)
+        self._journal = journal
+
+        # espejo en memoria de stock: permite devolver el resultado sin esperar a SQLite
+        self._wb_mirror = {sku: (qty, pct) for sku, qty, pct in self.stock.execute("SELECT sku, qty, percent FROM stock")}
+        self._wb_lock = threading.Lock()
+        self._applier = threading.Thread(target=self._applier_loop, daemon=True)
+        self._applier.start()
 
-        # consumir fracción abierta primero
-        if 0 < pct < 100:
-            self.stock.execute("UPDATE stock SET percent=100 WHERE sku=?", (sku,))
-            self.stock.commit()
+    @staticmethod
+    def _journal_mark(conn) -> int:
+        return conn.execute("SELECT seq FROM journal_state WHERE id=0").fetchone()[0] or 0
+
+    def _journal_scan(self, sku: str, mode: str, pct: Optional[int]):
+        with self._wb_lock:
+            before = self._wb_mirror.get(sku)
+            new, result = step_stock(before, mode, pct)
+            if new is not None:
+                self._wb_mirror[sku] = new
+            after = before if new is None or (mode == "output" and not result) else new
+            entry = {"sku": sku, "mode": mode, "ts": schema.epoch(), "before": before, "after": after}
+            if mode == "set":
+                entry["pct"] = pct
+                entry["value"] = f"{pct}|{result}"
+            entry = self._journal.append(entry)
+            with self._wb_cond:
+                self._wb_pending.append(entry)
+                if len(self._wb_pending) >= self._flush_every:
+                    self._wb_cond.notify_all()
+        return result
+
+    @metrics.timed("writebehind_batch_seconds")
+    def _apply_batch(self, entries: List[Dict[str, Any]]):
+        metrics.counter("writebehind_scans_total").inc(len(entries))
+        # marcas por DB: cada archivo sabe hasta qué seq aplicó (idempotente ante crash entre commits)
+        last = entries[-1]["seq"]
+        scan_ids = []
+        with self.stock.write() as c:
+            mark = self._journal_mark(c)
+            for e in entries:
+                if e["seq"] > mark:
+                    self._apply_stock(c, self.catalog, e["sku"], e["mode"], e.get("pct"))
+            c.execute("UPDATE journal_state SET seq=? WHERE id=0", (max(last, mark),))
+        with self.scans.write() as c:
+            mark = self._journal_mark(c)
+            for e in entries:
+                if e["seq"] > mark:
+                    scan_id = self._insert_scan(c, self.catalog, e["sku"], e["mode"], e.get("value"), e["ts"])
+                    self.undo.record(c, "scan", e["sku"], e.get("before"), e.get("after"),
+                                     scan_id, e["mode"], e.get("value"), e["ts"])
+                    scan_ids.append(scan_id)
+            c.execute("UPDATE journal_state SET seq=? WHERE id=0", (max(last, mark),))
+        self.bus.publish_many("scans", "upsert", scan_ids)
+        self.bus.publish_many("stock", "upsert", dict.fromkeys(e["sku"] for e in entries))
+
+    def _applier_loop(self):
+        while True:
+            with self._wb_cond:
+                if not self._wb_pending and not self._wb_stop:
+                    self._wb_cond.wait()
+                if self._wb_pending and len(self._wb_pending) < self._flush_every and not self._wb_stop:
+                    # group commit: esperar a juntar más escaneos o a que venza flush_ms
+                    self._wb_cond.wait(self._flush_s)
+                batch = list(self._wb_pending)
+                self._wb_pending.clear()
+                stop = self._wb_stop
+            if batch:
+                self._journal.sync()
+                self._apply_batch(batch)
+            with self._wb_cond:
+                if batch:
+                    self._wb_applied = batch[-1]["seq"]
+                    self._journal.truncate_if(self._wb_applied)
+                self._wb_cond.notify_all()
+                if stop and not self._wb_pending:
+                    break
+
+    @metrics.timed("scanlogger_seconds", method="flush")
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que todo lo anotado en el journal esté aplicado en SQLite."""
+        if self._journal is None:
             return True
+        target = self._journal.last_seq
+        with self._wb_cond:
+            self._wb_cond.notify_all()
+            return self._wb_cond.wait_for(lambda: self._wb_applied >= target, timeout)
+
+    def close(self):
+        self.enricher.close()  # primero: sus workers escriben en catalog e images
+        if self.migration is not None:
+            self.migration.stop()  # entre lotes: lo que falta se retoma al reabrir
+        self.snapshots.stop()
+        if self.compactor is not None:
+            self.compactor.stop()  # entre tramos: lo que falta se archiva en la próxima pasada
+        if self._journal is not None:
+            with self._wb_cond:
+                self._wb_stop = True
+                self._wb_cond.notify_all()
+            self._applier.join()
+            self._journal.close()
+            self._journal = None
+        self.images.close()
+        for pool in (self.scans, self.stock, self.catalog.db):
+            pool.close()
+
+    @contextmanager
+    def _exclusive(self):
+        # operaciones masivas sobre stock/scans: drenar el journal y recargar el espejo
+        if self._journal is None:
+            yield
+            return
+        with self._wb_lock:
+            self.flush()
+            yield
+            self._wb_mirror = {sku: (qty, pct) for sku, qty, pct in self.stock.execute("SELECT sku, qty, percent FROM stock")}
 
-        if qty and qty > 0:
-            self.stock.execute("UPDATE stock SET qty=qty-1 WHERE sku=?", (sku,))
-            self.stock.commit()
-            return True
-        return False
+    # ---------- public API ----------
+    @metrics.timed("scanlogger_seconds", method="log_input")
+    def log_input(self, sku: str):
+        self._record(sku, "input")
+        self.queue_enrich(sku)
 
-    def log_set(self, sku: str, pct: int):
-        try:
-            pct = int(pct)
-        except Exception:
-            pct = 100
-        pct = max(0, min(100, pct))
-
-        row = self.stock.execute("SELECT qty, percent FROM stock WHERE sku=?", (sku,)).fetchone()
-        delta = 0
-        if row:
-            qty, cur_pct = row
-            cur_pct = 100 if cur_pct is None else int(cur_pct)
-            if 0 < cur_pct < 100:
-                self.stock.execute("UPDATE stock SET percent=? WHERE sku=?", (pct, sku))
-                delta = 0
-            else:
-                if qty and qty > 0:
-                    self.stock.execute("UPDATE stock SET qty=?, percent=? WHERE sku=?", (qty - 1, pct, sku))
-                    delta = -1
-                else:
-                    self.stock.execute("UPDATE stock SET percent=? WHERE sku=?", (pct, sku))
-                    delta = 0
+    @metrics.timed("scanlogger_seconds", method="log_output")
+    def log_output(self, sku: str) -> bool:
+        return self._record(sku, "output")
+
+    @metrics.timed("scanlogger_seconds", method="log_many")
+    def log_many(self, scans: List[Tuple[str, str]]) -> List[bool]:
+        """
+        Ráfaga de escaneos input/output [(sku, modo), ...] en una sola
+        transacción por DB; cada escaneo conserva su propio registro de undo.
+        """
+        if self._journal is not None:
+            results = [self._journal_scan(sku, mode, None) for sku, mode in scans]
         else:
-            info = self.catalog.get(sku) or {}
-            self.stock.execute(
-                """INSERT OR REPLACE INTO stock
-                   (sku,product,brand,category,image,url,qty,percent)
-                   VALUES (?,?,?,?,?,?,?,?)""",
-                (sku, info.get("product"), info.get("brand"), info.get("category"), info.get("image"), info.get("url"), 0, pct),
-            )
-            delta = 0
-
-        self.stock.commit()
-        self._append_scan(sku, "set", value=f"{pct}|{delta}")
+            ts = schema.epoch()
+            results, scan_ids, touched = [], [], {}
+            with self.stock.write() as sc, self.scans.write() as c:
+                for sku, mode in scans:
+                    result, before, after = self._apply_stock(sc, self.catalog, sku, mode)
+                    scan_id = self._insert_scan(c, self.catalog, sku, mode, None, ts)
+                    self.undo.record(c, "scan", sku, before, after, scan_id, mode, None, ts)
+                    results.append(result)
+                    scan_ids.append(scan_id)
+                    if after != before:
+                        touched[sku] = True
+            self.bus.publish_many("scans", "upsert", scan_ids)
+            self.bus.publish_many("stock", "upsert", touched)
+        for sku, mode in scans:
+            if mode == "input":
+                self.queue_enrich(sku)
+        return results
+
+    @metrics.timed("scanlogger_seconds", method="log_set")
+    def log_set(self, sku: str, pct: int):
+        self._record(sku, "set", _clamp_pct(pct))
         self.queue_enrich(sku)
 
+    @metrics.timed("scanlogger_seconds", method="add_or_refresh_product")
     def add_or_refresh_product(self, sku: str, allow_manual: bool = True):
-        if not self.catalog.get(sku):
-            self.catalog.upsert(sku, {"product": None, "brand": None, "category": None, "image": None, "url": None})
+        if not self.catalog.record(sku):
+            self.upsert_product(sku, {"product": None, "brand": None, "category": None, "image": None, "url": None})
         self.queue_enrich(sku, force=False)
 
+    @metrics.timed("scanlogger_seconds", method="upsert_product")
+    def upsert_product(self, sku: str, info: Dict[str, Any]):
+        """
+        Alta/edición manual en el catálogo (deshacible con undo_last). Una
+        imagen que no es del almacén (ruta o URL) se copia antes; ValueError
+        si no se puede leer como imagen.
+        """
+        if (info or {}).get("image") and not imagestore.is_ref(info["image"]):
+            info = dict(info, image=self.images.ingest(info["image"]))
+        self.flush()  # write-behind: que el undo_log respete el orden real de las acciones
+        before = self.catalog.get(sku)
+        self.catalog.upsert(sku, info)
+        with self.scans.write() as c:
+            self.undo.record(c, "product", sku, before, self.catalog.get(sku))
+
+    @metrics.timed("scanlogger_seconds", method="remove_known_product")
     def remove_known_product(self, sku: str):
+        self.flush()
+        before = self.catalog.get(sku)
         self.catalog.remove(sku)
+        if before:
+            with self.scans.write() as c:
+                self.undo.record(c, "product", sku, before, None)
+
+    # ---------- undo / redo ----------
+    @metrics.timed("scanlogger_seconds", method="undo_last")
+    def undo_last(self, n: int = 1) -> int:
+        """Deshace las últimas n acciones; devuelve cuántas se deshicieron."""
+        return self._step_history(n, redo=False)
+
+    @metrics.timed("scanlogger_seconds", method="redo")
+    def redo(self, n: int = 1) -> int:
+        return self._step_history(n, redo=True)
+
+    def _step_history(self, n: int, redo: bool) -> int:
+        done, events = 0, []
+        with self._exclusive(), self.stock.write() as sc, self.scans.write() as c, self.catalog.db.write() as cc:
+            for _ in range(max(0, int(n))):
+                rec = self.undo.pop_redo(c) if redo else self.undo.pop_undo(c)
+                if rec is None:
+                    break
+                target = rec["after"] if redo else rec["before"]
+                if rec["kind"] == "scan":
+                    self._put_stock(sc, self.catalog, rec["sku"], target)
+                    if redo:
+                        self._insert_scan(c, self.catalog, rec["sku"], rec["mode"], rec["value"], rec["ts"], rec["scan_id"])
+                    else:
+                        c.execute("DELETE FROM scan_log WHERE id=?", (rec["scan_id"],))
+                        if self.migration is not None and not self.migration.done:
+                            c.execute("DELETE FROM scans_legacy WHERE id=?", (rec["scan_id"],))
+                    # el escaneo vuelve con su id viejo al rehacer: los snapshots de después tampoco valen
+                    replay.drop_checkpoints(c, rec["scan_id"])
+                    events.append(("scans", "upsert" if redo else "delete", rec["scan_id"]))
+                    events.append(("stock", "delete" if target is None else "upsert", rec["sku"]))
+                elif target is None:
+                    cc.execute("DELETE FROM products WHERE sku=?", (rec["sku"],))
+                    events.append(("products", "delete", rec["sku"]))
+                else:
+                    self.catalog._upsert(cc, rec["sku"], target)
+                    events.append(("products", "upsert", rec["sku"]))
+                done += 1
+        for topic, op, key in events:
+            self.bus.publish(topic, op, key)
+        return done
 
     # ---------- queries ----------
+    @metrics.timed("scanlogger_seconds", method="last")
     def last(self, n: int = 20):
         cur = self.scans.execute("SELECT * FROM scans ORDER BY id DESC LIMIT ?", (n,))
         return cur.fetchall()
 
+    @metrics.timed("scanlogger_seconds", method="scans_after")
+    def scans_after(self, scan_id: int, limit: int = 50):
+        cur = self.scans.execute("SELECT * FROM scans WHERE id > ? ORDER BY id LIMIT ?", (scan_id, limit))
+        return cur.fetchall()
+
+    @metrics.timed("scanlogger_seconds", method="daily_history")
+    def daily_history(self, sku: str, since: Optional[str] = None) -> List[Tuple[str, int, int, int]]:
+        """
+        (día 'YYYY-MM-DD', inputs, outputs, sets) de un SKU desde `since`
+        (incluido): lo archivado sale de scan_daily, el resto de scan_log.
+        """
+        row = self.catalog.db.execute("SELECT id FROM skus WHERE sku=?", (sku,)).fetchone()
+        if row is None:
+            return []
+        sku_id, since = row[0], since or ""
+        cur = self.scans.execute(
+            """SELECT day, SUM(i), SUM(o), SUM(st) FROM (
+                   SELECT day, inputs AS i, outputs AS o, sets AS st FROM scan_daily WHERE sku_id = ? AND day >= ?
+                   UNION ALL
+                   SELECT date(ts, 'unixepoch', 'localtime'), mode = 1, mode = 2, mode = 3
+                   FROM scan_log WHERE sku_id = ?)
+               WHERE day >= ? GROUP BY day ORDER BY day""",
+            (sku_id, since, sku_id, since),
+        )
+        return cur.fetchall()
+
+    @metrics.timed("scanlogger_seconds", method="stock_row")
+    def stock_row(self, sku: str):
+        return self.stock.execute(
+            "SELECT sku,product,brand,category,image,url,qty,percent FROM stock WHERE sku=?", (sku,)
+        ).fetchone()
+
+    @metrics.timed("scanlogger_seconds", method="poll_external")
+    def poll_external(self) -> bool:
+        """Publica 'reload' si otro proceso escribió en alguna de las DBs."""
+        changed = False
+        for w in self._watches:
+            changed = w.poll() or changed
+        return changed
+
+    @metrics.timed("scanlogger_seconds", method="stock_table")
     def stock_table(self, limit: int = 200):
         cur = self.stock.execute(
             """SELECT sku,product,brand,category,image,url,qty,percent
@@ -309,29 +785,89 @@ class ScanLogger:
         )
         return cur.fetchall()
 
-    def rebuild_stock(self):
-        self.stock.execute("DELETE FROM stock")
-        skus = [r[0] for r in self.scans.execute("SELECT DISTINCT sku FROM scans").fetchall()]
-        for sku in skus:
-            ins = self.scans.execute("SELECT COUNT(*) FROM scans WHERE sku=? AND mode='input'", (sku,)).fetchone()[0]
-            outs = self.scans.execute("SELECT COUNT(*) FROM scans WHERE sku=? AND mode='output'", (sku,)).fetchone()[0]
-            qty = int(ins) - int(outs)
-            if qty > 0:
-                info = self.catalog.get(sku) or {}
-                self.stock.execute(
-                    """INSERT OR REPLACE INTO stock
-                       (sku,product,brand,category,image,url,qty,percent)
-                       VALUES (?,?,?,?,?,?,?,100)""",
-                    (sku, info.get("product"), info.get("brand"), info.get("category"), info.get("image"), info.get("url"), qty),
-                )
-        self.stock.commit()
-
+    @metrics.timed("scanlogger_seconds", method="stock_page")
+    def stock_page(self, sort: str = "product", desc: bool = False, after: Optional[pages.Cursor] = None,
+                   limit: int = pages.PAGE, back: bool = False):
+        """Una página del stock ordenado por sku/product/brand/category/stock (ver db/pages.py)."""
+        sql, args = pages.query(pages.STOCK_SORTS, sort, desc, after, back,
+                                "sku,product,brand,category,image,url,qty,percent", "stock", limit=limit, indexed=False)
+        rows = self.stock.execute(sql, args).fetchall()
+        return rows[::-1] if back else rows
+
+    @metrics.timed("scanlogger_seconds", method="stock_as_of")
+    def stock_as_of(self, ts, limit: Optional[int] = 200):
+        """
+        Stock al instante ts (epoch o 'YYYY-MM-DD HH:MM:SS' local), mismas
+        columnas y orden que stock_table(): replay desde el snapshot más
+        cercano anterior, con las reglas de input/output/set de siempre.
+        limit=None: todas (para paginarlas con pages.RowPages).
+        """
+        self._wait_migration()
+        self.flush()  # write-behind: lo anotado en el journal también es historia
+        state = replay.state_at(self.scans, ts)
+        info = self.catalog.by_ids(state)
+        rows = [info[i] + (qty, pct) for i, (qty, pct) in state.items() if i in info]
+        rows.sort(key=lambda r: (r[1] is not None, (r[1] or "").lower()))  # como ORDER BY product COLLATE NOCASE
+        return rows[:limit]
+
+    @metrics.timed("scanlogger_seconds", method="forecast")
+    def forecast(self, limit: int = 50, today=None):
+        """
+        Consumo por día y fecha estimada de agotamiento, primero lo que se
+        acaba antes (ver analytics.py; necesita NumPy, ImportError si falta).
+        """
+        self._wait_migration()
+        self.flush()
+        if self._forecaster is None:
+            from barcode_lib.analytics import Forecaster  # numpy: solo quien pide el pronóstico
+            self._forecaster = Forecaster(self)
+        return self._forecaster.forecast(limit, today)
+
+    @metrics.timed("scanlogger_seconds", method="rebuild_stock")
+    def rebuild_stock(self, workers: int = 1):
+        # replay de input/output/set desde el último checkpoint (ver db/replay.py)
+        self._wait_migration()
+        with self._exclusive():
+            _, state = replay.replay(self.scans, workers=workers)
+            self._write_stock(state)
+            with self.scans.write() as c:
+                self.undo.clear(c)  # las inversas guardadas ya no aplican sobre el stock reconstruido
+        self.bus.publish("stock", "reload")
+
+    def _write_stock(self, state: replay.State):
+        with self.stock.write() as c:
+            c.execute("DELETE FROM stock_level")
+            c.executemany("INSERT INTO stock_level (sku_id, qty, percent) VALUES (?,?,?)",
+                          ((sku_id, qty, pct) for sku_id, (qty, pct) in state.items()))
+
+    def _wait_migration(self):
+        if self.migration is not None:
+            self.migration.wait()
+            if self.migration.error:
+                raise RuntimeError(f"scan history migration failed: {self.migration.error}")
+
+    @metrics.timed("scanlogger_seconds", method="clear_all")
     def clear_all(self):
-        self.scans.execute("DELETE FROM scans"); self.scans.commit()
-        self.stock.execute("DELETE FROM stock"); self.stock.commit()
-
+        self._wait_migration()
+        with self._exclusive():
+            with self.scans.write() as c:
+                c.execute("DELETE FROM scan_log")
+                replay.drop_checkpoints(c)
+                self.undo.clear(c)
+                archived = archive.clear(c, archive.directory(self.scans))
+            with self.stock.write() as c:
+                c.execute("DELETE FROM stock_level")
+        for path in archived:
+            path.unlink(missing_ok=True)
+        self.bus.publish("scans", "reload")
+        self.bus.publish("stock", "reload")
+
+    @metrics.timed("scanlogger_seconds", method="set_all_percent")
     def set_all_percent(self, pct: int):
         pct = max(0, min(100, int(pct)))
-        self.stock.execute("UPDATE stock SET percent=?", (pct,))
-        self.stock.commit()
+        with self._exclusive(), self.stock.write() as c:
+            c.execute("UPDATE stock_level SET percent=?", (pct,))
+            with self.scans.write() as sc:
+                self.undo.clear(sc)
+        self.bus.publish("stock", "reload")
 
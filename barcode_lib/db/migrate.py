@@ -0,0 +1,221 @@
+"""
+Versiones del esquema (PRAGMA user_version) y migración en línea del esquema
+viejo (scans/stock con columnas de producto, mode y ts como texto) al
+normalizado de db/schema.py.
+
+    python -m barcode_lib.db.migrate [--db-dir DIR] [--batch 5000] [--vacuum]
+
+ScanLogger la dispara solo al abrir DBs viejas:
+  - stock: pocas filas (una por SKU), se migra al abrir, en una transacción
+  - scans: la tabla se renombra a scans_legacy y el siguiente id de scan_log
+    arranca después del último viejo; escanear funciona de inmediato. Un hilo
+    mueve la historia en lotes cortos (cada lote: insertar en scan_log y
+    borrar de scans_legacy en la misma transacción) dejando pasar a los
+    escaneos en vivo entre lote y lote. Mientras tanto la vista `scans` une
+    lo movido con lo que falta; rebuild_stock espera a que termine.
+
+Los nombres/marcas que solo existían copiados en las filas viejas (SKUs sin
+fila en products, p.ej. stock importado a mano) se adoptan en el catálogo.
+Todas las estaciones que comparten las DBs tienen que correr esta versión.
+El espacio liberado queda como páginas libres: --vacuum compacta los archivos.
+"""
+import sys, time, argparse, threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from barcode_lib.db import archive, imagestore, pages, replay, schema
+
+MOVE_BATCH = 5_000    # filas de historia por transacción (~50 ms de escritora tomada)
+MOVE_PAUSE = 0.01     # s entre lotes: ventana para los escaneos en vivo
+
+PRODUCT_COLS = ("product", "brand", "category", "image", "url")
+
+def _cols(c, table: str) -> List[str]:
+    return [r[1] for r in c.execute(f"PRAGMA table_info({table})")]
+
+def adopt_products(catalog, rows: Iterable[tuple]):
+    """(sku, product, brand, category, image, url) de filas viejas -> products, solo si el SKU no está."""
+    from barcode_lib.db.logger import _now
+    now = _now()
+    rows = [tuple(r) + (now,) for r in rows if any(r[1:])]
+    if rows:
+        with catalog.db.write() as c:
+            n = c.total_changes
+            c.executemany(
+                "INSERT OR IGNORE INTO products (sku,product,brand,category,image,url,updated_at) VALUES (?,?,?,?,?,?,?)",
+                rows,
+            )
+            added = c.total_changes > n
+        if added:
+            catalog.bus.publish("products", "reload")
+
+# -------------------- stock --------------------
+def migrate_stock(c, catalog) -> int:
+    """Tabla stock vieja -> stock_level (dentro de la escritora de stock.db). Devuelve filas migradas."""
+    if not schema.has_table(c, "stock"):
+        return 0
+    cols = set(_cols(c, "stock"))
+    pick = lambda col, default: col if col in cols else default
+    rows = c.execute(
+        f"""SELECT sku, {", ".join(pick(k, "NULL") for k in PRODUCT_COLS)},
+                   {pick("qty", "0")}, {pick("percent", "100")} FROM stock WHERE sku IS NOT NULL"""
+    ).fetchall()
+    adopt_products(catalog, (r[:6] for r in rows))
+    ids = catalog.sku_ids(r[0] for r in rows)
+    c.executemany(
+        "INSERT OR REPLACE INTO stock_level (sku_id, qty, percent) VALUES (?,?,?)",
+        ((ids[r[0]], r[6] or 0, 100 if r[7] is None else r[7]) for r in rows),
+    )
+    c.execute("DROP TABLE stock")
+    return len(rows)
+
+# -------------------- scans --------------------
+def prepare_scans(c):
+    """Dentro de la escritora de scans.db: renombra la tabla vieja (scans_legacy) y reserva sus ids."""
+    if schema.has_table(c, "scans"):
+        if "value" not in _cols(c, "scans"):
+            c.execute("ALTER TABLE scans ADD COLUMN value TEXT")
+        c.execute("ALTER TABLE scans RENAME TO scans_legacy")
+        # checkpoints viejos: por SKU texto y ts texto; son un caché, se recalculan
+        c.execute("DROP TABLE IF EXISTS checkpoint_stock")
+        c.execute("DROP TABLE IF EXISTS checkpoints")
+        replay.ensure_schema(c)
+        top = c.execute("SELECT MAX(id) FROM scans_legacy").fetchone()[0] or 0
+        seq = c.execute("SELECT seq FROM sqlite_sequence WHERE name='scan_log'").fetchone()
+        if seq is None:
+            c.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('scan_log', ?)", (top,))
+        elif seq[0] < top:
+            c.execute("UPDATE sqlite_sequence SET seq=? WHERE name='scan_log'", (top,))
+
+MODE_CASE = "CASE mode " + " ".join(f"WHEN '{m}' THEN {i}" for m, i in schema.MODE_ID.items()) + " ELSE 0 END"
+
+class ScanMover(threading.Thread):
+    """Mueve scans_legacy -> scan_log en lotes; done se marca dentro de la misma transacción que borra la tabla."""
+    def __init__(self, scans_pool, catalog, bus, batch: int = MOVE_BATCH, pause: float = MOVE_PAUSE):
+        super().__init__(daemon=True, name="scan-migration")
+        self.scans, self.catalog, self.bus = scans_pool, catalog, bus
+        self.batch, self.pause = max(1, int(batch)), pause
+        self.moved = 0
+        self._adopted = set()  # SKUs ya ofrecidos al catálogo
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._halt = False
+
+    def run(self):
+        try:
+            while not self._halt and self.step():
+                time.sleep(self.pause)
+        except BaseException as e:  # la historia vieja queda intacta en scans_legacy; se reintenta al reabrir
+            self.error = e
+        self.scans.refresh()
+        self.bus.publish("scans", "reload")
+
+    def step(self) -> bool:
+        with self.scans.write() as c:
+            rows = c.execute(
+                f"""SELECT id, sku, {", ".join(PRODUCT_COLS)}, {MODE_CASE},
+                           COALESCE(CAST(strftime('%s', ts, 'utc') AS INTEGER), 0), value
+                    FROM scans_legacy ORDER BY id LIMIT ?""",
+                (self.batch,),
+            ).fetchall()
+            if not rows:
+                c.execute("DROP TABLE scans_legacy")
+                self.done = True
+                return False
+            fresh = {r[1]: r[1:7] for r in rows if r[1] is not None and r[1] not in self._adopted}  # gana la más nueva
+            adopt_products(self.catalog, fresh.values())
+            self._adopted.update(fresh)
+            ids = self.catalog.sku_ids(r[1] or "" for r in rows)
+            c.executemany(
+                "INSERT OR IGNORE INTO scan_log (id, sku_id, mode, ts, value) VALUES (?,?,?,?,?)",
+                ((r[0], ids[r[1] or ""], r[7], r[8], r[9]) for r in rows),
+            )
+            c.execute("DELETE FROM scans_legacy WHERE id <= ?", (rows[-1][0],))
+        self.moved += len(rows)
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        if self.is_alive():
+            self.join(timeout)
+        return self.done
+
+    def stop(self):
+        self._halt = True
+        if self.is_alive():
+            self.join()
+
+# -------------------- Versiones --------------------
+# user_version de cada archivo = cantidad de pasos aplicados. Un paso es una
+# tupla de sentencias SQL y/o funciones f(c, *extra); los pasos nuevos se
+# agregan al final y nunca se editan. El paso 1 es el esquema base:
+# idempotente, así cubre tanto DBs de antes de las versiones (user_version 0)
+# como las del formato viejo. Índices: solo los que usa una consulta de
+# db/plans.py (cada índice en scan_log se paga en cada escaneo).
+CATALOG_STEPS = (
+    (schema.PRODUCTS, schema.SKUS),
+    ("CREATE INDEX IF NOT EXISTS idx_products_updated_at ON products(updated_at)",),  # search_like sin texto
+    # Catalog.page: un índice por orden, con la misma expresión que pages.CATALOG_SORTS
+    tuple(f"CREATE INDEX IF NOT EXISTS idx_products_{col}_key ON products({expr}, sku)"
+          for col, expr in pages.CATALOG_SORTS.items() if col != "sku"),
+    imagestore.SCHEMA,
+)
+SCANS_STEPS = (
+    (*schema.SCANS, prepare_scans, replay.ensure_schema),
+    ("DELETE FROM checkpoint_stock", "DELETE FROM checkpoints"),  # checkpoints.ts pasa a ser el máximo del prefijo
+    (*archive.SCHEMA, "CREATE INDEX IF NOT EXISTS idx_scan_log_sku ON scan_log(sku_id)"),  # historia por SKU
+)
+STOCK_STEPS = (
+    (*schema.STOCK, migrate_stock),  # extra: catalog
+)
+
+def upgrade(c, steps, name: str, *extra) -> int:
+    """Aplica los pasos pendientes dentro del write() del llamador (todo o nada). Devuelve la versión."""
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    if version > len(steps):
+        # otra estación ya actualizó el archivo: no tocar un esquema que no conocemos
+        raise RuntimeError(f"{name} has schema version {version}, this program knows up to {len(steps)}; update it")
+    for n, step in enumerate(steps[version:], version + 1):
+        for item in step:
+            if callable(item):
+                item(c, *extra)
+            else:
+                c.execute(item)
+        c.execute(f"PRAGMA user_version={n}")
+    return len(steps)
+
+# -------------------- CLI --------------------
+def db_sizes(d: Path) -> Dict[str, int]:
+    return {p.name: p.stat().st_size for p in sorted(d.glob("*.db"))}
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="python -m barcode_lib.db.migrate")
+    ap.add_argument("--db-dir", type=Path, help="directory with the .db files (default barcode_lib/db)")
+    ap.add_argument("--batch", type=int, default=MOVE_BATCH, help="history rows per transaction")
+    ap.add_argument("--vacuum", action="store_true", help="compact the files afterwards")
+    args = ap.parse_args(argv)
+
+    from barcode_lib.db.logger import ScanLogger, DB_DIR
+    d = args.db_dir or DB_DIR
+    before = db_sizes(d)
+    t0 = time.perf_counter()
+    lg = ScanLogger(db_dir=d, migrate_batch=args.batch)
+    try:
+        mover = lg.migration
+        if mover is not None:
+            while not mover.wait(1.0) and mover.is_alive():
+                print(f"  {mover.moved} scans moved...", file=sys.stderr)
+            if mover.error:
+                raise SystemExit(f"migration failed: {mover.error}")
+            print(f"Moved {mover.moved} scans in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+        else:
+            print("Scans already normalized.", file=sys.stderr)
+        if args.vacuum:
+            for pool in (lg.scans, lg.stock):
+                pool.vacuum()
+    finally:
+        lg.close()
+    after = db_sizes(d)
+    for name in after:
+        print(f"{name}: {before.get(name, 0)} -> {after[name]} bytes", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Paginación por keyset para recorrer stock y catálogo enteros: el cursor es
+(clave de orden, sku) de la última fila vista y la página siguiente arranca
+justo después, sin OFFSET. La última página cuesta lo mismo que la primera y
+un alta o baja entre página y página no repite ni saltea filas.
+
+    rows = lg.stock_page("product")                                   # primera
+    rows = lg.stock_page("product", after=pages.cursor(rows[-1]))     # siguiente
+    rows = lg.stock_page("product", after=pages.cursor(rows[0]), back=True)  # anterior
+
+Cada fila trae al final su clave de orden. Las páginas vuelven siempre en el
+orden de pantalla (también las de back=True). Empate en la clave: por sku.
+
+En catalog.db cada orden tiene su índice (migrate.CATALOG_STEPS) y una página
+es un recorrido corto de índice. El stock junta stock.db con catalog.db: no
+hay índice común y cada página ordena el stock entero (top-N, ~30 ms con 50k
+SKUs). RowPages hace lo mismo sobre filas ya en memoria (stock_as_of).
+"""
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+PAGE = 100  # filas por página
+
+Cursor = Tuple[Any, str]
+
+def _text(col: str) -> str:
+    return f"IFNULL({col}, '') COLLATE NOCASE"
+
+LEVEL = "qty + CASE WHEN percent > 0 AND percent < 100 THEN percent / 100.0 ELSE 0 END"
+
+# columna -> expresión de la clave (las de catálogo calzan con los índices de products)
+STOCK_SORTS: Dict[str, str] = {"sku": "sku", "product": _text("product"), "brand": _text("brand"),
+                               "category": _text("category"), "stock": LEVEL}
+CATALOG_SORTS: Dict[str, str] = {"sku": "sku", "product": _text("product"), "brand": _text("brand"),
+                                 "category": _text("category"), "updated_at": "IFNULL(updated_at, '')"}
+
+def cursor(row: Sequence) -> Cursor:
+    """Cursor que apunta a una fila de página (clave al final, sku primero)."""
+    return (row[-1], row[0])
+
+def query(sorts: Dict[str, str], sort: str, desc: bool, after: Optional[Cursor], back: bool, cols: str,
+          source: str, where: str = "1=1", args: tuple = (), limit: int = PAGE,
+          indexed: bool = True) -> Tuple[str, tuple]:
+    """
+    (sql, args) de la página de `source` filtrado por `where` después de
+    `after` (antes, si back: entonces sale al revés y hay que darla vuelta).
+    Cada fila: `cols` + la clave. indexed=False si igual se va a recorrer
+    todo `source` (el stock): una sola pasada en vez de dos.
+    """
+    if sort not in sorts:
+        raise ValueError(f"unknown sort column: {sort}")
+    expr = sorts[sort]
+    up = desc == back  # recorrer hacia claves mayores
+    way, op = ("ASC", ">") if up else ("DESC", "<")
+    sel = f"SELECT {cols}, {expr} AS sort_key FROM {source} WHERE ({where})"
+    if after is None:
+        return f"{sel} ORDER BY {expr} {way}, sku {way} LIMIT ?", args + (limit,)
+    key, sku = after
+    if not indexed:
+        return (f"{sel} AND ({expr}, sku) {op} (?, ?) ORDER BY {expr} {way}, sku {way} LIMIT ?",
+                args + (key, sku, limit))
+    # (clave, sku) > (?, ?) sobre una expresión no usa el índice: primero el resto
+    # de la misma clave y después las claves siguientes, dos recorridos cortos
+    same = f"{sel} AND {expr} = ? AND sku {op} ? ORDER BY sku {way} LIMIT ?"
+    rest = f"{sel} AND {expr} {op} ? ORDER BY {expr} {way}, sku {way} LIMIT ?"
+    return (f"SELECT * FROM ({same}) UNION ALL SELECT * FROM ({rest}) LIMIT ?",
+            args + (key, sku, limit) + args + (key, limit, limit))
+
+# -------------------- en memoria --------------------
+def _stock_key(sort: str):
+    if sort == "stock":
+        return lambda r: (r[6] or 0) + (r[7] / 100.0 if r[7] is not None and 0 < r[7] < 100 else 0)
+    if sort not in STOCK_SORTS:
+        raise ValueError(f"unknown sort column: {sort}")
+    i = tuple(STOCK_SORTS).index(sort)
+    return (lambda r: r[0]) if sort == "sku" else (lambda r: (r[i] or "").lower())
+
+class RowPages:
+    """Las mismas páginas que ScanLogger.stock_page sobre filas de stock ya cargadas."""
+    def __init__(self, rows: Sequence[Sequence], sort: str = "product", desc: bool = False):
+        key = _stock_key(sort)
+        self.rows = sorted((tuple(r) + (key(r),) for r in rows), key=cursor)  # siempre ascendente
+        self._keys = [cursor(r) for r in self.rows]
+        self.desc = desc
+
+    def page(self, after: Optional[Cursor] = None, limit: int = PAGE, back: bool = False) -> List[Tuple]:
+        up = self.desc == back
+        if up:
+            i = 0 if after is None else bisect_right(self._keys, after)
+            rows = self.rows[i:i + limit]
+        else:
+            j = len(self.rows) if after is None else bisect_left(self._keys, after)
+            rows = self.rows[max(0, j - limit):j]
+        return rows[::-1] if self.desc else rows
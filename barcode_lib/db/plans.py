@@ -0,0 +1,176 @@
+"""
+Planes de las consultas calientes (EXPLAIN QUERY PLAN).
+
+    python -m barcode_lib.db.plans [--db-dir DIR]
+
+Imprime el plan de cada consulta de HOT contra las DBs (las de siempre o las
+de --db-dir) y sale con código 1 si alguna hace un SCAN sin índice, arma un
+índice automático u ordena en un B-tree temporal, salvo las líneas que la
+consulta declara como esperadas. Lo mismo corre con el comando
+'diagnostics' y en test/test_plans.py: un índice que falta o una consulta
+reescrita que deja de usarlo rompe el test.
+
+Las consultas son copia de las de logger.py / replay.py / snapshots.py /
+undo.py / analytics.py / archive.py: si se cambia una de esas, cambiarla acá también.
+"""
+import re, sys, sqlite3, argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from barcode_lib.db import pages, schema, search
+from barcode_lib.db.undo import COLS as UNDO_COLS
+
+# (nombre, db, sql, args, líneas del plan aceptadas aunque parezcan un recorrido completo)
+HOT: Tuple[Tuple[str, str, str, tuple, Tuple[str, ...]], ...] = (
+    # ---------- scans.db ----------
+    ("last", "scans", "SELECT * FROM scans ORDER BY id DESC LIMIT ?", (20,),
+     ("SCAN s",)),  # por rowid desde el final: LIMIT corta tras n filas
+    ("scans_after", "scans", "SELECT * FROM scans WHERE id > ? ORDER BY id LIMIT ?", (0, 50), ()),
+    ("replay_range", "scans",
+     "SELECT sku_id, mode, value FROM scan_log WHERE id > ? AND id <= ? ORDER BY id", (0, 100_000), ()),
+    ("load_checkpoint", "scans",
+     "SELECT id, scan_id FROM checkpoints WHERE 1=1 AND scan_id <= ? ORDER BY scan_id DESC, id DESC LIMIT 1",
+     (0,), ()),
+    ("as_of_checkpoint", "scans",
+     "SELECT id, scan_id FROM checkpoints WHERE 1=1 AND ts <= ? ORDER BY scan_id DESC, id DESC LIMIT 1",
+     (0,), ()),  # hacia atrás por scan_id: los snapshots son pocos
+    ("as_of_tail", "scans",
+     "SELECT sku_id, mode, value FROM scan_log WHERE id > ? AND +ts <= ? ORDER BY id", (0, 0), ()),
+    ("snapshot_due", "scans", "SELECT scan_id, ts FROM checkpoints ORDER BY scan_id DESC LIMIT 1", (), ()),
+    ("forecast_start", "scans", "SELECT MIN(id) FROM scan_log WHERE ts >= ?", (0,), ()),
+    ("forecast_window", "scans",
+     "SELECT id, sku_id, mode, ts, value FROM scan_log WHERE id >= ? AND +ts >= ? ORDER BY id", (0, 0), ()),
+    ("forecast_update", "scans", "SELECT id, sku_id, mode, ts, value FROM scan_log WHERE id > ? ORDER BY id", (0,), ()),
+    ("archive_files", "scans",
+     "SELECT name FROM archive_files WHERE last_id > ? AND first_id <= ? ORDER BY first_id", (0, 0),
+     ("USE TEMP B-TREE FOR ORDER BY",)),  # un archivo cada ARCHIVE_ROWS escaneos: pocas filas
+    ("daily_history", "scans",
+     """SELECT day, SUM(i), SUM(o), SUM(st) FROM (
+            SELECT day, inputs AS i, outputs AS o, sets AS st FROM scan_daily WHERE sku_id = ? AND day >= ?
+            UNION ALL
+            SELECT date(ts, 'unixepoch', 'localtime'), mode = 1, mode = 2, mode = 3
+            FROM scan_log WHERE sku_id = ?)
+        WHERE day >= ? GROUP BY day ORDER BY day""",
+     (0, "", 0, ""), ("USE TEMP B-TREE FOR GROUP BY",)),  # los días de un SKU
+    ("undo_ring", "scans",
+     f"SELECT {UNDO_COLS} FROM undo_log WHERE undone=0 ORDER BY id DESC LIMIT ?", (64,),
+     ("SCAN undo_log",)),  # acotada a UNDO_KEEP filas, por rowid desde el final
+    # ---------- stock.db ----------
+    ("stock_row", "stock",
+     "SELECT sku,product,brand,category,image,url,qty,percent FROM stock WHERE sku=?", ("",), ()),
+    ("get_stock", "stock", "SELECT qty, percent FROM stock_level WHERE sku_id=?", (0,), ()),
+    ("forecast_levels", "stock", "SELECT sku_id, qty, percent FROM stock_level", (),
+     ("SCAN stock_level",)),  # todo el stock, una fila por SKU
+    # una fila por SKU con stock; el nombre vive en catalog.db (LEFT JOIN), no hay índice que dé el orden
+    ("stock_table", "stock",
+     "SELECT sku,product,brand,category,image,url,qty,percent FROM stock ORDER BY product COLLATE NOCASE ASC LIMIT ?",
+     (200,), ("SCAN s", "USE TEMP B-TREE FOR ORDER BY")),
+    # keyset sobre la vista: como stock_table, top-N del stock entero (ver db/pages.py)
+    ("stock_page", "stock",
+     *pages.query(pages.STOCK_SORTS, "product", False, ("arroz", "78"), False,
+                  "sku,product,brand,category,image,url,qty,percent", "stock", indexed=False),
+     ("SCAN s", "USE TEMP B-TREE FOR ORDER BY")),
+    # ---------- catalog.db ----------
+    ("catalog_record", "catalog",
+     "SELECT sku,product,brand,category,image,url FROM products WHERE sku=?", ("",), ()),
+    ("sku_id", "catalog", "SELECT id FROM skus WHERE sku=?", ("",), ()),
+    ("search_prefix", "catalog",
+     "SELECT sku,product,brand,category,image,url FROM products WHERE sku >= ? AND sku < ? ORDER BY sku LIMIT ?",
+     ("78", "79", 200), ()),
+    ("search_fts", "catalog",
+     f"""SELECT p.sku,p.product,p.brand,p.category,p.image,p.url
+         FROM products_fts f JOIN products p ON p.rowid = f.rowid
+         WHERE products_fts MATCH ?
+         ORDER BY bm25(products_fts, {", ".join(map(str, search.BM25_WEIGHTS))})
+                  + ? * (julianday('now') - julianday(COALESCE(p.updated_at, '2000-01-01')))
+         LIMIT ?""",
+     ('"arroz"*', search.RECENCY_WEIGHT, 200), ("USE TEMP B-TREE FOR ORDER BY",)),  # ranking
+    ("catalog_page", "catalog",
+     *pages.query(pages.CATALOG_SORTS, "updated_at", True, ("2024-01-01", "78"), False,
+                  "sku,product,brand,category,image,url", "products"), ()),
+    ("catalog_page_back", "catalog",
+     *pages.query(pages.CATALOG_SORTS, "product", False, ("arroz", "78"), True,
+                  "sku,product,brand,category,image,url", "products"), ()),
+    ("search_recent", "catalog",
+     "SELECT sku,product,brand,category,image,url FROM products ORDER BY updated_at DESC LIMIT ?", (200,), ()),
+)
+
+# SCAN de una tabla sin índice ("SCAN t", "SCAN TABLE t AS x" en SQLite viejos);
+# "SCAN (subquery-N)" lee un co-routine ya acotado, no una tabla
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?[^\s(]\S*(?: AS \S+)?$")
+
+def explain(conn, sql: str, args: tuple = ()) -> List[Tuple[int, str]]:
+    """(profundidad, detalle) de cada línea de EXPLAIN QUERY PLAN."""
+    depth: Dict[int, int] = {0: -1}
+    out = []
+    for node, parent, _, detail in conn.execute("EXPLAIN QUERY PLAN " + sql, args):
+        depth[node] = depth.get(parent, -1) + 1
+        out.append((depth[node], detail))
+    return out
+
+def problems(plan: List[Tuple[int, str]], allowed: Tuple[str, ...] = ()) -> List[str]:
+    bad = []
+    for _, detail in plan:
+        if detail in allowed:
+            continue
+        if _FULL_SCAN.match(detail) or "AUTOMATIC" in detail or "TEMP B-TREE" in detail:
+            bad.append(detail)
+    return bad
+
+def _connect(path: Path, setup=None) -> sqlite3.Connection:
+    # conexión nueva: un EXPLAIN del caché de sentencias de una lectora vieja
+    # no se vuelve a preparar y seguiría mostrando un índice ya borrado
+    conn = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+    if setup is not None:
+        setup(conn)
+    return conn
+
+def check(lg) -> List[Tuple[str, str, List[Tuple[int, str]], List[str]]]:
+    """(nombre, db, plan, problemas) de cada consulta de HOT sobre las DBs de un ScanLogger."""
+    catalog = lg.catalog.db.path
+    conns = {"scans": _connect(lg.scans.path, schema.reader_setup(catalog, "scans")),
+             "stock": _connect(lg.stock.path, schema.reader_setup(catalog, "stock")),
+             "catalog": _connect(catalog)}
+    results = []
+    try:
+        for name, db, sql, args, allowed in HOT:
+            try:
+                plan = explain(conns[db], sql, args)
+            except sqlite3.Error as e:  # tabla/índice que no existe: también es una regresión
+                results.append((name, db, [], [f"error: {e}"]))
+                continue
+            results.append((name, db, plan, problems(plan, allowed)))
+    finally:
+        for conn in conns.values():
+            conn.close()
+    return results
+
+def report(results, out=None) -> List[str]:
+    """Imprime los planes; devuelve los nombres de las consultas con problemas."""
+    out = out or sys.stdout
+    failed = []
+    for name, db, plan, bad in results:
+        print(f"{name} [{db}]", file=out)
+        for depth, detail in plan:
+            print(f"  {'  ' * depth}{detail}", file=out)
+        for detail in bad:
+            print(f"  !! {detail}", file=out)
+        if bad:
+            failed.append(name)
+    return failed
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="python -m barcode_lib.db.plans")
+    ap.add_argument("--db-dir", type=Path, help="directory with the .db files (default barcode_lib/db)")
+    args = ap.parse_args(argv)
+    from barcode_lib.db.logger import ScanLogger
+    lg = ScanLogger(db_dir=args.db_dir, enrich_workers=1)
+    try:
+        failed = report(check(lg))
+    finally:
+        lg.close()
+    if failed:
+        raise SystemExit(f"FULL SCAN in {len(failed)} hot queries: {', '.join(failed)}")
+    print(f"{len(HOT)} hot queries, all using indexes.", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
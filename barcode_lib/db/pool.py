@@ -0,0 +1,151 @@
+import sqlite3, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+from barcode_lib import metrics
+
+# Pragmas por conexión (WAL es persistente en el archivo, el resto no)
+PRAGMAS: Dict[str, object] = {
+    "synchronous": "NORMAL",     # en WAL: sin corrupción ante crash, 1 fsync por checkpoint
+    "cache_size": -16000,        # ~16 MB de page cache
+    "mmap_size": 128 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+# -------------------- Connection Pool --------------------
+class ConnectionPool:
+    """
+    Una conexión escritora (serializada con un lock) + una conexión de solo
+    lectura por hilo, todas en modo WAL: los lectores (refresh de la GUI,
+    consultas) nunca bloquean ni son bloqueados por el commit de un escaneo.
+
+      with pool.write() as c:   # BEGIN IMMEDIATE ... COMMIT (o ROLLBACK)
+          c.execute(...)
+      pool.execute(sql, args)   # lectura en la conexión del hilo actual
+
+    setup(conn) corre en cada lectora al abrirla (y de nuevo tras refresh()),
+    p.ej. para adjuntar otra DB y crear vistas TEMP (ver db/schema.py).
+    """
+    def __init__(self, path: Path, setup: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.path = Path(path)
+        self._setup = setup
+        self._gen = 0
+        self._wlock = threading.RLock()
+        self._depth = 0
+        self._owner = None
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._writer = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._tune(self._writer)
+        self._m_write = metrics.histogram("sqlite_write_seconds", "BEGIN IMMEDIATE .. COMMIT", db=self.path.stem)
+        self._m_commit = metrics.histogram("sqlite_commit_seconds", db=self.path.stem)
+
+    @staticmethod
+    def _tune(conn: sqlite3.Connection):
+        for k, v in PRAGMAS.items():
+            conn.execute(f"PRAGMA {k}={v}")
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        with self._wlock:
+            outer = self._depth == 0
+            if outer:
+                t0 = time.perf_counter()
+                self._writer.execute("BEGIN IMMEDIATE")
+                self._owner = threading.get_ident()
+            self._depth += 1
+            try:
+                yield self._writer
+            except BaseException:
+                self._depth -= 1
+                if outer:
+                    self._owner = None
+                    self._writer.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if outer:
+                self._owner = None
+                t1 = time.perf_counter()
+                self._writer.execute("COMMIT")
+                t2 = time.perf_counter()
+                self._m_commit.observe(t2 - t1)
+                self._m_write.observe(t2 - t0)
+
+    def data_version(self) -> Optional[int]:
+        # cambia solo si otra conexión (otro proceso) commiteó en este archivo;
+        # None si la escritora está ocupada (no bloquear a quien sondea, p.ej. la GUI)
+        if not self._wlock.acquire(blocking=False):
+            return None
+        try:
+            return self._writer.execute("PRAGMA data_version").fetchone()[0]
+        finally:
+            self._wlock.release()
+
+    def read(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path.resolve().as_uri() + "?mode=ro", uri=True, check_same_thread=False)
+            self._tune(conn)
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+            self._local.gen = -1
+            with self._readers_lock:
+                self._readers.append(conn)
+        if self._setup is not None and self._local.gen != self._gen:
+            self._local.gen = self._gen
+            conn.execute("PRAGMA query_only=0")  # las vistas TEMP también cuentan como escritura
+            try:
+                self._setup(conn)
+            finally:
+                conn.execute("PRAGMA query_only=1")
+        return conn
+
+    def refresh(self):
+        """Cada lectora vuelve a correr setup en su próximo uso (cambió el esquema)."""
+        self._gen += 1
+
+    def in_write(self) -> bool:
+        """True si el hilo actual está dentro de un write() de este pool."""
+        return self._owner == threading.get_ident()
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        # dentro de un write() del mismo hilo se lee con la escritora (ve lo no commiteado)
+        if self.in_write():
+            return self._writer.execute(sql, params)
+        return self.read().execute(sql, params)
+
+    @contextmanager
+    def snapshot(self) -> Iterator[sqlite3.Connection]:
+        """Varias lecturas sobre la misma foto de la DB (una transacción de lectura)."""
+        if self.in_write():
+            yield self._writer
+            return
+        conn = self.read()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("ROLLBACK")
+
+    def checkpoint(self):
+        """Vuelca el WAL al archivo principal y lo trunca."""
+        with self._wlock:
+            self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def vacuum(self):
+        with self._wlock:
+            self._writer.execute("VACUUM")
+
+    def close(self):
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        with self._wlock:
+            self._writer.close()
@@ -0,0 +1,192 @@
+import sqlite3, zlib
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterable, Tuple, Union
+from barcode_lib.db.schema import MODES, epoch
+
+# Estado de stock durante un replay: sku_id -> (qty, percent)
+State = Dict[int, Tuple[Any, Any]]
+
+CHECKPOINT_EVERY = 100_000  # escaneos entre snapshots durante un replay
+
+SCHEMA = (
+    # ts: máximo ts de los escaneos id <= scan_id (el snapshot sirve para "stock al instante T" si ts <= T)
+    """CREATE TABLE IF NOT EXISTS checkpoints (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        scan_id INTEGER NOT NULL,
+        ts INTEGER
+    )""",
+    """CREATE TABLE IF NOT EXISTS checkpoint_stock (
+        checkpoint_id INTEGER NOT NULL,
+        sku_id INTEGER NOT NULL,
+        qty INTEGER,
+        percent INTEGER,
+        PRIMARY KEY (checkpoint_id, sku_id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_checkpoints_scan_id ON checkpoints(scan_id)",
+)
+
+def ensure_schema(c: sqlite3.Connection):
+    for sql in SCHEMA:
+        c.execute(sql)
+
+def parse_pct(value) -> Optional[int]:
+    # scans.value de un set: "pct|delta"
+    try:
+        return int(str(value).split("|", 1)[0])
+    except Exception:
+        return None
+
+def apply_rows(state: State, rows: Iterable[Tuple[int, int, Any]]) -> State:
+    """Aplica (sku_id, mode, value) de scan_log en orden con las mismas reglas que los handlers en vivo."""
+    from barcode_lib.db.logger import step_stock
+    get = state.get
+    names = dict(enumerate(MODES, 1))
+    for sku, mode, value in rows:
+        mode = names.get(mode)
+        if mode is None:
+            continue
+        new, _ = step_stock(get(sku), mode, parse_pct(value) if mode == "set" else None)
+        if new is not None:
+            state[sku] = new
+    return state
+
+# ---------- checkpoints ----------
+def load_checkpoint(conn, upto_id: Optional[int] = None, upto_ts: Optional[int] = None) -> Tuple[int, State]:
+    """Último snapshot con scan_id <= upto_id (y toda su historia con ts <= upto_ts); (0, {}) si no hay."""
+    sql, args = "SELECT id, scan_id FROM checkpoints WHERE 1=1", []
+    if upto_id is not None:
+        sql += " AND scan_id <= ?"; args.append(upto_id)
+    if upto_ts is not None:
+        sql += " AND ts <= ?"; args.append(upto_ts)
+    row = conn.execute(sql + " ORDER BY scan_id DESC, id DESC LIMIT 1", args).fetchone()
+    if not row:
+        return 0, {}
+    cp_id, scan_id = row
+    cur = conn.execute("SELECT sku_id, qty, percent FROM checkpoint_stock WHERE checkpoint_id=?", (cp_id,))
+    return scan_id, {sku: (qty, pct) for sku, qty, pct in cur}
+
+def has_checkpoint(conn, scan_id: int) -> bool:
+    return conn.execute("SELECT 1 FROM checkpoints WHERE scan_id=?", (scan_id,)).fetchone() is not None
+
+def save_checkpoint(c: sqlite3.Connection, scan_id: int, state: State):
+    if has_checkpoint(c, scan_id):
+        return
+    # máximo ts del prefijo, incremental desde el snapshot anterior (la historia importada trae ts viejos)
+    prev = c.execute("SELECT scan_id, ts FROM checkpoints WHERE scan_id < ? ORDER BY scan_id DESC LIMIT 1",
+                     (scan_id,)).fetchone() or (0, None)
+    top = c.execute("SELECT MAX(ts) FROM scan_log WHERE id > ? AND id <= ?", (prev[0], scan_id)).fetchone()[0]
+    # lo ya archivado del tramo (por archivo entero: a lo sumo un ts de más, nunca de menos)
+    arch = c.execute("SELECT MAX(max_ts) FROM archive_files WHERE last_id > ? AND first_id <= ?",
+                     (prev[0], scan_id)).fetchone()[0]
+    ts = max((t for t in (prev[1], top, arch) if t is not None), default=None)
+    cp_id = c.execute("INSERT INTO checkpoints (scan_id, ts) VALUES (?, ?)", (scan_id, ts)).lastrowid
+    c.executemany(
+        "INSERT INTO checkpoint_stock (checkpoint_id, sku_id, qty, percent) VALUES (?,?,?,?)",
+        ((cp_id, sku, qty, pct) for sku, (qty, pct) in state.items()),
+    )
+
+def drop_checkpoints(c: sqlite3.Connection, from_scan_id: int = 0):
+    """Invalida snapshots que incluyen escaneos >= from_scan_id (borrados o reescritos)."""
+    ids = [r[0] for r in c.execute("SELECT id FROM checkpoints WHERE scan_id >= ?", (from_scan_id,))]
+    c.executemany("DELETE FROM checkpoint_stock WHERE checkpoint_id=?", ((i,) for i in ids))
+    c.executemany("DELETE FROM checkpoints WHERE id=?", ((i,) for i in ids))
+
+# ---------- replay ----------
+def _bucket(sku, n: int) -> int:
+    return zlib.crc32(str(sku).encode("utf-8")) % n
+
+def _replay_bucket(path: str, after_id: int, upto_id: int, bucket: int, n: int, base: State) -> State:
+    # corre en un proceso aparte: conexión propia de solo lectura
+    conn = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+    conn.create_function("sku_bucket", 2, _bucket, deterministic=True)
+    try:
+        cur = conn.execute(
+            "SELECT sku_id, mode, value FROM scan_log WHERE id > ? AND id <= ? AND sku_bucket(sku_id, ?) = ? ORDER BY id",
+            (after_id, upto_id, n, bucket),
+        )
+        return apply_rows(base, cur)
+    finally:
+        conn.close()
+
+def replay(pool, upto_id: Optional[int] = None, workers: int = 1,
+           checkpoint_every: int = CHECKPOINT_EVERY) -> Tuple[int, State]:
+    """
+    Reconstruye el stock en una sola pasada por rowid desde el último snapshot
+    válido (o desde cero). Devuelve (último scan_id aplicado, estado).
+      workers > 1  -> reparte los SKU por hash entre procesos (historias enormes)
+      checkpoint_every -> guarda un snapshot cada N escaneos del tramo replayado
+    """
+    if upto_id is None:
+        row = pool.execute("SELECT MAX(id) FROM scan_log").fetchone()
+        upto_id = (row[0] if row else 0) or 0
+    after_id, state = load_checkpoint(pool, upto_id=upto_id)
+    if after_id >= upto_id:
+        return after_id, state
+    after_id, state = _through_archive(pool, after_id, state, upto_id)
+    if after_id >= upto_id:
+        return after_id, state
+
+    if workers and workers > 1:
+        # sin la escritora tomada durante el replay: solo bajo rebuild_stock (ScanLogger._exclusive)
+        base = [{} for _ in range(workers)]
+        for sku, row in state.items():
+            base[_bucket(sku, workers)][sku] = row
+        from concurrent.futures import ProcessPoolExecutor  # solo con workers>1: no cargarlo al arrancar
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            futs = [ex.submit(_replay_bucket, str(pool.path), after_id, upto_id, b, workers, base[b])
+                    for b in range(workers)]
+            state = {}
+            for f in futs:
+                state.update(f.result())
+        with pool.write() as c:
+            save_checkpoint(c, upto_id, state)
+        return upto_id, state
+
+    last = after_id
+    while last < upto_id:
+        # tramos de checkpoint_every filas: acotan memoria del cursor y marcan snapshots.
+        # Lectura y snapshot en la misma transacción; si un undo/redo tocó historia ya
+        # aplicada, borró el snapshot anterior (drop_checkpoints) y se vuelve a cargar.
+        stop = min(upto_id, last + max(1, int(checkpoint_every)))
+        with pool.write() as c:
+            if last and not has_checkpoint(c, last):
+                last, state = load_checkpoint(c, upto_id=upto_id)
+                continue
+            cur = c.execute("SELECT sku_id, mode, value FROM scan_log WHERE id > ? AND id <= ? ORDER BY id", (last, stop))
+            apply_rows(state, cur)
+            save_checkpoint(c, stop, state)
+        last = stop
+    return last, state
+
+def _through_archive(pool, after_id: int, state: State, upto_id: int) -> Tuple[int, State]:
+    """
+    Si el snapshot es anterior al borde de lo archivado (db/archive.py guarda
+    uno justo en el borde, así que solo si se borraron), el tramo que falta
+    se lee de los archivos y se deja un snapshot en el borde.
+    """
+    from barcode_lib.db import archive
+    with pool.write() as c:
+        base = min(archive.boundary(c), upto_id)
+        if after_id >= base:
+            return after_id, state
+        apply_rows(state, archive.rows(c, archive.directory(pool), after_id, base))
+        save_checkpoint(c, base, state)
+    return base, state
+
+def state_at(pool, ts: Union[int, float, str]) -> State:
+    """
+    Stock al instante ts (epoch o texto local, ver schema.epoch): escaneos con
+    ts <= T en orden de id, desde el último snapshot cuya historia entera es
+    anterior a T. No guarda snapshots (el tramo filtrado no es un prefijo).
+    """
+    from barcode_lib.db import archive
+    t = epoch(ts)
+    with pool.snapshot() as conn:
+        after_id, state = load_checkpoint(conn, upto_ts=t)
+        base = archive.boundary(conn)
+        if after_id < base:  # antes del borde de lo archivado: esa parte sale de los archivos
+            apply_rows(state, archive.rows(conn, archive.directory(pool), after_id, base, upto_ts=t))
+        # +ts: recorrer por rowid desde el snapshot, no todo el índice de ts hasta T
+        cur = conn.execute("SELECT sku_id, mode, value FROM scan_log WHERE id > ? AND +ts <= ? ORDER BY id",
+                           (after_id, t))
+        return apply_rows(state, cur)
@@ -0,0 +1,115 @@
+"""
+Esquema normalizado de escaneos y stock.
+
+  catalog.db  products(sku, product, brand, ...)         datos de producto
+              skus(id, sku)                             SKU internado (id estable, nunca se borra)
+  scans.db    scan_log(id, sku_id, mode, ts, value)     mode 1/2/3, ts en epoch (segundos)
+  stock.db    stock_level(sku_id, qty, percent)
+
+Los datos de producto viven solo en catalog.products: un escaneo o una fila
+de stock ya no copian nombre/marca/imagen (ni quedan desactualizados cuando
+el enrichment los completa).
+
+Las conexiones de lectura adjuntan catalog.db (solo lectura) y crean las
+vistas TEMP `scans` y `stock` con las columnas de siempre (sku, product,
+brand, category, image, url, ... y ts como texto local), así que last(),
+stock_table(), los exports y las consultas ad-hoc no cambian. La escritora
+no adjunta nada (un BEGIN IMMEDIATE tomaría también el lock de catalog.db) y
+escribe directo en las tablas base.
+
+Cada archivo lleva su versión en PRAGMA user_version (ver migrate.upgrade).
+"""
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Union
+
+MODES = ("input", "output", "set")
+MODE_ID = {m: i for i, m in enumerate(MODES, 1)}  # 0 = modo desconocido (historia vieja)
+
+PRODUCTS = """CREATE TABLE IF NOT EXISTS products (
+    sku TEXT PRIMARY KEY,
+    product TEXT,
+    brand TEXT,
+    category TEXT,
+    image TEXT,
+    url TEXT,
+    updated_at TEXT
+)"""
+
+SKUS = "CREATE TABLE IF NOT EXISTS skus (id INTEGER PRIMARY KEY, sku TEXT NOT NULL UNIQUE)"
+
+SCANS = (
+    """CREATE TABLE IF NOT EXISTS scan_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sku_id INTEGER NOT NULL,
+        mode INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        value TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_scan_log_ts ON scan_log(ts)",
+)
+
+STOCK = (
+    """CREATE TABLE IF NOT EXISTS stock_level (
+        sku_id INTEGER PRIMARY KEY,
+        qty INTEGER NOT NULL DEFAULT 0,
+        percent INTEGER NOT NULL DEFAULT 100
+    )""",
+)
+
+_MODE_TEXT = "CASE s.mode " + " ".join(f"WHEN {i} THEN '{m}'" for m, i in MODE_ID.items()) + " END"
+
+SCANS_VIEW = f"""CREATE TEMP VIEW scans AS
+    SELECT s.id AS id, k.sku AS sku, p.product AS product, p.brand AS brand, p.category AS category,
+           p.image AS image, p.url AS url, {_MODE_TEXT} AS mode,
+           datetime(s.ts, 'unixepoch', 'localtime') AS ts, s.value AS value
+    FROM main.scan_log s
+    JOIN catalog.skus k ON k.id = s.sku_id
+    LEFT JOIN catalog.products p ON p.sku = k.sku"""
+
+# mientras migrate.py mueve la historia vieja, lo que falta mover sigue visible
+LEGACY_SCANS_UNION = """
+    UNION ALL
+    SELECT id, sku, product, brand, category, image, url, mode, ts, value FROM main.scans_legacy"""
+
+STOCK_VIEW = """CREATE TEMP VIEW stock AS
+    SELECT k.sku AS sku, p.product AS product, p.brand AS brand, p.category AS category,
+           p.image AS image, p.url AS url, s.qty AS qty, s.percent AS percent
+    FROM main.stock_level s
+    JOIN catalog.skus k ON k.id = s.sku_id
+    LEFT JOIN catalog.products p ON p.sku = k.sku"""
+
+def has_table(c: sqlite3.Connection, name: str) -> bool:
+    return c.execute("SELECT 1 FROM main.sqlite_master WHERE type='table' AND name=?", (name,)).fetchone() is not None
+
+# -------------------- Tiempo --------------------
+def epoch(ts: Union[None, int, float, str] = None) -> int:
+    """Epoch en segundos: ahora, un número, o un texto 'YYYY-MM-DD HH:MM:SS' (hora local)."""
+    if ts is None:
+        return int(datetime.now().timestamp())
+    if isinstance(ts, (int, float)):
+        return int(ts)
+    ts = str(ts).strip()
+    if ts.lstrip("-").isdigit():
+        return int(ts)
+    return int(datetime.fromisoformat(ts).timestamp())
+
+# -------------------- Vistas de lectura --------------------
+def reader_setup(catalog_path: Path, view: str):
+    """
+    setup para ConnectionPool: adjunta catalog.db y (re)crea la vista TEMP
+    `view` ('scans' o 'stock'). Corre de nuevo tras pool.refresh().
+    """
+    uri = Path(catalog_path).resolve().as_uri() + "?mode=ro"
+
+    def setup(conn: sqlite3.Connection):
+        if not any(r[1] == "catalog" for r in conn.execute("PRAGMA database_list")):
+            conn.execute("ATTACH DATABASE ? AS catalog", (uri,))
+        conn.execute(f"DROP VIEW IF EXISTS temp.{view}")
+        if view == "stock":
+            conn.execute(STOCK_VIEW)
+        else:
+            conn.execute(SCANS_VIEW + (LEGACY_SCANS_UNION if has_table(conn, "scans_legacy") else ""))
+    return setup
+
@@ -0,0 +1,73 @@
+import re, sqlite3, unicodedata
+from typing import Optional
+
+# Índice FTS5 sobre products (external content: el texto vive solo en products).
+# unicode61 + remove_diacritics 2: "azucar" encuentra "Azúcar", "nandu" encuentra "Ñandú".
+# prefix='2 3': índices de prefijo para búsquedas incrementales ("arr*").
+SCHEMA = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        sku, product, brand, category,
+        content='products', content_rowid='rowid',
+        tokenize="unicode61 remove_diacritics 2", prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, sku, product, brand, category)
+        VALUES (new.rowid, new.sku, new.product, new.brand, new.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, sku, product, brand, category)
+        VALUES ('delete', old.rowid, old.sku, old.product, old.brand, old.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, sku, product, brand, category)
+        VALUES ('delete', old.rowid, old.sku, old.product, old.brand, old.category);
+        INSERT INTO products_fts(rowid, sku, product, brand, category)
+        VALUES (new.rowid, new.sku, new.product, new.brand, new.category);
+    END""",
+)
+
+# pesos bm25 por columna (sku, product, brand, category) y castigo por antigüedad (por día)
+BM25_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+RECENCY_WEIGHT = 0.002
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+TRIGGERS = ("products_fts_ai", "products_fts_ad", "products_fts_au")
+
+def ensure_fts(c: sqlite3.Connection) -> bool:
+    """
+    Crea índice y triggers. Lo repuebla si no existía o si faltaban triggers
+    (p.ej. un import masivo que se cortó con el índice suspendido).
+    False si SQLite no trae FTS5.
+    """
+    try:
+        have = {r[0] for r in c.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (?,?,?,?)", ("products_fts",) + TRIGGERS)}
+        for sql in SCHEMA:
+            c.execute(sql)
+        if len(have) < len(TRIGGERS) + 1:
+            c.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def suspend_fts(c: sqlite3.Connection):
+    """Quita los triggers para cargas masivas; ensure_fts los repone y reconstruye el índice."""
+    for name in TRIGGERS:
+        c.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+def fold(text: str) -> str:
+    """Minúsculas y sin tildes: 'Azúcar Ñandú' -> 'azucar nandu'."""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+def match_query(text: str) -> Optional[str]:
+    """Texto libre -> expresión MATCH: cada palabra como prefijo, todas requeridas."""
+    terms = _TOKEN_RE.findall(fold(text))
+    if not terms:
+        return None
+    return " ".join(f'"{t}"*' for t in terms)
+
+def sku_upper_bound(prefix: str) -> str:
+    # sku >= prefix AND sku < bound  ==  sku LIKE 'prefix%' usando el índice de la PK
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
@@ -0,0 +1,63 @@
+"""
+Snapshots periódicos de stock (tabla checkpoints de scans.db) para que
+ScanLogger.stock_as_of(ts) y rebuild_stock replayen solo un tramo corto.
+
+Un hilo mira cada `poll` segundos el último escaneo y el último snapshot y
+guarda uno nuevo cuando hay `every` escaneos sin cubrir, o cuando hay al
+menos uno y el snapshot anterior es de hace más de `interval` segundos. La
+condición sale de la DB, así que sobrevive a reinicios del programa.
+
+El snapshot se calcula con replay incremental desde el anterior, no copiando
+stock_level: los checkpoints tienen que ser historia pura (set_all_percent o
+un import de stock no son escaneos y rebuild_stock no debe heredarlos).
+"""
+import threading
+from typing import Callable, Optional
+from barcode_lib.db import replay
+from barcode_lib.db.schema import epoch
+
+SNAPSHOT_EVERY = 10_000          # escaneos sin cubrir que disparan un snapshot
+SNAPSHOT_INTERVAL = 24 * 3600    # s: snapshot diario si hubo escaneos
+SNAPSHOT_POLL = 60.0             # s entre chequeos
+
+class Snapshotter(threading.Thread):
+    def __init__(self, scans_pool, every: int = SNAPSHOT_EVERY, interval: float = SNAPSHOT_INTERVAL,
+                 poll: float = SNAPSHOT_POLL, ready: Callable[[], bool] = lambda: True):
+        super().__init__(daemon=True, name="stock-snapshots")
+        self.pool = scans_pool
+        self.every, self.interval, self.poll = max(1, int(every)), interval, poll
+        self.ready = ready  # False mientras la historia está incompleta (migración en curso)
+        self.taken = 0
+        self.error: Optional[BaseException] = None
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.poll):
+            try:
+                self.snapshot()
+            except Exception as e:  # se reintenta en el próximo chequeo
+                self.error = e
+
+    def due(self) -> Optional[int]:
+        """scan_id hasta el que conviene guardar un snapshot ahora; None si no hace falta."""
+        top = self.pool.execute("SELECT MAX(id) FROM scan_log").fetchone()[0] or 0
+        cp = self.pool.execute("SELECT scan_id, ts FROM checkpoints ORDER BY scan_id DESC LIMIT 1").fetchone()
+        last, ts = cp or (0, None)
+        if top <= last:
+            return None
+        if top - last >= self.every or ts is None or epoch() - ts >= self.interval:
+            return top
+        return None
+
+    def snapshot(self) -> Optional[int]:
+        top = self.due() if self.ready() else None
+        if top is not None:
+            # tramos de `every` filas: cada uno toma la escritora de scans.db solo unos ms
+            replay.replay(self.pool, upto_id=top, checkpoint_every=self.every)
+            self.taken += 1
+        return top
+
+    def stop(self):
+        self._halt.set()
+        if self.is_alive():
+            self.join()
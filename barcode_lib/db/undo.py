@@ -0,0 +1,99 @@
+import json, sqlite3, threading
+from collections import deque
+from typing import Optional, Dict, Any, List
+
+UNDO_RING = 64      # acciones recientes en memoria (undo sin tocar disco)
+UNDO_KEEP = 1000    # acciones persistidas en undo_log
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS undo_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    sku TEXT,
+    scan_id INTEGER,
+    mode TEXT,
+    value TEXT,
+    ts TEXT,
+    before TEXT,
+    after TEXT,
+    undone INTEGER NOT NULL DEFAULT 0
+)"""
+
+COLS = "id, kind, sku, scan_id, mode, value, ts, before, after"
+
+def _dump(v) -> Optional[str]:
+    return None if v is None else json.dumps(v, separators=(",", ":"))
+
+def _record(row) -> Dict[str, Any]:
+    r = dict(zip(("id", "kind", "sku", "scan_id", "mode", "value", "ts", "before", "after"), row))
+    r["before"] = None if r["before"] is None else json.loads(r["before"])
+    r["after"] = None if r["after"] is None else json.loads(r["after"])
+    return r
+
+# -------------------- Undo Log --------------------
+class UndoLog:
+    """
+    Registro de inversas de cada mutación ("scan" o "product") en la tabla
+    undo_log de scans.db, con un ring acotado en memoria para las últimas
+    UNDO_RING acciones. Cada registro guarda el estado antes/después de la
+    fila tocada, así que deshacer o rehacer es O(1): no se re-procesa historia.
+    Las acciones deshechas quedan con undone=1 (pila de redo) hasta que una
+    mutación nueva las descarta.
+    """
+    def __init__(self, pool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        with pool.write() as c:
+            c.execute(SCHEMA)
+        cur = pool.execute(f"SELECT {COLS} FROM undo_log WHERE undone=0 ORDER BY id DESC LIMIT ?", (UNDO_RING,))
+        self._ring = deque((_record(r) for r in reversed(cur.fetchall())), maxlen=UNDO_RING)
+        cur = pool.execute(f"SELECT {COLS} FROM undo_log WHERE undone=1 ORDER BY id DESC")
+        self._redo: List[Dict[str, Any]] = [_record(r) for r in cur.fetchall()]
+        self._since_prune = 0
+
+    def record(self, c: sqlite3.Connection, kind: str, sku: str, before, after,
+               scan_id: Optional[int] = None, mode: Optional[str] = None,
+               value: Optional[str] = None, ts: Optional[str] = None):
+        """Anota una mutación dentro de la transacción de scans.db del llamador."""
+        with self._lock:
+            if self._redo:
+                c.execute("DELETE FROM undo_log WHERE undone=1")
+                self._redo.clear()
+            rid = c.execute(
+                "INSERT INTO undo_log (kind, sku, scan_id, mode, value, ts, before, after) VALUES (?,?,?,?,?,?,?,?)",
+                (kind, sku, scan_id, mode, value, ts, _dump(before), _dump(after)),
+            ).lastrowid
+            self._ring.append({"id": rid, "kind": kind, "sku": sku, "scan_id": scan_id, "mode": mode,
+                               "value": value, "ts": ts, "before": before, "after": after})
+            self._since_prune += 1
+            if self._since_prune >= 100:
+                c.execute("DELETE FROM undo_log WHERE id <= ?", (rid - UNDO_KEEP,))
+                self._since_prune = 0
+
+    def pop_undo(self, c: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self._ring:
+                rec = self._ring.pop()
+            else:
+                # ring vacío: seguir con lo persistido más antiguo
+                row = c.execute(f"SELECT {COLS} FROM undo_log WHERE undone=0 ORDER BY id DESC LIMIT 1").fetchone()
+                if not row:
+                    return None
+                rec = _record(row)
+            c.execute("UPDATE undo_log SET undone=1 WHERE id=?", (rec["id"],))
+            self._redo.append(rec)
+            return rec
+
+    def pop_redo(self, c: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if not self._redo:
+                return None
+            rec = self._redo.pop()
+            c.execute("UPDATE undo_log SET undone=0 WHERE id=?", (rec["id"],))
+            self._ring.append(rec)
+            return rec
+
+    def clear(self, c: sqlite3.Connection):
+        with self._lock:
+            c.execute("DELETE FROM undo_log")
+            self._ring.clear()
+            self._redo.clear()
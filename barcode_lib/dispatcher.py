@@ -0,0 +1,105 @@
+import queue, threading
+from typing import Callable, Optional
+from barcode_lib import metrics
+
+MAX_BATCH = 256  # escaneos por transacción en una ráfaga
+
+# -------------------- Dispatcher --------------------
+class Dispatcher:
+    """
+    Actor único dueño del BarcodeReader: stdin, la GUI (y cualquier otra
+    fuente) hacen post(code) y un solo hilo consume la cola en orden, así
+    current_mode, el SKU pendiente de SetMode y las conexiones nunca se
+    tocan desde dos hilos a la vez.
+
+      - escaneos de inventario consecutivos (sin comandos entre medio) que
+        ya esperan en la cola se aplican juntos: reader.dispatch_batch ->
+        una transacción por DB
+      - on_batch(n) se llama una vez por lote (la GUI refresca una vez)
+      - call(fn, *args) ejecuta fn en el hilo del actor (botones de la GUI)
+      - on_exit() si un comando pide salir (estado 'exit')
+    """
+    def __init__(self, reader, max_batch: int = MAX_BATCH,
+                 on_batch: Optional[Callable[[int], None]] = None,
+                 on_exit: Optional[Callable[[], None]] = None):
+        self.reader = reader
+        self.max_batch = max(1, int(max_batch))
+        self.on_batch = on_batch
+        self.on_exit = on_exit
+        self._q = queue.Queue()
+        self._carry = None  # item que cortó el último lote
+        self._thread = threading.Thread(target=self._run, daemon=True, name="dispatcher")
+
+    def start(self) -> "Dispatcher":
+        self._thread.start()
+        return self
+
+    def post(self, code: str):
+        code = (code or "").strip()
+        if code:
+            self._q.put(("code", code))
+
+    def call(self, fn: Callable, *args):
+        self._q.put(("call", (fn, args)))
+
+    def join(self):
+        """Espera a que se procese todo lo encolado hasta ahora."""
+        self._q.join()
+
+    def stop(self):
+        self._q.put(None)
+        self._thread.join()
+
+    # ---------- internals ----------
+    def _next(self):
+        if self._carry is not None:
+            item, self._carry = self._carry, None
+            return item
+        return self._q.get()
+
+    def _batchable(self, item) -> bool:
+        return item is not None and item[0] == "code" and self.reader.can_batch(item[1])
+
+    def _run(self):
+        while True:
+            item = self._next()
+            if item is None:
+                self._q.task_done()
+                return
+            batch = [item]
+            if self._batchable(item):
+                while len(batch) < self.max_batch:
+                    try:
+                        nxt = self._q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if not self._batchable(nxt):
+                        self._carry = nxt
+                        break
+                    batch.append(nxt)
+            with metrics.timer("dispatch_batch_seconds"):
+                self._execute(batch)
+            metrics.counter("dispatch_items_total").inc(len(batch))
+            for _ in batch:
+                self._q.task_done()
+            if self.on_batch:
+                try:
+                    self.on_batch(len(batch))
+                except Exception:
+                    pass
+
+    def _execute(self, batch):
+        try:
+            kind, payload = batch[0]
+            if kind == "call":
+                fn, args = payload
+                fn(*args)
+            elif len(batch) > 1:
+                self.reader.dispatch_batch([code for _, code in batch])
+            else:
+                self.reader._dispatch(payload)
+        except KeyboardInterrupt:
+            if self.on_exit:
+                self.on_exit()
+        except Exception as e:
+            print("ERR:", e)
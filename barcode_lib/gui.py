@@ -1,10 +1,159 @@
-import os, io, requests, tkinter as tk
+import queue, threading, tkinter as tk
+from datetime import date
 from tkinter import ttk, messagebox, filedialog
-from PIL import Image, ImageTk
-
-THUMB_SIZE = (260, 260)
-
-def run_gui(reader):
+from PIL import ImageTk
+from barcode_lib.db import imagestore, pages
+from barcode_lib.thumbs import ThumbnailLoader
+from barcode_lib import metrics
+
+PREFETCH_ROWS = 40       # filas visibles cuyas miniaturas se precargan
+POLL_MS = 50             # sondeo del bus de cambios (solo compara un entero)
+EXTERNAL_POLL_MS = 1000  # PRAGMA data_version para escrituras de otros procesos
+LOG_LINES = 50
+KEEP_ROWS = 3 * pages.PAGE  # filas cargadas a la vez en las tablas paginadas
+
+# -------------------- Tabla paginada --------------------
+class PagedTree:
+    """
+    Muestra en un Treeview una ventana de a lo sumo `keep` filas de una lista
+    paginada por cursor (db/pages.py): al acercarse al final (o al principio)
+    de lo cargado pide la página siguiente (o la anterior) y descarta del
+    otro extremo, así que la memoria y el costo de la tabla no dependen del
+    largo de la lista.
+
+    fetch(after, back, limit) -> filas en orden de pantalla con la clave al
+    final; show(row) -> (values, imagen) de cada fila; iid = sku (row[0]).
+    """
+    def __init__(self, tree, fetch, show, page: int = pages.PAGE, keep: int = KEEP_ROWS, on_load=None):
+        self.tree, self.fetch, self.show = tree, fetch, show
+        self.page, self.keep = page, max(keep, 2 * page)
+        self.on_load = on_load  # tras cada carga (p.ej. precarga de miniaturas)
+        self.cursors = {}       # iid -> cursor de la fila
+        self.images = {}        # iid -> imagen
+        self.more_before = self.more_after = False
+        self._pending = False
+        self._yscroll = tree.cget("yscrollcommand")
+        tree.configure(yscrollcommand=self._on_scroll)
+
+    def _on_scroll(self, first, last):
+        if self._yscroll:
+            self.tree.tk.call(self._yscroll, first, last)
+        first, last = float(first), float(last)
+        back = first <= 0.15 and self.more_before
+        if not self._pending and (back or (last >= 0.85 and self.more_after)):
+            self._pending = True
+            self.tree.after_idle(self._grow, back)
+
+    def _put(self, rows, index="end"):
+        for r in rows:
+            iid = r[0]
+            if self.tree.exists(iid):  # cambió de lugar entre páginas
+                self.tree.delete(iid)
+            values, image = self.show(r)
+            self.tree.insert("", index, iid=iid, values=values)
+            self.cursors[iid] = pages.cursor(r)
+            self.images[iid] = image
+            if index != "end":
+                index += 1
+
+    def _drop(self, iids):
+        self.tree.delete(*iids)
+        for iid in iids:
+            self.cursors.pop(iid, None); self.images.pop(iid, None)
+
+    def _top(self) -> int:
+        return int(round(self.tree.yview()[0] * len(self.tree.get_children())))
+
+    def _grow(self, back: bool):
+        self._pending = False
+        children = self.tree.get_children()
+        if not children:
+            return
+        top = self._top()
+        rows = self.fetch(self.cursors[children[0] if back else children[-1]], back, self.page)
+        if back:
+            self.more_before = len(rows) == self.page
+            self._put(rows, 0)
+            top += len(rows)
+        else:
+            self.more_after = len(rows) == self.page
+            self._put(rows)
+        children = self.tree.get_children()
+        extra = len(children) - self.keep
+        if extra > 0:
+            if back:
+                self._drop(children[-extra:]); self.more_after = True
+            else:
+                self._drop(children[:extra]); self.more_before = True
+                top -= extra
+        self.tree.yview_moveto(max(0, top) / max(1, len(self.tree.get_children())))
+        if self.on_load:
+            self.on_load()
+
+    def reset(self):
+        """Vuelve al principio de la lista (orden o filtro nuevos)."""
+        self._drop(self.tree.get_children())
+        rows = self.fetch(None, False, self.page)
+        self._put(rows)
+        self.more_before, self.more_after = False, len(rows) == self.page
+        self.tree.yview_moveto(0)
+        if self.on_load:
+            self.on_load()
+
+    def reload(self):
+        """Vuelve a leer la ventana cargada en el mismo lugar (cambiaron filas)."""
+        children = self.tree.get_children()
+        if not children:
+            return self.reset()
+        sel, top = self.tree.selection(), self._top()
+        after = None
+        if self.more_before:
+            prev = self.fetch(self.cursors[children[0]], True, 1)
+            after = pages.cursor(prev[-1]) if prev else None
+        want = max(len(children), self.page)
+        rows = self.fetch(after, False, want)
+        self._drop(children)
+        self._put(rows)
+        self.more_before, self.more_after = after is not None, len(rows) == want
+        if sel and self.tree.exists(sel[0]):
+            self.tree.selection_set(sel[0])
+        self.tree.yview_moveto(top / max(1, len(rows)))
+        if self.on_load:
+            self.on_load()
+
+# -------------------- Catálogo desde la GUI --------------------
+def save_product(dispatcher, sku: str, info: dict, done=None, failed=None):
+    """
+    Alta/edición del diálogo Add. La imagen (archivo elegido o URL del
+    autofill) se copia al almacén (db/imagestore.py) en otro hilo, para no
+    frenar los escaneos con una descarga; upsert_product y el enrichment
+    corren en el hilo del Dispatcher, como un escaneo. done() o
+    failed(mensaje) se llaman desde esos hilos; la GUI los encola en ui_calls.
+    """
+    logger = dispatcher.reader.logger
+    def apply(info: dict):
+        logger.upsert_product(sku, info)
+        logger.queue_enrich(sku)
+        if done: done()
+    def ingest():
+        try:
+            ref = logger.images.ingest(info["image"])
+        except ValueError as e:
+            if failed: failed(str(e))
+            return
+        dispatcher.call(apply, dict(info, image=ref))
+    if info.get("image") and not imagestore.is_ref(info["image"]):
+        threading.Thread(target=ingest, daemon=True, name="add-image").start()
+    else:
+        dispatcher.call(apply, info)
+
+def run_gui(reader, dispatcher=None):
+    # todo lo que toca el estado del reader pasa por el Dispatcher (un solo hilo consumidor);
+    # sus callbacks vuelven al hilo de Tk por ui_calls, que vacía pump()
+    if dispatcher is None:
+        from barcode_lib.dispatcher import Dispatcher
+        dispatcher = Dispatcher(reader).start()
+    ui_calls = queue.Queue()
     app = tk.Tk()
     app.title("HouseInventory")
     app.geometry("1240x780")
@@ -21,19 +170,45 @@ def run_gui(reader):
         except Exception:
             return False
 
-    def fetch_image(url_or_path):
-        try:
-            if not url_or_path:
-                return None
-            if str(url_or_path).startswith(("http://", "https://")):
-                r = requests.get(url_or_path, timeout=5)
-                im = Image.open(io.BytesIO(r.content))
-            else:
-                im = Image.open(url_or_path)
-            im = im.resize(THUMB_SIZE)
-            return ImageTk.PhotoImage(im)
-        except Exception:
-            return None
+    # ---------- imágenes (carga fuera del hilo de Tk) ----------
+    thumbs = ThumbnailLoader(reader.logger.images.root / "thumbs", store=reader.logger.images)  # <db_dir>/images/thumbs
+    thumbs_done = queue.Queue()  # (src, PIL.Image|None) desde los hilos del loader
+    img_wanted = {}              # label -> src que debe mostrar
+
+    def show_image(label, src):
+        img_wanted[label] = src
+        im = thumbs.cached(src) if src else None
+        if im is not None or not src:
+            set_photo(label, im)
+            return
+        set_photo(label, None)
+        thumbs.request(src, lambda s, im: thumbs_done.put((s, im)))
+
+    def set_photo(label, im):
+        photo = ImageTk.PhotoImage(im) if im is not None else None
+        label.configure(image=photo or ""); label.image = photo
+
+    def drain_thumbs():
+        while True:
+            try:
+                src, im = thumbs_done.get_nowait()
+            except queue.Empty:
+                return
+            for label, want in img_wanted.items():
+                if want == src:  # descartar si la selección ya cambió
+                    set_photo(label, im)
+
+    def prefetch_visible(tree, images):
+        children = tree.get_children()
+        if not children:
+            return
+        first = tree.identify_row(5)
+        start = children.index(first) if first in children else 0
+        thumbs.prefetch(images.get(iid) for iid in children[start:start + PREFETCH_ROWS])
+
+    def mark_sort(tree, col, desc):
+        for c in tree["columns"]:
+            tree.heading(c, text=c.title() + ((" ▼" if desc else " ▲") if c == col else ""))
 
     def qty_with_fraction(qty, percent) -> str:
         try:
@@ -62,14 +237,8 @@ def run_gui(reader):
             except Exception:
                 pass
             add_dialog_win["ref"] = None
-        # cambiar modo usando mappings existentes
-        cls = reader.modes[name]
-        try:
-            reader.history.append(("mode", reader.current_mode.__class__))
-        except Exception:
-            pass
-        reader.current_mode = cls(reader)
-        on_mode_change(name)
+        # el nombre del modo es un código más (mappings); on_mode_change vuelve por ui_calls
+        dispatcher.post(name)
 
     # Botones
     ttk.Button(top, text="Input",  command=lambda: set_mode("input")).pack(side="left", padx=4)
@@ -80,8 +249,13 @@ def run_gui(reader):
     ttk.Button(
         top,
         text="Back (undo)",
-        command=lambda: (getattr(reader, "undo_last", lambda: None)(), refresh_logs(), refresh_stock(), code_entry.focus_set())
-    ).pack(side="left", padx=10)
+        command=lambda: (dispatcher.call(reader.undo_last), code_entry.focus_set())
+    ).pack(side="left", padx=(10, 4))
+    ttk.Button(
+        top,
+        text="Redo",
+        command=lambda: (dispatcher.call(reader.redo_last), code_entry.focus_set())
+    ).pack(side="left", padx=(0, 10))
 
     # Entrada de códigos
     ttk.Label(top, text="Scan/Input:").pack(side="left", padx=(12, 4))
@@ -96,18 +270,13 @@ def run_gui(reader):
             return
         m = current_mode_name()
 
-        # En modos ADD y SET, si es comando → DESPACHAR (bypass del flujo de edición)
-        if m in ("add", "set") and is_command(code):
-            reader._dispatch(code)
+        # En modo ADD un SKU abre el diálogo con prefill; todo lo demás va al dispatcher
+        if m == "add" and not is_command(code):
+            open_add_dialog(prefill_sku=code)
         else:
-            if m == "add" and not is_command(code):
-                # abrir diálogo con prefill
-                open_add_dialog(prefill_sku=code)
-            else:
-                reader._dispatch(code)
+            dispatcher.post(code)
 
         code_var.set("")
-        refresh_logs(); refresh_stock(); refresh_known()
         code_entry.focus_set()
 
     code_entry.bind("<Return>", on_enter)
@@ -122,27 +291,47 @@ def run_gui(reader):
     log_text = tk.Text(log_tab, height=12, state="disabled")
     log_text.pack(fill="both", expand=True, padx=8, pady=8)
 
+    log_state = {"last_id": 0}
+
+    def log_line(r) -> str:
+        r = (r + (None,))[:10]  # asegurar largo
+        _id, sku, _p, _b, _c, _i, _u, mode, ts, val = r
+        if mode == "set":
+            pct = ""
+            if val:
+                try:
+                    pct = str(val).split("|", 1)[0]
+                except Exception:
+                    pct = str(val)
+            if pct and not pct.endswith("%"):
+                pct += "%"
+            return f"#{_id}  {ts}  SET    {sku}  {pct}"
+        return f"#{_id}  {ts}  {str(mode).upper():6}  {sku}"
+
+    @metrics.timed("gui_refresh_seconds", fn="refresh_logs")
     def refresh_logs():
-        rows = reader.logger.last(50)
+        rows = reader.logger.last(LOG_LINES)
         log_text.configure(state="normal")
         log_text.delete("1.0", "end")
         for r in rows[::-1]:
-            r = (r + (None,))[:10]  # asegurar largo
-            _id, sku, _p, _b, _c, _i, _u, mode, ts, val = r
-            if mode == "set":
-                pct = ""
-                if val:
-                    try:
-                        pct = str(val).split("|", 1)[0]
-                    except Exception:
-                        pct = str(val)
-                if pct and not pct.endswith("%"):
-                    pct += "%"
-                line = f"#{_id}  {ts}  SET    {sku}  {pct}"
-            else:
-                line = f"#{_id}  {ts}  {str(mode).upper():6}  {sku}"
-            log_text.insert("end", line + "\n")
+            log_text.insert("end", log_line(r) + "\n")
         log_text.configure(state="disabled")
+        log_state["last_id"] = rows[0][0] if rows else 0
+
+    @metrics.timed("gui_refresh_seconds", fn="append_logs")
+    def append_logs():
+        # solo los escaneos nuevos; se recorta al final para mantener LOG_LINES
+        rows = reader.logger.scans_after(log_state["last_id"], LOG_LINES)
+        if not rows:
+            return
+        log_text.configure(state="normal")
+        for r in rows:
+            log_text.insert("end", log_line(r) + "\n")
+        extra = int(log_text.index("end-1c").split(".")[0]) - 1 - LOG_LINES
+        if extra > 0:
+            log_text.delete("1.0", f"{extra + 1}.0")
+        log_text.configure(state="disabled")
+        log_state["last_id"] = rows[-1][0]
 
     # Stock tab
     stock_tab = ttk.Frame(nb)
@@ -150,6 +339,35 @@ def run_gui(reader):
     left = ttk.Frame(stock_tab); left.pack(side="left", fill="both", expand=True)
     right = ttk.Frame(stock_tab, width=360); right.pack(side="right", fill="y")
 
+    # stock a una fecha pasada (ScanLogger.stock_as_of); "Live" vuelve al actual
+    as_of_bar = ttk.Frame(left); as_of_bar.pack(fill="x", padx=8, pady=(8, 0))
+    today = date.today()
+    as_of_vars = (tk.IntVar(value=today.day), tk.IntVar(value=today.month), tk.IntVar(value=today.year))
+    ttk.Label(as_of_bar, text="As of (d/m/y):").pack(side="left")
+    for var, lo, hi, width in zip(as_of_vars, (1, 1, 2000), (31, 12, 2100), (3, 3, 5)):
+        ttk.Spinbox(as_of_bar, from_=lo, to=hi, width=width, textvariable=var, wrap=True).pack(side="left", padx=(4, 0))
+    as_of = {"ts": None}  # None = stock actual; si no, 'YYYY-MM-DD 23:59:59' mostrado
+    as_of_label = ttk.Label(as_of_bar, text="Live", foreground="gray")
+
+    def show_as_of():
+        try:
+            d = date(*(int(v.get()) for v in reversed(as_of_vars)))
+        except (ValueError, tk.TclError):
+            messagebox.showwarning("Stock", "Invalid date.")
+            return
+        as_of["ts"] = f"{d.isoformat()} 23:59:59"  # fin del día elegido
+        as_of_label.configure(text=f"End of {d.isoformat()}")
+        refresh_stock()
+
+    def show_live():
+        as_of["ts"] = None
+        as_of_label.configure(text="Live")
+        refresh_stock()
+
+    ttk.Button(as_of_bar, text="Show", command=show_as_of).pack(side="left", padx=(8, 0))
+    ttk.Button(as_of_bar, text="Live", command=show_live).pack(side="left", padx=(4, 0))
+    as_of_label.pack(side="left", padx=8)
+
     cols = ("sku", "product", "brand", "stock")
     stock_table = ttk.Treeview(left, columns=cols, show="headings", selectmode="browse")
     for c, w in [("sku", 160), ("product", 520), ("brand", 200), ("stock", 100)]:
@@ -176,22 +394,47 @@ def run_gui(reader):
         detail_brand.configure(text=f"Marca: {info.get('brand') or ''}")
         detail_cat.configure(text=f"Categoría: {info.get('category') or ''}")
         detail_url.configure(text=info.get('url') or "")
-        photo = fetch_image(info.get("image"))
-        if photo:
-            detail_img.configure(image=photo); detail_img.image = photo
-        else:
-            detail_img.configure(image=""); detail_img.image = None
+        show_image(detail_img, info.get("image"))
 
     stock_table.bind("<<TreeviewSelect>>", on_stock_select)
 
-    def refresh_stock(desc: bool = False):
-        rows = reader.logger.stock_table()
-        rows = sorted(rows, key=lambda r: r[6], reverse=desc)
-        stock_table.delete(*stock_table.get_children())
-        for r in rows:
-            sku, product, brand, category, image, url, qty, percent = r
-            display = qty_with_fraction(qty, percent)
-            stock_table.insert("", "end", values=(sku, product or "", brand or "", display))
+    # la tabla carga solo la ventana visible (PagedTree); click en un encabezado ordena por esa columna
+    stock_sort = {"col": "stock", "desc": False}  # menos stock arriba
+
+    def stock_fetch(after, back, limit):
+        if as_of["ts"] is None:
+            return reader.logger.stock_page(stock_sort["col"], stock_sort["desc"], after, limit, back)
+        return as_of["pages"].page(after, limit, back)
+
+    def stock_show(r):
+        sku, product, brand, category, image, url, qty, percent = r[:8]
+        return (sku, product or "", brand or "", qty_with_fraction(qty, percent)), image
+
+    stock_pager = PagedTree(stock_table, stock_fetch, stock_show,
+                            on_load=lambda: app.after_idle(prefetch_visible, stock_table, stock_pager.images))
+
+    @metrics.timed("gui_refresh_seconds", fn="refresh_stock")
+    def refresh_stock():
+        if as_of["ts"] is not None:
+            rows = reader.logger.stock_as_of(as_of["ts"], limit=None)
+            as_of["pages"] = pages.RowPages(rows, stock_sort["col"], stock_sort["desc"])
+        stock_pager.reset()
+
+    @metrics.timed("gui_refresh_seconds", fn="update_stock_rows")
+    def update_stock_rows(skus):
+        if as_of["ts"] is not None:
+            return  # mostrando el pasado: los escaneos nuevos no lo cambian
+        stock_pager.reload()  # una página por la ventana cargada, no una fila por SKU
+
+    def sort_stock(col):
+        desc = not stock_sort["desc"] if stock_sort["col"] == col else False
+        stock_sort.update(col=col, desc=desc)
+        mark_sort(stock_table, col, desc)
+        refresh_stock()
+
+    for c in cols:
+        stock_table.heading(c, command=lambda c=c: sort_stock(c))
+    mark_sort(stock_table, stock_sort["col"], stock_sort["desc"])
 
     # Known DB tab
     prod_tab = ttk.Frame(nb); nb.add(prod_tab, text="Known DB")
@@ -227,35 +470,48 @@ def run_gui(reader):
         detail_brand2.configure(text=f"Marca: {info.get('brand') or ''}")
         detail_cat2.configure(text=f"Categoría: {info.get('category') or ''}")
         detail_url2.configure(text=info.get("url") or "")
-        photo = fetch_image(info.get("image"))
-        if photo:
-            detail_img2.configure(image=photo); detail_img2.image = photo
-        else:
-            detail_img2.configure(image=""); detail_img2.image = None
+        show_image(detail_img2, info.get("image"))
 
     prod_table.bind("<<TreeviewSelect>>", on_prod_select)
 
+    # sin columna elegida: lo más reciente primero, o el ranking de search() si hay texto
+    known_sort = {"col": None, "desc": False}
+
+    def known_fetch(after, back, limit):
+        text = q.get().strip()
+        if known_sort["col"] is None and text:
+            # ranking: una sola tanda, no se pagina
+            return [] if after is not None else [r + (None,) for r in reader.logger.catalog.search(text, 200)]
+        col, desc = (known_sort["col"], known_sort["desc"]) if known_sort["col"] else ("updated_at", True)
+        return reader.logger.catalog.page(col, desc, after, limit, back, text)
+
+    def known_show(r):
+        sku, product, brand, category, image, url = r[:6]
+        return (sku, product or "", brand or "", category or ""), image
+
+    known_pager = PagedTree(prod_table, known_fetch, known_show,
+                            on_load=lambda: app.after_idle(prefetch_visible, prod_table, known_pager.images))
+
+    @metrics.timed("gui_refresh_seconds", fn="refresh_known")
     def refresh_known():
-        selected_sku = None
         sel = prod_table.selection()
-        if sel:
-            try:
-                selected_sku = prod_table.item(sel[0], "values")[0]
-            except Exception:
-                selected_sku = None
+        known_pager.reset()
+        if sel and prod_table.exists(sel[0]):
+            prod_table.selection_set(sel[0])
+            prod_table.see(sel[0])
 
-        text = q.get().strip()
-        rows = reader.logger.catalog.search(text, 200) if text else reader.logger.catalog.search("", 200)
-        prod_table.delete(*prod_table.get_children())
-        for sku, product, brand, category, image, url in rows:
-            prod_table.insert("", "end", values=(sku, product or "", brand or "", category or ""))
-
-        if selected_sku:
-            for iid in prod_table.get_children():
-                if prod_table.item(iid, "values")[0] == selected_sku:
-                    prod_table.selection_set(iid)
-                    prod_table.see(iid)
-                    break
+    @metrics.timed("gui_refresh_seconds", fn="update_known_rows")
+    def update_known_rows(skus):
+        known_pager.reload()
+
+    def sort_known(col):
+        desc = not known_sort["desc"] if known_sort["col"] == col else False
+        known_sort.update(col=col, desc=desc)
+        mark_sort(prod_table, col, desc)
+        refresh_known()
+
+    for c in prod_table["columns"]:
+        prod_table.heading(c, command=lambda c=c: sort_known(c))
 
     def remove_selected():
         sel = prod_table.selection()
@@ -265,12 +521,33 @@ def run_gui(reader):
             return
         sku = prod_table.item(sel[0], "values")[0]
         if messagebox.askyesno("Confirm", f"Remove SKU {sku} from catalog?"):
-            reader.logger.remove_known_product(sku)
-            refresh_known()
+            dispatcher.call(reader.logger.remove_known_product, sku)  # on_batch refresca las vistas
             code_entry.focus_set()
             
     ttk.Button(top_search, text="Remove", command=remove_selected).pack(side="left", padx=6, pady=8)
 
+    # Forecast tab: consumo por día y fecha estimada de agotamiento (ver analytics.py)
+    fc_tab = ttk.Frame(nb); nb.add(fc_tab, text="Forecast")
+    fc_note = ttk.Label(fc_tab, text="", foreground="gray"); fc_note.pack(anchor="w", padx=8, pady=(8, 0))
+    fc_cols = [("sku", "SKU", 150), ("product", "Product", 380), ("stock", "Stock", 80), ("ma7", "7d/day", 80),
+               ("ma28", "28d/day", 80), ("rate", "Rate/day", 80), ("left", "Days left", 90), ("runout", "Run-out", 110)]
+    fc_table = ttk.Treeview(fc_tab, columns=[c for c, _, _ in fc_cols], show="headings", selectmode="browse")
+    for c, title, w in fc_cols:
+        fc_table.heading(c, text=title); fc_table.column(c, width=w, anchor="w")
+    fc_table.pack(fill="both", expand=True, padx=8, pady=8)
+
+    @metrics.timed("gui_refresh_seconds", fn="refresh_forecast")
+    def refresh_forecast():
+        try:
+            rows = reader.logger.forecast(limit=200)
+        except ImportError:
+            fc_note.configure(text="Forecast needs NumPy (pip install numpy).")
+            return
+        fc_note.configure(text="" if rows else "No recent consumption to forecast.")
+        fc_table.delete(*fc_table.get_children())
+        for sku, product, *rest in rows:
+            fc_table.insert("", "end", values=(sku, product or "", *rest))
+
     # ---------- Add dialog ----------
     def open_add_dialog(prefill_sku: str = ""):
         # Si ya está abierto, enfocarlo
@@ -332,17 +609,12 @@ def run_gui(reader):
                     on_close()
                 except Exception:
                     pass
-                reader._dispatch(code)
-                # notificar a la GUI del nuevo modo (para que actualice label y foco)
-                if hasattr(reader, "on_mode_change") and callable(reader.on_mode_change):
-                    try:
-                        new_mode = reader.current_mode.__class__.__name__.replace("Mode", "").lower()
-                        reader.on_mode_change(new_mode)
-                    except Exception:
-                        pass
+                dispatcher.post(code)  # un cambio de modo vuelve por on_mode_change
                 return True
             return False
 
+        autofill = {"sku": None}  # último SKU buscado en la web (Enter y FocusOut no lo piden dos veces)
+
         def try_autofill(event=None):
             sku_text = e_sku.get().strip()
             # primero: si es comando, bypass inmediato
@@ -350,19 +622,29 @@ def run_gui(reader):
                 return
             if not sku_text:
                 return
-            # autofill normal
+            # autofill normal: del catálogo al instante; si no está, la búsqueda
+            # web (hasta DEADLINE s) corre en otro hilo y vuelve por ui_calls
             info = reader.logger.catalog.get(sku_text)
-            if not info:
-                from barcode_lib.web.scraper import scrape_product_info
-                data = scrape_product_info(sku_text, force_refresh=False) or {}
-                if data:
-                    reader.logger.catalog.upsert(sku_text, data)
-                    info = data
-                else:
-                    info = {}
+            if info:
+                fill(sku_text, info)
+            elif autofill["sku"] != sku_text:
+                autofill["sku"] = sku_text
+                threading.Thread(target=lookup, args=(sku_text,), daemon=True, name="autofill").start()
+
+        def lookup(sku_text: str):
+            # solo llena el formulario: lo guarda save() (imagen al almacén, deshacible)
+            data = reader.logger.scrape(sku_text, force_refresh=False) or {}  # caché en el db_dir del logger
+            ui_calls.put((fill, (sku_text, data)))
+
+        def fill(sku_text: str, info: dict):
+            # el diálogo pudo cerrarse, o cambiar el SKU, mientras se buscaba
+            if not d.winfo_exists() or e_sku.get().strip() != sku_text:
+                return
             for k in ("product", "brand", "category", "url"):
                 if info.get(k) and not fields[k].get():
                     fields[k].insert(0, info[k])
+            if info.get("image") and not img_path_var.get():
+                img_path_var.set(info["image"])  # URL o referencia del almacén; Upload... la reemplaza
 
         # Bindings en el diálogo: Enter y perder foco del SKU
         e_sku.bind("<Return>", try_autofill)
@@ -379,10 +661,14 @@ def run_gui(reader):
             img = img_path_var.get().strip() or None
             if img:
                 info["image"] = img
-            reader.logger.catalog.upsert(sku, info)
-            reader.logger.queue_enrich(sku)
-            on_close()
-            refresh_known(); refresh_stock(); refresh_logs()
+            # si la imagen no sirve el diálogo queda abierto para corregirla
+            save_product(dispatcher, sku, info,
+                         done=lambda: ui_calls.put((saved, ())),
+                         failed=lambda msg: ui_calls.put((messagebox.showerror, ("Invalid image", msg))))
+
+        def saved():
+            if d.winfo_exists():  # pudo cerrarse mientras se guardaba
+                on_close()
 
         ttk.Button(d, text="Save", command=save).grid(row=10, column=1, sticky="e", padx=6, pady=8)
 
@@ -401,15 +687,91 @@ def run_gui(reader):
                 add_dialog_win["ref"] = None
         code_entry.focus_set()
 
-    reader.on_mode_change = on_mode_change
+    reader.on_mode_change = lambda name: ui_calls.put((on_mode_change, (name,)))
+
+    # ---------- Cambios (bus del logger) ----------
+    # Cada pestaña se sincroniza aplicando solo los diffs publicados por ScanLogger/Catalog;
+    # las ocultas quedan marcadas y se recargan al mostrarse.
+    bus = reader.logger.bus
+    tab_topic = {str(log_tab): "scans", str(stock_tab): "stock", str(prod_tab): "products", str(fc_tab): "forecast"}
+    full_refresh = {"scans": refresh_logs, "stock": refresh_stock, "products": refresh_known,
+                    "forecast": refresh_forecast}
+    sync = {"version": bus.version, "dirty": set()}
+
+    def visible_topic():
+        return tab_topic.get(nb.select())
+
+    @metrics.timed("gui_refresh_seconds", fn="sync_views")
+    def sync_views():
+        current, events = bus.since(sync["version"])
+        sync["version"] = current
+        if events is None:
+            sync["dirty"].update(full_refresh)
+        elif events:
+            keys = {}
+            sync["dirty"].add("forecast")  # sin diffs por fila: se recalcula entero (es incremental) al mostrarse
+            for _v, topic, op, key in events:
+                # stock muestra nombre/marca del catálogo (vista): un cambio de producto también lo toca
+                for t in (topic, "stock") if topic == "products" else (topic,):
+                    if op == "reload" or (t == "scans" and op == "delete"):
+                        sync["dirty"].add(t)
+                    keys.setdefault(t, dict())[key] = True
+            visible = visible_topic()
+            for topic, ks in keys.items():
+                if topic != visible:
+                    sync["dirty"].add(topic)
+                elif topic not in sync["dirty"]:
+                    if topic == "scans":
+                        append_logs()
+                    elif topic == "stock":
+                        update_stock_rows(ks)
+                    else:
+                        update_known_rows(ks)
+        visible = visible_topic()
+        if visible in sync["dirty"]:
+            sync["dirty"].discard(visible)
+            full_refresh[visible]()
+
+    nb.bind("<<NotebookTabChanged>>", lambda e: sync_views())
+
+    # precarga de miniaturas al desplazar/redimensionar las tablas
+    for tree, images in ((stock_table, stock_pager.images), (prod_table, known_pager.images)):
+        for ev in ("<MouseWheel>", "<Button-4>", "<Button-5>", "<Configure>", "<KeyRelease>"):
+            tree.bind(ev, lambda e, t=tree, im=images: app.after_idle(prefetch_visible, t, im), add="+")
+
+    def drain_ui_calls():
+        while True:
+            try:
+                fn, args = ui_calls.get_nowait()
+            except queue.Empty:
+                return
+            fn(*args)
 
-    # ---------- Arranque ----------
-    def periodic():
-        refresh_logs(); refresh_stock(); refresh_known()
-        app.after(1500, periodic)
+    # un refresh por lote del dispatcher; 'exit' cierra la ventana
+    dispatcher.on_batch = lambda n: ui_calls.put((sync_views, ()))
+    dispatcher.on_exit = lambda: ui_calls.put((app.destroy, ()))
 
+    def pump():
+        drain_ui_calls()
+        if bus.version != sync["version"]:
+            sync_views()
+        drain_thumbs()
+        app.after(POLL_MS, pump)
+
+    def poll_external():
+        # otro proceso escribió en las DBs (p.ej. import masivo) -> eventos 'reload'
+        try:
+            reader.logger.poll_external()
+        except Exception:
+            pass
+        app.after(EXTERNAL_POLL_MS, poll_external)
+
+    # ---------- Arranque ----------
     refresh_logs(); refresh_stock(); refresh_known()
+    sync["version"] = bus.version
     code_entry.focus_set()
-    periodic()
+    pump()
+    poll_external()
     app.mainloop()
+    thumbs.shutdown()
 
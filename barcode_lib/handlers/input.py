@@ -5,4 +5,12 @@ class InputMode(ModeBase):
         self.reader.logger.log_input(code)
         self.reader.history.append(("scan", code, "input", datetime.now()))
         self.reader.gui_toast(code, "input")
-        print(f"[InputMode] Processed code: {code}")
+        self.reader.say(f"[InputMode] Processed code: {code}")
+    def process_batch(self, codes):
+        # ráfaga del dispatcher: una transacción para todos
+        self.reader.logger.log_many([(c, "input") for c in codes])
+        now = datetime.now()
+        for code in codes:
+            self.reader.history.append(("scan", code, "input", now))
+            self.reader.gui_toast(code, "input")
+            self.reader.say(f"[InputMode] Processed code: {code}")
@@ -3,10 +3,20 @@ from barcode_lib.handlers.base import ModeBase
 class OutputMode(ModeBase):
     def process_code(self, code:str):
         ok = self.reader.logger.log_output(code)
-        self.reader.history.append(("scan", code, "output", datetime.now()))
+        self._report(code, ok, datetime.now())
+        return ok
+    def process_batch(self, codes):
+        # ráfaga del dispatcher: una transacción para todos
+        oks = self.reader.logger.log_many([(c, "output") for c in codes])
+        now = datetime.now()
+        for code, ok in zip(codes, oks):
+            self._report(code, ok, now)
+        return oks
+    def _report(self, code, ok, when):
+        self.reader.history.append(("scan", code, "output", when))
         if ok:
-            print(f"[OutputMode] Processed code: {code}")
+            self.reader.say(f"[OutputMode] Processed code: {code}")
         else:
             msg=f"[OutputMode] Warning: SKU {code} not in stock. Nothing changed."
-            print(msg)
+            self.reader.say(msg)
             self.reader.gui_warn(msg)
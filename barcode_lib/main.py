@@ -1,20 +1,114 @@
 import sys, threading, time
+from typing import Any, Dict, Optional, TextIO
 from barcode_lib.reader import BarcodeReader
-from barcode_lib.gui import run_gui
+from barcode_lib.db.logger import ScanLogger
+from barcode_lib import metrics
 
-def stdin_loop(reader: BarcodeReader):
-    # Read from same terminal and dispatch; non-blocking exit when GUI closes
+REPLAY_BATCH = 5000  # escaneos por transacción en --replay
+REPLAY_SAMPLES = 5   # avisos distintos que muestra el resumen
+
+def stdin_loop(dispatcher):
+    # Read from same terminal and post to the dispatcher (single consumer shared with the GUI)
     for line in sys.stdin:
-        code = line.strip()
-        if not code: continue
+        dispatcher.post(line)
+
+def _arg(name: str):
+    # sin argparse: cada ms cuenta al arrancar una estación
+    if name in sys.argv:
+        i = sys.argv.index(name)
+        return sys.argv[i + 1] if i + 1 < len(sys.argv) else None
+    return None
+
+def replay(reader, stream: TextIO, batch: int = REPLAY_BATCH) -> Dict[str, Any]:
+    """
+    Pasa por el reader un registro de códigos (uno por línea, igual que
+    stdin: escaneos, modos, estados y configs) con la misma semántica que
+    escanearlos, pero cada ráfaga de escaneos entre dos comandos va en lotes
+    de hasta `batch` (dispatch_many -> una transacción por DB) y sin salida
+    por escaneo (reader.quiet). Un estado que pregunta (rebuild_stock, clear_all) lee la respuesta de
+    la línea siguiente del registro; 'exit' corta ahí. No encola enrichment
+    (como bulk import sin --enrich): los SKUs nuevos se completan al escanearlos.
+    """
+    stats: Dict[str, Any] = {"codes": 0, "scans": 0, "commands": 0, "rejected": 0, "warnings": 0,
+                             "samples": [], "stopped": False}  # samples: los primeros avisos distintos
+    t0 = time.perf_counter()
+
+    def run(codes) -> bool:
+        if not codes:
+            return True
         try:
-            reader._dispatch(code)
-        except Exception as e:
-            print("ERR:", e)
+            results = reader.dispatch_many(codes, max_batch=batch)
+        except KeyboardInterrupt:  # estado 'exit' (los comandos van de a uno)
+            stats["commands"] += 1
+            stats["stopped"] = True
+            return False
+        for code, (ok, _mode, msgs) in zip(codes, results):
+            stats["commands" if reader.is_command(code) else "scans"] += 1
+            stats["rejected"] += not ok
+            stats["warnings"] += len(msgs)
+            for text in msgs:
+                if len(stats["samples"]) < REPLAY_SAMPLES and text not in stats["samples"]:
+                    stats["samples"].append(text)
+        return True
+
+    pending = []
+    prev_stdin, sys.stdin = sys.stdin, stream
+    prev_quiet, reader.quiet = reader.quiet, True
+    prev_defer, reader.logger.defer_enrich = reader.logger.defer_enrich, True
+    try:
+        for line in iter(stream.readline, ""):
+            code = line.strip()
+            if not code:
+                continue
+            stats["codes"] += 1
+            if reader.is_command(code):
+                # antes los escaneos previos; lo que el comando pregunte se lee del stream
+                if not (run(pending) and run([code])):
+                    break
+                pending = []
+                continue
+            pending.append(code)
+            if len(pending) >= batch:
+                run(pending)
+                pending = []
+        else:
+            run(pending)
+    finally:
+        sys.stdin = prev_stdin
+        reader.quiet, reader.logger.defer_enrich = prev_quiet, prev_defer
+    reader.logger.flush()
+    stats["seconds"] = time.perf_counter() - t0
+    stats["mode"] = reader.mode_name
+    return stats
+
+def print_replay_summary(stats: Dict[str, Any], out: Optional[TextIO] = None):
+    out = out or sys.stdout
+    secs = stats["seconds"]
+    rate = stats["codes"] / secs if secs > 0 else 0
+    print(f"Replayed {stats['codes']} codes ({stats['scans']} scans, {stats['commands']} commands) "
+          f"in {secs:.2f}s ({rate:,.0f} codes/s)", file=out)
+    print(f"Rejected: {stats['rejected']}  Warnings: {stats['warnings']}  Final mode: {stats['mode']}", file=out)
+    for text in stats["samples"]:
+        print(f"  {text}", file=out)
+    if stats["stopped"]:
+        print("Stopped by an exit command.", file=out)
 
 def main():
     no_gui = "--no-gui" in sys.argv
-    reader = BarcodeReader()
+    db_dir = _arg("--db-dir")
+    reader = BarcodeReader(logger=ScanLogger(db_dir=db_dir) if db_dir else None)
+    src = _arg("--replay")
+    if src:
+        # registro de otra estación / restore: lotes grandes, solo el resumen final
+        if src == "-":
+            stats = replay(reader, sys.stdin)
+        else:
+            with open(src, encoding="utf-8") as f:
+                stats = replay(reader, f)
+        reader.logger.close()
+        print_replay_summary(stats)
+        return
+    metrics.start_exporter()  # db/metrics.prom para un scraper Prometheus local
     if no_gui:
         print("Barcode reader ready. Current mode:", reader.current_mode.__class__.__name__)
         try:
@@ -23,9 +117,12 @@ def main():
         except KeyboardInterrupt:
             print("\nExiting.")
     else:
-        t = threading.Thread(target=stdin_loop, args=(reader,), daemon=True)
+        from barcode_lib.gui import run_gui  # tkinter/PIL solo en modo GUI
+        from barcode_lib.dispatcher import Dispatcher
+        dispatcher = Dispatcher(reader).start()
+        t = threading.Thread(target=stdin_loop, args=(dispatcher,), daemon=True)
         t.start()
-        run_gui(reader)
+        run_gui(reader, dispatcher)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,221 @@
+"""
+Métricas en proceso: contadores, gauges e histogramas de latencia.
+
+    from barcode_lib import metrics
+    @metrics.timed("scanlogger_seconds", method="log_input")
+    def log_input(...): ...
+    with metrics.timer("gui_refresh_seconds", fn="refresh_stock"): ...
+    metrics.counter("enrich_errors_total").inc()
+
+Los histogramas usan buckets fijos (sin guardar muestras): observe() es
+un bisect + dos sumas bajo un lock por métrica. El estado se consulta con el
+comando 'metrics' o en formato Prometheus (start_exporter escribe el archivo
+cada N segundos, para un scraper local).
+"""
+import os, time, threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+PREFIX = "barcode_"
+PROM_FILE = Path(__file__).parent / "db" / "metrics.prom"
+EXPORT_SECONDS = 15
+# segundos: de 100 µs a 10 s
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# -------------------- Tipos --------------------
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n: int = 1):
+        with self._lock:
+            self.value += n
+
+class Gauge:
+    """Valor calculado al leerlo (profundidad de cola, tamaño de un caché...)."""
+    __slots__ = ("fn",)
+
+    def __init__(self, fn: Callable[[], float]):
+        self.fn = fn
+
+    @property
+    def value(self) -> Optional[float]:
+        try:
+            return self.fn()
+        except Exception:
+            return None
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count", "max", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        i = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Aproximado: interpolación lineal dentro del bucket."""
+        with self._lock:
+            counts, total, top = list(self.counts), self.count, self.max
+        if not total:
+            return None
+        rank, seen = q * total, 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                lo = BUCKETS[i - 1] if i > 0 else 0.0
+                hi = min(BUCKETS[i] if i < len(BUCKETS) else top, top)
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return top
+
+# -------------------- Registry --------------------
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[Tuple[str, Labels], object] = {}
+        self._help: Dict[str, str] = {}
+
+    def _get(self, cls, name: str, labels: Dict[str, str], help: str = "", *args):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        m = self._metrics.get(key)
+        if m is None:
+            with self._lock:
+                m = self._metrics.get(key)
+                if m is None:
+                    m = self._metrics[key] = cls(*args)
+                    if help:
+                        self._help.setdefault(name, help)
+        return m
+
+    def counter(self, name: str, help: str = "", **labels) -> Counter:
+        return self._get(Counter, name, labels, help)
+
+    def histogram(self, name: str, help: str = "", **labels) -> Histogram:
+        return self._get(Histogram, name, labels, help)
+
+    def gauge(self, name: str, fn: Callable[[], float], help: str = "", **labels) -> Gauge:
+        g = self._get(Gauge, name, labels, help, fn)
+        g.fn = fn  # re-registrar (p.ej. un ScanLogger nuevo) apunta al objeto vivo
+        return g
+
+    def items(self) -> List[Tuple[str, Labels, object]]:
+        with self._lock:
+            return sorted(((n, l, m) for (n, l), m in self._metrics.items()), key=lambda x: (x[0], x[1]))
+
+    def clear(self):
+        with self._lock:
+            self._metrics.clear()
+
+    # ---------- export ----------
+    def rows(self) -> List[list]:
+        """Filas para tabulate: nombre, labels, count/valor, media y p50/p95/p99 en ms."""
+        out = []
+        for name, labels, m in self.items():
+            lab = ",".join(f"{k}={v}" for k, v in labels)
+            if isinstance(m, Histogram):
+                if not m.count:
+                    continue
+                ms = lambda s: round(s * 1000, 3) if s is not None else None
+                out.append([name, lab, m.count, ms(m.sum / m.count),
+                            ms(m.quantile(0.5)), ms(m.quantile(0.95)), ms(m.quantile(0.99))])
+            else:
+                out.append([name, lab, m.value, None, None, None, None])
+        return out
+
+    def prometheus(self) -> str:
+        lines, typed = [], set()
+        for name, labels, m in self.items():
+            full = PREFIX + name
+            kind = "histogram" if isinstance(m, Histogram) else "counter" if isinstance(m, Counter) else "gauge"
+            if full not in typed:
+                typed.add(full)
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} {kind}")
+            lab = ",".join(f'{k}="{v}"' for k, v in labels)
+            braced = f"{{{lab}}}" if lab else ""
+            if isinstance(m, Histogram):
+                with m._lock:
+                    counts, total, count = list(m.counts), m.sum, m.count
+                acc = 0
+                for le, c in zip(BUCKETS + ("+Inf",), counts):
+                    acc += c
+                    sep = "," if lab else ""
+                    lines.append(f'{full}_bucket{{{lab}{sep}le="{le}"}} {acc}')
+                lines.append(f"{full}_sum{braced} {total}")
+                lines.append(f"{full}_count{braced} {count}")
+            else:
+                v = m.value
+                if v is not None:
+                    lines.append(f"{full}{braced} {v}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path):
+        path = Path(path)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(self.prometheus(), encoding="utf-8")
+        os.replace(tmp, path)  # el scraper nunca lee un archivo a medias
+
+REGISTRY = Registry()
+counter, histogram, gauge = REGISTRY.counter, REGISTRY.histogram, REGISTRY.gauge
+
+# -------------------- Helpers --------------------
+@contextmanager
+def timer(name: str, **labels):
+    h = REGISTRY.histogram(name, **labels)
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        h.observe(time.perf_counter() - t)
+
+def timed(name: str, **labels):
+    """Decorador: histograma de latencia (el histograma se resuelve una vez, al decorar)."""
+    def deco(fn):
+        h = REGISTRY.histogram(name, **labels)
+        @wraps(fn)
+        def wrapper(*a, **kw):
+            t = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                h.observe(time.perf_counter() - t)
+        return wrapper
+    return deco
+
+_exporter: Optional[threading.Thread] = None
+
+def start_exporter(path: Path = PROM_FILE, every: float = EXPORT_SECONDS) -> threading.Thread:
+    """Hilo daemon que reescribe el archivo Prometheus cada `every` segundos."""
+    global _exporter
+    if _exporter is None:
+        def loop():
+            while True:
+                try:
+                    REGISTRY.write_prometheus(path)
+                except OSError:
+                    pass
+                time.sleep(every)
+        _exporter = threading.Thread(target=loop, daemon=True, name="metrics-exporter")
+        _exporter.start()
+    return _exporter
@@ -1,17 +1,30 @@
+import time
 from collections import deque
+from typing import List, Optional, Sequence, Tuple
+from barcode_lib import metrics
 from barcode_lib.db.logger import ScanLogger
-from barcode_lib.utils import import_from_path, load_config
+from barcode_lib.utils import LazyRegistry, load_config
+
+_DISPATCH_HIST = {}  # kind -> Histogram (evita armar la clave del registry en cada escaneo)
+
+def _dispatch_hist(kind: str):
+    h = _DISPATCH_HIST.get(kind)
+    if h is None:
+        h = _DISPATCH_HIST[kind] = metrics.histogram("dispatch_seconds", "BarcodeReader._dispatch", kind=kind)
+    return h
 
 class BarcodeReader:
-    def __init__(self):
+    def __init__(self, logger: Optional[ScanLogger] = None):
         cfg = load_config()
-        self.logger = ScanLogger()
-        self.modes = {k: import_from_path(v) for k,v in cfg["modes"].items()}
-        self.states = {k: import_from_path(v) for k,v in cfg["states"].items()}
-        self.configs= {k: import_from_path(v) for k,v in cfg["configs"].items()}
+        self.logger = logger or ScanLogger()
+        # handlers/estados/configs se importan al usarlos por primera vez
+        self.modes = LazyRegistry(cfg["modes"])
+        self.states = LazyRegistry(cfg["states"])
+        self.configs= LazyRegistry(cfg["configs"])
         self.current_mode = self.modes["input"](self)
         self.history = deque(maxlen=100)
         self._toast_seconds = 3
+        self.quiet = False  # True: say() no imprime (servidor: un reader por estación, sin tocar sys.stdout)
         # GUI callbacks
         self.on_mode_change = None
         self.on_warning = None
@@ -23,34 +36,121 @@ class BarcodeReader:
 
     def _dispatch(self, code: str):
         # Priority: modes -> states -> configs -> current mode
-        if code in self.modes:
-            self._set_mode(self.modes[code])
-            return
-        if code in self.states:
-            self._run_callable(self.states[code])
+        t = time.perf_counter()
+        kind = "mode"
+        try:
+            if code in self.modes:
+                self._set_mode(self.modes[code])
+                return
+            if code in self.states:
+                kind = "state"
+                self._run_callable(self.states[code])
+                if getattr(self, 'on_log_refresh', None):
+                    self.on_log_refresh()
+                return
+            if code in self.configs:
+                kind = "config"
+                self._run_callable(self.configs[code])
+                if getattr(self, 'on_log_refresh', None):
+                    self.on_log_refresh()
+                return
+            kind = self.mode_name
+            result = self.current_mode.process_code(code)
             if getattr(self, 'on_log_refresh', None):
                 self.on_log_refresh()
-            return
-        if code in self.configs:
-            self._run_callable(self.configs[code])
+            return result
+        finally:
+            _dispatch_hist(kind).observe(time.perf_counter() - t)
+
+    @property
+    def mode_name(self) -> str:
+        return self.current_mode.__class__.__name__.replace("Mode", "").lower()
+
+    def is_command(self, code: str) -> bool:
+        return code in self.modes or code in self.states or code in self.configs
+
+    def can_batch(self, code: str) -> bool:
+        """True si code es un escaneo de inventario que el modo actual sabe procesar en lote."""
+        return hasattr(self.current_mode, "process_batch") and not self.is_command(code)
+
+    def dispatch_batch(self, codes) -> List[bool]:
+        # ráfaga de escaneos (sin comandos entre medio) del Dispatcher: un refresh para todo el lote
+        if len(codes) == 1:
+            return [self._dispatch(codes[0]) is not False]
+        t = time.perf_counter()
+        kind = self.mode_name
+        try:
+            oks = self.current_mode.process_batch(codes)
             if getattr(self, 'on_log_refresh', None):
                 self.on_log_refresh()
-            return
-        self.current_mode.process_code(code)
-        if getattr(self, 'on_log_refresh', None):
-            self.on_log_refresh()
+            return list(oks) if oks is not None else [True] * len(codes)
+        finally:
+            dt = (time.perf_counter() - t) / len(codes)
+            h = _dispatch_hist(kind)
+            for _ in codes:
+                h.observe(dt)
+
+    def dispatch_many(self, codes: Sequence[str], max_batch: int = 256) -> List[Tuple[bool, str, List[str]]]:
+        """
+        Despacha codes en orden, agrupando las ráfagas de inventario como el
+        Dispatcher pero en el hilo que llama. Por código: (ok, modo después de
+        procesarlo, mensajes de on_warning que produjo). ok=False si el modo lo
+        rechazó (output sin stock) o si lanzó una excepción.
+        """
+        out: List[Tuple[bool, str, List[str]]] = []
+        msgs: List[str] = []
+        prev, self.on_warning = self.on_warning, msgs.append
+        try:
+            i, n = 0, len(codes)
+            while i < n:
+                j = i
+                while j < n and j - i < max_batch and self.can_batch(codes[j]):
+                    j += 1
+                if j - i > 1:
+                    try:
+                        oks = self.dispatch_batch(codes[i:j])
+                    except Exception as e:
+                        oks, msgs[:] = [False] * (j - i), [str(e)] * (j - i)
+                    # en un lote solo avisan los rechazados, uno por código y en orden
+                    warn = iter(msgs)
+                    out.extend((ok, self.mode_name, [] if ok else [next(warn, "")]) for ok in oks)
+                    i = j
+                else:
+                    try:
+                        ok = self._dispatch(codes[i]) is not False
+                    except Exception as e:
+                        ok = False
+                        msgs.append(str(e))
+                    out.append((ok, self.mode_name, list(msgs)))
+                    i += 1
+                msgs.clear()
+        finally:
+            self.on_warning = prev
+        if prev:
+            for _, _, m in out:
+                for text in m:
+                    prev(text)
+        return out
 
     def _set_mode(self, mode_class):
         self.history.append(("mode", self.current_mode.__class__))
         self.current_mode = mode_class(self)
         if self.on_mode_change:
-            name = self.current_mode.__class__.__name__.replace("Mode","").lower()
-            self.on_mode_change(name)
+            self.on_mode_change(self.mode_name)
 
     def _run_callable(self, fn): fn(self)
     def gui_toast(self, sku, mode): pass
+    def say(self, *args):
+        if not self.quiet: print(*args)
+    def ask(self, prompt: str) -> str:
+        return input("" if self.quiet else prompt)
     def gui_warn(self, text):
         if self.on_warning: self.on_warning(text)
-    def undo_last(self):
-        self.logger.undo_last()
+    def undo_last(self, n: int = 1) -> int:
+        done = self.logger.undo_last(n)
+        if self.on_log_refresh: self.on_log_refresh()
+        return done
+    def redo_last(self, n: int = 1) -> int:
+        done = self.logger.redo(n)
         if self.on_log_refresh: self.on_log_refresh()
+        return done
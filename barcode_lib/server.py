@@ -0,0 +1,332 @@
+"""
+Servidor de ingesta para varias estaciones de escaneo en la red local.
+
+    python -m barcode_lib.server [--host 0.0.0.0] [--port 7070] [--http-port 7080] [--db-dir DIR]
+
+TCP (una línea por código, pipelining libre):
+    STATION cocina        -> OK station cocina   (por defecto: la IP del cliente)
+    7790001234567         -> OK input
+    output                -> OK output
+    7790001234567         -> WARN output [OutputMode] Warning: SKU ... not in stock...
+    QUIT                  -> cierra la conexión
+  Cada línea recibe exactamente una respuesta, en orden. El cliente puede
+  mandar miles sin esperar: las líneas que ya llegaron se procesan juntas.
+
+HTTP/1.1 (keep-alive y pipelining; las respuestas salen en orden):
+    POST /scan     {"station": "cocina", "codes": ["input", "779...", ...]}
+                   (o text/plain, un código por línea, con ?station=cocina)
+                -> {"station": ..., "mode": ..., "results": [{"code", "status", "mode", "message"}]}
+    GET  /health   GET /metrics (formato Prometheus)
+
+Cada estación tiene su propio BarcodeReader (modo actual, SKU pendiente de
+SetMode, historial) y todas comparten un ScanLogger. Todo lo que toca los
+readers o la DB corre en un único hilo worker, en lotes: las escrituras se
+serializan igual que con el Dispatcher de la GUI. Pasadas MAX_STATIONS, una
+estación nueva desplaza a la usada hace más tiempo que no tenga lotes en
+curso (vuelve a empezar en modo input si reaparece).
+
+Backpressure: cada conexión TCP tiene una cola acotada de líneas y a lo sumo
+un lote en vuelo; si el worker no da abasto (o el cliente no lee sus
+respuestas) se deja de leer el socket y TCP frena al emisor. En HTTP el body
+tiene un tope (413) y los lotes en vuelo del servidor están acotados.
+"""
+import sys, json, time, asyncio, argparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+from barcode_lib import metrics
+from barcode_lib.db.logger import ScanLogger
+from barcode_lib.reader import BarcodeReader
+
+TCP_PORT = 7070
+HTTP_PORT = 7080
+MAX_BATCH = 256        # códigos por pasada del worker
+QUEUE_LINES = 4096     # líneas leídas y no procesadas por conexión TCP
+MAX_INFLIGHT = 64      # lotes esperando al worker (todas las conexiones)
+MAX_BODY = 4 << 20     # bytes por request HTTP
+MAX_STATIONS = 256     # readers vivos; el nombre lo elige el cliente
+# estados que piden confirmación por stdin o terminan el proceso: no tienen sentido remotos;
+# back/redo deshacen lo último del UndoLog compartido (quizás de otra estación) y 0%* toca todo el stock
+REMOTE_DENY = ("exit", "rebuild_stock", "clear_all", "info", "back", "redo", "0%*")
+
+Result = Tuple[str, str, str]  # status (OK/WARN/ERR), modo, mensaje
+
+# -------------------- Servidor --------------------
+class IngestServer:
+    def __init__(self, logger: ScanLogger, host: str = "127.0.0.1", port: Optional[int] = TCP_PORT,
+                 http_port: Optional[int] = HTTP_PORT, max_batch: int = MAX_BATCH,
+                 queue_lines: int = QUEUE_LINES, max_inflight: int = MAX_INFLIGHT,
+                 max_body: int = MAX_BODY, max_stations: int = MAX_STATIONS, verbose: bool = False):
+        self.logger = logger
+        self.host, self.port, self.http_port = host, port, http_port
+        self.max_batch = max(1, int(max_batch))
+        self.queue_lines = max(1, int(queue_lines))
+        self.max_inflight = max(1, int(max_inflight))
+        self.max_body = max_body
+        self.max_stations = max(1, int(max_stations))
+        self.verbose = verbose
+        self.stations: Dict[str, BarcodeReader] = {}
+        self.connections = 0
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+        self._servers: List[asyncio.AbstractServer] = []
+        self._locks: "OrderedDict[str, asyncio.Lock]" = OrderedDict()  # de la menos a la más usada
+        self._busy: Dict[str, int] = {}  # lotes en curso o esperando el lock, por estación
+        self._inflight: Optional[asyncio.Semaphore] = None
+        self._batch_hist = metrics.histogram("server_batch_seconds", "lote del worker de ingesta")
+        self._codes = metrics.counter("server_codes_total", "códigos recibidos por red")
+        metrics.gauge("server_connections", lambda: self.connections)
+        metrics.gauge("server_stations", lambda: len(self.stations))
+
+    async def start(self) -> "IngestServer":
+        """Abre los puertos (0 = uno libre; quedan en self.port / self.http_port)."""
+        self._inflight = asyncio.Semaphore(self.max_inflight)
+        if self.port is not None:
+            srv = await asyncio.start_server(self._tcp, self.host, self.port)
+            self.port = srv.sockets[0].getsockname()[1]
+            self._servers.append(srv)
+        if self.http_port is not None:
+            srv = await asyncio.start_server(self._http, self.host, self.http_port)
+            self.http_port = srv.sockets[0].getsockname()[1]
+            self._servers.append(srv)
+        return self
+
+    async def serve_forever(self):
+        await asyncio.gather(*(s.serve_forever() for s in self._servers))
+
+    async def close(self):
+        for s in self._servers:
+            s.close()
+            await s.wait_closed()
+        self._worker.shutdown(wait=True)
+
+    # ---------- worker (único hilo que toca readers y DB) ----------
+    def _station(self, name: str) -> BarcodeReader:
+        r = self.stations.get(name)
+        if r is None:
+            r = self.stations[name] = BarcodeReader(logger=self.logger)
+            r.quiet = not self.verbose  # por reader: redirigir sys.stdout afectaría a todo el proceso
+        return r
+
+    def _apply(self, station: str, codes: List[str]) -> List[Result]:
+        t = time.perf_counter()
+        reader = self._station(station)
+        out: List[Result] = []
+        run: List[str] = []
+
+        def flush():
+            for ok, mode, msgs in reader.dispatch_many(run, self.max_batch):
+                out.append(("OK" if ok else "WARN", mode, msgs[-1] if msgs else ""))
+            run.clear()
+
+        for code in codes:
+            if code in REMOTE_DENY:
+                flush()
+                out.append(("ERR", reader.mode_name, f"'{code}' no está permitido por red"))
+            else:
+                run.append(code)
+        flush()
+        self._batch_hist.observe(time.perf_counter() - t)
+        return out
+
+    async def submit(self, station: str, codes: List[str]) -> List[Result]:
+        """Aplica codes para station en el worker; los lotes de una estación no se intercalan."""
+        self._codes.inc(len(codes))
+        lock = self._lock(station)
+        loop = asyncio.get_running_loop()
+        out: List[Result] = []
+        self._busy[station] = self._busy.get(station, 0) + 1
+        try:
+            async with lock:
+                for i in range(0, len(codes), self.max_batch):
+                    async with self._inflight:
+                        out += await loop.run_in_executor(self._worker, self._apply, station,
+                                                          codes[i:i + self.max_batch])
+        finally:
+            self._busy[station] -= 1
+            if not self._busy[station]:
+                del self._busy[station]
+        return out
+
+    def _lock(self, station: str) -> asyncio.Lock:
+        # en el event loop; una estación sin lotes en curso no tiene trabajo en el worker
+        lock = self._locks.get(station)
+        if lock is None:
+            for name in list(self._locks):
+                if len(self._locks) < self.max_stations:
+                    break
+                if name not in self._busy:
+                    del self._locks[name]
+                    self.stations.pop(name, None)
+            lock = self._locks[station] = asyncio.Lock()
+        self._locks.move_to_end(station)
+        return lock
+
+    # ---------- TCP ----------
+    async def _tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        station = str(peer[0]) if peer else "tcp"
+        lines: asyncio.Queue = asyncio.Queue(self.queue_lines)
+        self.connections += 1
+
+        async def pump():
+            try:
+                async for raw in reader:
+                    line = raw.decode("utf-8", "replace").strip()
+                    if line:
+                        await lines.put(line)  # cola llena -> no se lee más el socket
+            except (ConnectionError, ValueError):  # ValueError: línea más larga que el límite
+                pass
+            finally:
+                await lines.put(None)
+
+        task = asyncio.create_task(pump())
+        try:
+            done = False
+            while not done:
+                batch = [await lines.get()]
+                while len(batch) < self.max_batch and not lines.empty():
+                    batch.append(lines.get_nowait())
+                codes: List[str] = []
+                replies: List[str] = []
+                for line in batch:
+                    if line is None or line.upper() == "QUIT":
+                        done = True
+                        break
+                    if line[:8].upper() == "STATION ":
+                        replies += await self._tcp_codes(station, codes)
+                        station = line[8:].strip() or station
+                        replies.append(f"OK station {station}")
+                    else:
+                        codes.append(line)
+                replies += await self._tcp_codes(station, codes)
+                if replies:
+                    writer.write(("\n".join(replies) + "\n").encode("utf-8"))
+                    await writer.drain()  # el cliente no lee -> no procesamos más
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            task.cancel()
+            writer.close()
+
+    async def _tcp_codes(self, station: str, codes: List[str]) -> List[str]:
+        if not codes:
+            return []
+        res = await self.submit(station, list(codes))
+        codes.clear()
+        return [" ".join(x for x in r if x) for r in res]
+
+    # ---------- HTTP ----------
+    async def _http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "bad request line"}, False)
+                    break
+                headers: Dict[str, str] = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                size = int(headers.get("content-length") or 0)
+                if size > self.max_body:
+                    await self._respond(writer, 413, {"error": f"body > {self.max_body} bytes"}, False)
+                    break
+                body = await reader.readexactly(size) if size else b""
+                keep = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                status, payload = await self._route(method, target, headers, body,
+                                                    str(peer[0]) if peer else "http")
+                await self._respond(writer, status, payload, keep)
+                if not keep:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _route(self, method: str, target: str, headers: Dict[str, str], body: bytes, peer: str):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        if method == "GET" and url.path == "/health":
+            return 200, {"ok": True, "connections": self.connections,
+                         "stations": {k: r.mode_name for k, r in list(self.stations.items())}}
+        if method == "GET" and url.path == "/metrics":
+            return 200, metrics.REGISTRY.prometheus()
+        if url.path != "/scan":
+            return 404, {"error": "not found"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        station = (query.get("station") or [peer])[0]
+        try:
+            if headers.get("content-type", "").startswith("application/json"):
+                data = json.loads(body or b"{}")
+                station = str(data.get("station") or station)
+                codes = [str(c).strip() for c in data.get("codes") or []]
+            else:
+                codes = [c.strip() for c in body.decode("utf-8").splitlines()]
+        except (ValueError, AttributeError) as e:
+            return 400, {"error": f"invalid body: {e}"}
+        codes = [c for c in codes if c]
+        res = await self.submit(station, codes)
+        mode = res[-1][1] if res else (self.stations[station].mode_name if station in self.stations else "input")
+        return 200, {"station": station, "mode": mode,
+                     "results": [{"code": c, "status": s, "mode": m, "message": msg}
+                                 for c, (s, m, msg) in zip(codes, res)]}
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload, keep: bool):
+        if isinstance(payload, str):
+            body, ctype = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            body, ctype = json.dumps(payload).encode("utf-8"), "application/json"
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                  413: "Payload Too Large"}.get(status, "")
+        head = (f"HTTP/1.1 {status} {reason}\r\nContent-Type: {ctype}\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+# -------------------- CLI --------------------
+async def serve(srv: IngestServer):
+    await srv.start()
+    print(f"Ingest server: tcp {srv.host}:{srv.port}  http {srv.host}:{srv.http_port}", file=sys.stderr)
+    try:
+        await srv.serve_forever()
+    finally:
+        await srv.close()
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="python -m barcode_lib.server")
+    ap.add_argument("--host", default="127.0.0.1", help="0.0.0.0 para aceptar estaciones de la red")
+    ap.add_argument("--port", type=int, default=TCP_PORT, help="protocolo de líneas TCP")
+    ap.add_argument("--http-port", type=int, default=HTTP_PORT)
+    ap.add_argument("--db-dir", help="directorio de las DBs (por defecto barcode_lib/db)")
+    ap.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    ap.add_argument("--max-stations", type=int, default=MAX_STATIONS)
+    ap.add_argument("--write-behind", action="store_true", help="ScanLogger con journal write-behind")
+    ap.add_argument("--verbose", action="store_true", help="no silenciar la salida de los handlers")
+    args = ap.parse_args(argv)
+
+    logger = ScanLogger(db_dir=args.db_dir, write_behind=args.write_behind)
+    metrics.start_exporter()
+    srv = IngestServer(logger, args.host, args.port, args.http_port, args.max_batch,
+                       max_stations=args.max_stations, verbose=args.verbose)
+    try:
+        asyncio.run(serve(srv))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.close()
+
+if __name__ == "__main__":
+    main()
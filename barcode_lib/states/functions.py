@@ -1,23 +1,42 @@
 from tabulate import tabulate
-def zero_percent(reader): reader.logger.set_all_percent(0); print("[State] Set 0% to all."); 
-def exit_program(reader): print("[State] Exiting program"); raise KeyboardInterrupt
+from barcode_lib import metrics as _metrics
+def zero_percent(reader): reader.logger.set_all_percent(0); reader.say("[State] Set 0% to all."); 
+def exit_program(reader): reader.say("[State] Exiting program"); raise KeyboardInterrupt
 def show(reader):
     rows=reader.logger.last(10); headers=["ID","SKU","PRODUCT","BRAND","MODE","TIMESTAMP"]
     view=[[r[0],r[1],r[2] or "",r[3] or "",r[7],r[8]] for r in rows]
-    print(tabulate(view, headers=headers, tablefmt="github"))
-def back(reader): reader.logger.undo_last(); print("[State] Last action undone.")
+    reader.say(tabulate(view, headers=headers, tablefmt="github"))
+def back(reader):
+    if reader.logger.undo_last(): reader.say("[State] Last action undone.")
+    else: reader.say("[State] Nothing to undo.")
+def redo(reader):
+    if reader.logger.redo(): reader.say("[State] Last undone action redone.")
+    else: reader.say("[State] Nothing to redo.")
 def stock(reader):
     rows=reader.logger.stock_table(limit=100); headers=["SKU","PRODUCT","BRAND","STOCK"]
-    view=[[r[0],r[1] or "",r[2] or "",r[6]] for r in rows]; print(tabulate(view, headers=headers, tablefmt="github"))
+    view=[[r[0],r[1] or "",r[2] or "",r[6]] for r in rows]; reader.say(tabulate(view, headers=headers, tablefmt="github"))
 def rebuild_stock(reader):
-    ans=input("Type 'REBUILD' to rebuild: ").strip()
-    if ans.upper()=="REBUILD": reader.logger.rebuild_stock(); print("[State] Rebuilt from scans.")
-    else: print("Cancelled.")
+    ans=reader.ask("Type 'REBUILD' to rebuild: ").strip()
+    if ans.upper()=="REBUILD": reader.logger.rebuild_stock(); reader.say("[State] Rebuilt from scans.")
+    else: reader.say("Cancelled.")
 def clear_all(reader):
-    ans=input("Type 'DELETE ALL' to erase: ").strip()
-    if ans.upper()=="DELETE ALL": reader.logger.clear_all(); print("[State] All logs cleared.")
-    else: print("Cancelled.")
+    ans=reader.ask("Type 'DELETE ALL' to erase: ").strip()
+    if ans.upper()=="DELETE ALL": reader.logger.clear_all(); reader.say("[State] All logs cleared.")
+    else: reader.say("Cancelled.")
 def info(reader):
-    sku=input("SKU to inspect: ").strip()
+    sku=reader.ask("SKU to inspect: ").strip()
     info=reader.logger.catalog.get(sku) or {"product":None,"brand":None,"category":None,"url":None}
-    print(tabulate([[sku,info.get("product"),info.get("brand"),info.get("category"),info.get("url")]], headers=["SKU","PRODUCT","BRAND","CATEGORY","URL"], tablefmt="github"))
+    reader.say(tabulate([[sku,info.get("product"),info.get("brand"),info.get("category"),info.get("url")]], headers=["SKU","PRODUCT","BRAND","CATEGORY","URL"], tablefmt="github"))
+def metrics(reader):
+    rows=_metrics.REGISTRY.rows(); headers=["METRIC","LABELS","COUNT/VALUE","MEAN ms","P50 ms","P95 ms","P99 ms"]
+    reader.say(tabulate(rows, headers=headers, tablefmt="github") if rows else "[State] No metrics yet.")
+def diagnostics(reader):
+    from barcode_lib.db import plans
+    failed=plans.report(plans.check(reader.logger))
+    reader.say(f"[State] FULL SCAN in: {', '.join(failed)}" if failed else "[State] All hot queries use indexes.")
+def forecast(reader):
+    try: rows=reader.logger.forecast(limit=30)
+    except ImportError: reader.say("[State] Forecast needs NumPy (pip install numpy)."); return
+    headers=["SKU","PRODUCT","STOCK","7D/DAY","28D/DAY","RATE/DAY","DAYS LEFT","RUN-OUT"]
+    view=[[r[0],r[1] or "",*r[2:]] for r in rows]
+    reader.say(tabulate(view, headers=headers, tablefmt="github") if rows else "[State] No recent consumption to forecast.")
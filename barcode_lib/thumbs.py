@@ -0,0 +1,170 @@
+import io, os, hashlib, threading, requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+from PIL import Image
+from barcode_lib.db.imagestore import THUMB_SIZE, is_ref
+
+MEM_ITEMS = 128                    # miniaturas en memoria (LRU)
+DISK_BYTES = 64 * 1024 * 1024      # tope del caché en disco
+FETCH_TIMEOUT = 5
+
+Callback = Callable[[str, Optional[Image.Image]], None]
+
+# -------------------- Thumbnail Loader --------------------
+class ThumbnailLoader:
+    """
+    Carga y redimensiona imágenes fuera del hilo de Tk.
+
+      - LRU en memoria de miniaturas ya redimensionadas (listas para PhotoImage)
+      - caché en disco <cache_dir>/<sha1>.png, acotado por tamaño (se borran
+        primero las de mtime más viejo; un hit en disco renueva el mtime)
+      - pedidos repetidos de la misma imagen comparten la misma descarga
+
+      - con `store` (db/imagestore.py) una referencia "sha256:..." se lee de
+        la miniatura ya generada, sin caché en disco ni redimensionar
+
+    request(src, cb) llama cb(src, imagen|None) desde un hilo del pool; la GUI
+    debe pasar el resultado a su propio hilo antes de crear el PhotoImage.
+    """
+    def __init__(self, cache_dir: Path, size: Tuple[int, int] = THUMB_SIZE, workers: int = 4,
+                 mem_items: int = MEM_ITEMS, disk_bytes: int = DISK_BYTES, store=None):
+        self.store = store
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.size = size
+        self.mem_items = mem_items
+        self.disk_bytes = disk_bytes
+        self._mem = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbs")
+        self._disk_used = sum(p.stat().st_size for p in self.cache_dir.glob("*.png"))
+
+    # ---------- API ----------
+    def cached(self, src: str) -> Optional[Image.Image]:
+        with self._lock:
+            im = self._mem.get(src)
+            if im is not None:
+                self._mem.move_to_end(src)
+            return im
+
+    def request(self, src: str, cb: Optional[Callback] = None):
+        if not src:
+            if cb: cb(src, None)
+            return
+        im = self.cached(src)
+        if im is not None:
+            if cb: cb(src, im)
+            return
+        with self._lock:
+            waiting = self._inflight.get(src)
+            if waiting is not None:
+                if cb: waiting.append(cb)
+                return
+            self._inflight[src] = [cb] if cb else []
+        self._pool.submit(self._load, src)
+
+    def prefetch(self, sources):
+        for src in sources:
+            if src:
+                self.request(src)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- internals ----------
+    def _key(self, src: str) -> str:
+        if not str(src).startswith(("http://", "https://")):
+            try:
+                src = f"{src}|{os.stat(src).st_mtime_ns}"  # archivo local: invalida si cambia
+            except OSError:
+                pass
+        return hashlib.sha1(str(src).encode("utf-8")).hexdigest()
+
+    def _load(self, src: str):
+        im, keep = None, True
+        try:
+            if self.store is not None and is_ref(src):
+                im, keep = self._from_store(src)
+            else:
+                im = self._from_disk(src) or self._fetch(src)
+        except Exception:
+            im = None
+        with self._lock:
+            if im is not None and keep:
+                self._mem[src] = im
+                self._mem.move_to_end(src)
+                while len(self._mem) > self.mem_items:
+                    self._mem.popitem(last=False)
+            cbs = self._inflight.pop(src, [])
+        for cb in cbs:
+            try:
+                cb(src, im)
+            except Exception:
+                pass
+
+    def _from_store(self, src: str) -> Tuple[Optional[Image.Image], bool]:
+        """(imagen, definitiva): mientras la variante se genera, el original achicado y sin guardar en el LRU."""
+        path = self.store.path(src, "thumb")
+        if path is None:
+            return None, False
+        im = Image.open(path)
+        im.load()
+        if im.size == self.size:
+            return im, True
+        im = im.convert("RGBA")
+        im.thumbnail(self.size)
+        return im, False
+
+    def _from_disk(self, src: str) -> Optional[Image.Image]:
+        path = self.cache_dir / f"{self._key(src)}.png"
+        try:
+            im = Image.open(path)
+            im.load()
+            os.utime(path)
+            return im
+        except (FileNotFoundError, OSError):
+            return None
+
+    def _fetch(self, src: str) -> Optional[Image.Image]:
+        if str(src).startswith(("http://", "https://")):
+            r = requests.get(src, timeout=FETCH_TIMEOUT)
+            im = Image.open(io.BytesIO(r.content))
+        else:
+            im = Image.open(src)
+        im = im.convert("RGBA").resize(self.size)
+        self._store(src, im)
+        return im
+
+    def _store(self, src: str, im: Image.Image):
+        path = self.cache_dir / f"{self._key(src)}.png"
+        tmp = path.with_suffix(".tmp")
+        im.save(tmp, "PNG")
+        try:
+            old = path.stat().st_size  # se reemplaza: no contarlo dos veces
+        except OSError:
+            old = 0
+        os.replace(tmp, path)
+        with self._lock:
+            self._disk_used += path.stat().st_size - old
+            over = self._disk_used > self.disk_bytes
+        if over:
+            self._evict()
+
+    def _evict(self):
+        files = sorted(self.cache_dir.glob("*.png"), key=lambda p: p.stat().st_mtime)
+        used = sum(p.stat().st_size for p in files)
+        target = int(self.disk_bytes * 0.9)
+        for p in files:
+            if used <= target:
+                break
+            try:
+                size = p.stat().st_size
+                p.unlink()
+                used -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_used = used
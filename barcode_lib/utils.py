@@ -4,6 +4,16 @@ def import_from_path(path: str):
     module_path, obj_name = path.rsplit('.', 1)
     module = importlib.import_module(module_path)
     return getattr(module, obj_name)
+class LazyRegistry(dict):
+    """código -> 'paquete.modulo.Objeto'; se importa la primera vez que se pide (no al arrancar)."""
+    def __getitem__(self, key):
+        v = super().__getitem__(key)
+        if isinstance(v, str):
+            v = import_from_path(v)
+            super().__setitem__(key, v)
+        return v
+    def get(self, key, default=None):
+        return self[key] if key in self else default
 def load_config():
     p = Path(__file__).parent / "config" / "mappings.json"
     return json.loads(p.read_text(encoding="utf-8"))
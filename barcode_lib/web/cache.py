@@ -0,0 +1,118 @@
+import json, time, threading
+from pathlib import Path
+from typing import Optional, Dict, Any
+from barcode_lib.db.pool import ConnectionPool
+from barcode_lib.web.http import load_webconfig
+
+CACHE_NAME = "product_cache.db"  # en el db_dir del ScanLogger (por defecto barcode_lib/db)
+CACHE_DB = Path(__file__).parent.parent / "db" / CACHE_NAME
+MISS = object()  # get(): no hay entrada vigente (None = negativo cacheado)
+
+# -------------------- Scrape Cache --------------------
+class ScrapeCache:
+    """
+    Caché persistente de resultados del scraper (SQLite).
+
+      - TTL distinto para aciertos (ttl) y negativos: no encontrado o error (negative_ttl)
+      - acotado a max_entries: se desalojan las menos usadas (last_used)
+      - stats(): hits / negative_hits / misses / expired / evictions
+    """
+    def __init__(self, path: Path = CACHE_DB, ttl: float = 86400, negative_ttl: float = 3600,
+                 max_entries: int = 50_000):
+        self.ttl, self.negative_ttl, self.max_entries = ttl, negative_ttl, max_entries
+        self.db = ConnectionPool(path)
+        with self.db.write() as c:
+            c.execute(
+                """CREATE TABLE IF NOT EXISTS scrape_cache (
+                    sku TEXT PRIMARY KEY,
+                    data TEXT,
+                    negative INTEGER NOT NULL DEFAULT 0,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )"""
+            )
+            c.execute("CREATE INDEX IF NOT EXISTS idx_scrape_cache_last_used ON scrape_cache(last_used)")
+        self._entries = self.db.execute("SELECT COUNT(*) FROM scrape_cache").fetchone()[0]
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def get(self, sku: str):
+        row = self.db.execute("SELECT data, negative, expires_at FROM scrape_cache WHERE sku=?", (sku,)).fetchone()
+        now = time.time()
+        if not row:
+            self._count("misses")
+            return MISS
+        data, negative, expires_at = row
+        if expires_at <= now:
+            self._count("expired")
+            return MISS
+        with self.db.write() as c:
+            c.execute("UPDATE scrape_cache SET last_used=? WHERE sku=?", (now, sku))
+        if negative:
+            self._count("negative_hits")
+            return None
+        self._count("hits")
+        return json.loads(data)
+
+    def put(self, sku: str, data: Optional[Dict[str, Any]]):
+        """Guarda un resultado; None o sin 'product' se guarda como negativo."""
+        negative = not data or not data.get("product")
+        now = time.time()
+        ttl = self.negative_ttl if negative else self.ttl
+        with self.db.write() as c:
+            new = c.execute("SELECT 1 FROM scrape_cache WHERE sku=?", (sku,)).fetchone() is None
+            c.execute(
+                """INSERT INTO scrape_cache (sku, data, negative, expires_at, last_used) VALUES (?,?,?,?,?)
+                   ON CONFLICT(sku) DO UPDATE SET data=excluded.data, negative=excluded.negative,
+                       expires_at=excluded.expires_at, last_used=excluded.last_used""",
+                (sku, None if negative else json.dumps(data), int(negative), now + ttl, now),
+            )
+            self._entries += new
+            if self._entries > self.max_entries:
+                self._evict(c)
+
+    def _evict(self, c):
+        # LRU: dejar el caché al 90 % de max_entries
+        keep = int(self.max_entries * 0.9)
+        drop = self._entries - keep
+        c.execute(
+            "DELETE FROM scrape_cache WHERE sku IN (SELECT sku FROM scrape_cache ORDER BY last_used LIMIT ?)",
+            (drop,),
+        )
+        with self._lock:
+            self._stats["evictions"] += drop
+        self._entries = keep
+
+    def invalidate(self, sku: str):
+        with self.db.write() as c:
+            self._entries -= c.execute("DELETE FROM scrape_cache WHERE sku=?", (sku,)).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+        lookups = out["hits"] + out["negative_hits"] + out["misses"] + out["expired"]
+        out["entries"] = self._entries
+        out["hit_ratio"] = round((out["hits"] + out["negative_hits"]) / lookups, 3) if lookups else None
+        return out
+
+_caches: Dict[Path, ScrapeCache] = {}
+_default_lock = threading.Lock()
+
+def default_cache(path: Optional[Path] = None) -> ScrapeCache:
+    """Un ScrapeCache por archivo (uno por db_dir), con los TTL de webconfig.json."""
+    path = Path(path) if path else CACHE_DB
+    with _default_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cfg = load_webconfig()
+            cache = _caches[path] = ScrapeCache(
+                path,
+                ttl=cfg.get("cache_ttl_seconds", 86400),
+                negative_ttl=cfg.get("negative_cache_ttl_seconds", 3600),
+                max_entries=cfg.get("cache_max_entries", 50_000),
+            )
+        return cache
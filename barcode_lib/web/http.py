@@ -0,0 +1,51 @@
+import json, time, threading, requests
+from pathlib import Path
+from urllib.parse import urlparse
+from typing import Dict, Any, Optional
+
+WEBCONFIG = Path(__file__).parent / "webconfig.json"
+
+def load_webconfig() -> Dict[str, Any]:
+    try:
+        return json.loads(WEBCONFIG.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+# -------------------- Rate limiting --------------------
+class HostRateLimiter:
+    """Separación mínima entre requests al mismo host, compartida por todos los workers."""
+    def __init__(self, min_delay: float):
+        self.min_delay = float(min_delay)
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str):
+        if self.min_delay <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next.get(host, 0.0))
+            self._next[host] = at + self.min_delay  # reserva el turno antes de dormir
+        if at > now:
+            time.sleep(at - now)
+
+_default_limiter: Optional[HostRateLimiter] = None
+
+def default_limiter() -> HostRateLimiter:
+    global _default_limiter
+    if _default_limiter is None:
+        cfg = load_webconfig().get("rate_limit", {})
+        _default_limiter = HostRateLimiter(cfg.get("min_delay_seconds", 0))
+    return _default_limiter
+
+class LimitedSession(requests.Session):
+    """requests.Session con keep-alive que respeta el rate limit por host."""
+    def __init__(self, limiter: Optional[HostRateLimiter] = None, timeout: float = 10):
+        super().__init__()
+        self.limiter = limiter or default_limiter()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        self.limiter.acquire(urlparse(url).hostname or "")
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
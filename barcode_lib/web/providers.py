@@ -0,0 +1,279 @@
+"""
+Cadena de proveedores de datos de producto (webconfig.json -> "providers").
+
+    {"name": "openfoodfacts", "url": "https://.../{code}.json", "parser": "openfoodfacts",
+     "budget_ms": 800, "timeout": 6}
+
+lookup(code) arranca el primer proveedor; si a los budget_ms no hay una
+respuesta completa (o falló / vino vacío) arranca el siguiente sin cortar
+el anterior, y así (budget_ms = 0: todos en paralelo). Gana la primera
+respuesta completa (COMPLETE); si ninguna lo es, se combinan campo por
+campo, cada campo del primer proveedor de la lista que lo trae (como el
+merge del enrichment). Corta igual al vencer el plazo (deadline).
+
+Cada proveedor tiene su CircuitBreaker: tras `failures` errores seguidos
+(red, timeout, 5xx, respuesta ilegible) no se lo llama por `reset`
+segundos; después pasa una sola prueba. Un 404 es "no lo tiene", no error.
+
+Cada pedido corre en su propio hilo daemon (uno perdido tras el deadline
+no demora la salida del programa); el parseo HTML (bs4) en un pool de
+procesos, fuera del hilo del enrichment y del GIL. Los parsers JSON son
+baratos y corren en el hilo del pedido.
+"""
+import json, time, threading, multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+from barcode_lib import metrics
+
+FIELDS = ("product", "brand", "category", "image", "url")
+COMPLETE = ("product", "brand", "category", "image")  # con esto una respuesta gana sola
+BUDGET_MS = 800          # espera antes de arrancar el proveedor siguiente
+TIMEOUT = 6.0            # por pedido
+DEADLINE = 8.0           # por lookup
+BREAKER_FAILURES = 3
+BREAKER_RESET = 120.0
+PARSE_WORKERS = 1
+
+Data = Dict[str, Any]
+
+# -------------------- parsers --------------------
+def _text(v) -> Optional[str]:
+    if isinstance(v, list):
+        v = v[0] if v else None
+    if isinstance(v, dict):  # {"@type": "Brand", "name": ...} / ImageObject
+        v = v.get("name") or v.get("url")
+    v = str(v).strip() if v is not None else ""
+    return v or None
+
+def _clean(d: Data) -> Data:
+    out: Data = {}
+    for k in FIELDS:
+        v = _text(d.get(k))
+        if v:
+            out[k] = v
+    return out
+
+def parse_openfoodfacts(text: str, url: str) -> Data:
+    doc = json.loads(text)
+    p = doc.get("product") or {}
+    if doc.get("status") != 1 or not p:
+        return {}
+    cats = [c.strip() for c in (p.get("categories") or "").split(",") if c.strip()]
+    return _clean({"product": p.get("product_name"), "brand": (p.get("brands") or "").split(",")[0],
+                   "category": cats[-1] if cats else None, "image": p.get("image_front_url") or p.get("image_url"),
+                   "url": f"https://world.openfoodfacts.org/product/{p['code']}" if p.get("code") else None})
+
+def parse_upcitemdb(text: str, url: str) -> Data:
+    items = json.loads(text).get("items") or []
+    if not items:
+        return {}
+    it = items[0]
+    cats = [c.strip() for c in (it.get("category") or "").split(">") if c.strip()]
+    offers = it.get("offers") or [{}]
+    return _clean({"product": it.get("title"), "brand": it.get("brand"), "category": cats[-1] if cats else None,
+                   "image": it.get("images"), "url": offers[0].get("link")})
+
+def _ld_products(node) -> List[dict]:
+    if isinstance(node, list):
+        return [p for n in node for p in _ld_products(n)]
+    if not isinstance(node, dict):
+        return []
+    kind = node.get("@type")
+    if kind == "Product" or (isinstance(kind, list) and "Product" in kind):
+        return [node]
+    return _ld_products(node.get("@graph", []))
+
+def parse_html(text: str, url: str) -> Data:
+    """Página de producto: JSON-LD schema.org Product y, para lo que falte, meta og:/product:."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(text, "html.parser")
+    out: Data = {}
+    for tag in soup.find_all("script", type="application/ld+json"):
+        try:
+            found = _ld_products(json.loads(tag.string or ""))
+        except ValueError:
+            continue
+        if found:
+            p = found[0]
+            out = _clean({"product": p.get("name"), "brand": p.get("brand"), "category": p.get("category"),
+                          "image": p.get("image"), "url": p.get("url")})
+            break
+    meta = lambda prop: _text((soup.find("meta", property=prop) or soup.find("meta", attrs={"name": prop}) or {}).get("content"))
+    for k, prop in (("product", "og:title"), ("brand", "product:brand"), ("category", "product:category"),
+                    ("image", "og:image"), ("url", "og:url")):
+        if not out.get(k) and meta(prop):
+            out[k] = meta(prop)
+    if out and not out.get("url"):
+        out["url"] = url
+    return out
+
+PARSERS: Dict[str, Callable[[str, str], Data]] = {
+    "openfoodfacts": parse_openfoodfacts, "upcitemdb": parse_upcitemdb, "html": parse_html}
+OFFLOAD = {"html"}  # parsers que van al pool de procesos
+
+def parse(kind: str, text: str, url: str) -> Data:
+    return PARSERS[kind](text, url)
+
+# -------------------- Circuit breaker --------------------
+class CircuitBreaker:
+    """closed -> open tras `failures` errores seguidos; open -> half-open (una prueba) a los `reset` s."""
+    def __init__(self, failures: int = BREAKER_FAILURES, reset: float = BREAKER_RESET,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failures, self.reset, self.clock = max(1, int(failures)), float(reset), clock
+        self._errors = 0
+        self._opened: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened is None:
+                return "closed"
+            return "half-open" if self._probing or self.clock() - self._opened >= self.reset else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened is None:
+                return True
+            if not self._probing and self.clock() - self._opened >= self.reset:
+                self._probing = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self._errors, self._opened, self._probing = 0, None, False
+
+    def failure(self):
+        with self._lock:
+            self._errors += 1
+            if self._probing or self._errors >= self.failures:
+                self._opened = self.clock()  # la prueba falló: otro período abierto
+            self._probing = False
+
+# -------------------- Provider chain --------------------
+class Provider:
+    def __init__(self, name: str, url: str, parser: str = "html", budget_ms: float = BUDGET_MS,
+                 timeout: float = TIMEOUT, breaker: Optional[CircuitBreaker] = None):
+        if parser not in PARSERS:
+            raise ValueError(f"unknown parser for provider {name}: {parser}")
+        self.name, self.url, self.parser = name, url, parser
+        self.budget = max(0.0, float(budget_ms) / 1000.0)
+        self.timeout = float(timeout)
+        self.breaker = breaker or CircuitBreaker()
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any], failures: int = BREAKER_FAILURES,
+                    reset: float = BREAKER_RESET) -> "Provider":
+        return cls(cfg["name"], cfg["url"], cfg.get("parser", "html"), cfg.get("budget_ms", BUDGET_MS),
+                   cfg.get("timeout", TIMEOUT), CircuitBreaker(failures, reset))
+
+class ProviderChain:
+    def __init__(self, providers: List[Provider], deadline: float = DEADLINE, parse_workers: int = PARSE_WORKERS):
+        self.providers = list(providers)
+        self.deadline = float(deadline)
+        self.parse_workers = max(1, int(parse_workers))
+        self._parse_pool: Optional[ProcessPoolExecutor] = None  # arranca con el primer HTML
+        self._lock = threading.Lock()
+
+    def lookup(self, code: str, session=None) -> Optional[Data]:
+        """Datos del producto (campos de FIELDS) o None si ningún proveedor lo encontró."""
+        queue = list(self.providers)  # allow() recién al arrancar: la prueba half-open es la que de verdad sale
+        pending: Dict[Future, Provider] = {}
+        found: Dict[str, Data] = {}
+        end = time.monotonic() + self.deadline
+        hedge_at = 0.0
+        while queue or pending:
+            now = time.monotonic()
+            if now >= end:
+                break
+            if queue and (not pending or now >= hedge_at):
+                p = queue.pop(0)
+                if not p.breaker.allow():
+                    continue
+                if pending:
+                    metrics.counter("lookup_hedges_total", provider=p.name).inc()
+                pending[self._start(p, code, session)] = p
+                hedge_at = now + p.budget
+                continue
+            done, _ = wait(pending, timeout=min(hedge_at if queue else end, end) - now, return_when=FIRST_COMPLETED)
+            for f in done:
+                p = pending.pop(f)
+                data = f.result()
+                if not data:
+                    continue
+                if all(data.get(k) for k in COMPLETE):
+                    return data  # primera respuesta completa
+                found[p.name] = data
+            merged = self._merge(found)
+            if all(merged.get(k) for k in COMPLETE):
+                return merged
+        return self._merge(found) or None
+
+    def _merge(self, found: Dict[str, Data]) -> Data:
+        out: Data = {}
+        for p in self.providers:  # cada campo, del primero de la lista que lo trae
+            for k, v in found.get(p.name, {}).items():
+                if v and not out.get(k):
+                    out[k] = v
+        return out
+
+    def _start(self, p: Provider, code: str, session) -> Future:
+        fut: Future = Future()
+        threading.Thread(target=lambda: fut.set_result(self._call(p, code, session)), daemon=True,
+                         name=f"lookup-{p.name}").start()
+        return fut
+
+    def _call(self, p: Provider, code: str, session) -> Optional[Data]:
+        t = time.perf_counter()
+        outcome, data = "error", None
+        try:
+            if session is None:
+                import requests
+                session = requests
+            r = session.get(p.url.format(code=code), timeout=p.timeout)
+            if r.status_code == 404:
+                data = {}
+            else:
+                r.raise_for_status()
+                data = self._parse(p, r.text, r.url)
+            p.breaker.success()
+            outcome = "found" if data else "empty"
+        except Exception:
+            p.breaker.failure()
+        metrics.histogram("lookup_seconds", "pedido + parseo por proveedor", provider=p.name,
+                          outcome=outcome).observe(time.perf_counter() - t)
+        return data
+
+    def _parse(self, p: Provider, text: str, url: str) -> Data:
+        if p.parser not in OFFLOAD:
+            return parse(p.parser, text, url)
+        with self._lock:
+            if self._parse_pool is None:
+                self._parse_pool = ProcessPoolExecutor(self.parse_workers, mp_context=multiprocessing.get_context("spawn"))
+            pool = self._parse_pool
+        return pool.submit(parse, p.parser, text, url).result(p.timeout)
+
+    def stats(self) -> Dict[str, str]:
+        return {p.name: p.breaker.state for p in self.providers}
+
+    def close(self):
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(wait=False, cancel_futures=True)
+            self._parse_pool = None
+
+_default_chain: Optional[ProviderChain] = None
+_default_lock = threading.Lock()
+
+def default_chain() -> ProviderChain:
+    global _default_chain
+    with _default_lock:
+        if _default_chain is None:
+            from barcode_lib.web.http import load_webconfig
+            cfg = load_webconfig()
+            failures = cfg.get("breaker_failures", BREAKER_FAILURES)
+            reset = cfg.get("breaker_reset_seconds", BREAKER_RESET)
+            _default_chain = ProviderChain([Provider.from_config(p, failures, reset) for p in cfg.get("providers", [])],
+                                           deadline=cfg.get("lookup_deadline_seconds", DEADLINE))
+        return _default_chain
@@ -1,2 +1,20 @@
-def scrape_product_info(code, force_refresh=False):
-    return {'product':'Unknown product','brand':'Unknown','category':'General','image':None,'url':None}
+from barcode_lib.web.cache import default_cache, MISS
+from barcode_lib.web.providers import default_chain
+
+def _lookup(code, session=None):
+    # proveedores de webconfig.json (ver web/providers.py); None si ninguno lo tiene
+    return default_chain().lookup(code, session)
+
+def scrape_product_info(code, force_refresh=False, session=None, cache_path=None):
+    # caché persistente: aciertos y negativos (no encontrado / error) con TTL propio
+    cache = default_cache(cache_path)
+    if not force_refresh:
+        hit = cache.get(code)
+        if hit is not MISS:
+            return hit
+    try:
+        data = _lookup(code, session)
+    except Exception:
+        data = None
+    cache.put(code, data)
+    return data
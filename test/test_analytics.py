@@ -0,0 +1,42 @@
+import unittest, tempfile, shutil
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from barcode_lib import bulk
+from barcode_lib.db.logger import ScanLogger
+from barcode_lib.bench.dispatch import offline_scrape
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+@unittest.skipUnless(numpy, "needs numpy")
+class T(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_forecast_rates_and_incremental_update(self):
+        from barcode_lib.analytics import Forecaster
+        today = date.today()
+        at = lambda days_ago: (datetime.combine(today, datetime.min.time()) - timedelta(days=days_ago, hours=-12)).strftime("%Y-%m-%d %H:%M:%S")
+        rows = [{"sku": "A", "mode": "input", "ts": at(200)} for _ in range(20)]        # stock previo a la ventana
+        rows += [{"sku": "A", "mode": "output", "ts": at(d)} for d in range(14, 0, -1)]  # 1 por día hasta ayer
+        rows += [{"sku": "B", "mode": "input", "ts": at(5)},                             # B no se consume
+                 {"sku": "C", "mode": "input", "ts": at(20)}, {"sku": "C", "mode": "output", "ts": at(20)}]
+        lg = ScanLogger(db_dir=self.dir, scrape=offline_scrape)
+        bulk.import_scans(lg, rows)
+        c, a = lg.forecast(today=today)
+        self.assertEqual((c[0], c[2], c[6], c[7]), ("C", 0, 0, today.isoformat()))  # ya sin stock
+        self.assertEqual((a[0], a[2], a[3], a[4]), ("A", 6, round(6 / 7, 3), 0.5))
+        w = [0.5 ** (d / 14) for d in range(90)]  # EWMA sobre la ventana, hoy pesa 1
+        self.assertEqual(a[5], round(sum(w[1:15]) / sum(w), 3))
+        self.assertEqual(a[6], round(6 / a[5], 1))
+        # incremental: solo los escaneos nuevos, igual que recalcular de cero
+        lg.log_output("A"); lg.log_output("B")
+        rows = lg.forecast(today=today)
+        self.assertEqual(rows, Forecaster(lg).forecast(today=today))
+        self.assertEqual(sorted(r[0] for r in rows), ["A", "B", "C"])
+        lg.close()
+
+if __name__=='__main__': unittest.main()
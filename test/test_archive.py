@@ -0,0 +1,50 @@
+import unittest, tempfile, shutil, io
+from pathlib import Path
+from barcode_lib import bulk
+from barcode_lib.db import archive, schema
+from barcode_lib.db.logger import ScanLogger
+from barcode_lib.bench.dispatch import offline_scrape
+
+class T(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_compaction_keeps_history_answers(self):
+        hist = [("A", "input", "2023-03-01"), ("A", "input", "2023-03-01"), ("B", "input", "2023-03-02"),
+                ("A", "set", "2023-04-10"), ("A", "output", "2023-05-01"), ("B", "input", "2023-05-01"),
+                ("C", "input", "2024-05-20"), ("A", "input", "2024-05-25"), ("B", "output", "2024-05-30"),
+                ("A", "output", "2023-01-05")]  # importada al final con fecha vieja: queda hasta que llegue su turno
+        rows = [{"sku": s, "mode": m, "ts": f"{d} 12:00:00", "value": "40" if m == "set" else None} for s, m, d in hist]
+        lg = ScanLogger(db_dir=self.dir, archive_retention_days=None, scrape=offline_scrape)
+        bulk.import_scans(lg, rows)
+        days = ("2023-03-01", "2023-04-30", "2023-05-01", "2024-05-26", "2024-06-01")
+        as_of = lambda: [sorted(lg.stock_as_of(f"{d} 23:59:59")) for d in days]
+        live, before = sorted(lg.stock_table()), as_of()
+        hist_a = lg.daily_history("A")
+        export = lambda: bulk.export_table(lg, "scans", io.StringIO(), "csv")
+
+        now = schema.epoch("2024-06-01 12:00:00")
+        self.assertEqual(archive.compact(lg.scans, 365, batch=2, now=now), 6)
+        self.assertEqual(archive.compact(lg.scans, 365, batch=2, now=now), 0)
+        self.assertEqual(len(list((self.dir / "archive").glob("*.csv.gz"))), 3)
+        self.assertEqual([r[0] for r in lg.scans.execute("SELECT id FROM scan_log ORDER BY id")], [7, 8, 9, 10])
+        self.assertEqual(as_of(), before)
+        self.assertEqual(lg.daily_history("A"), hist_a)
+        self.assertEqual(lg.daily_history("A", since="2023-05-01"), [r for r in hist_a if r[0] >= "2023-05-01"])
+        self.assertEqual(export(), 10)
+        lg.rebuild_stock()
+        self.assertEqual(sorted(lg.stock_table()), live)
+        # sin snapshots: el tramo archivado se replaya desde los archivos
+        with lg.scans.write() as c:
+            c.execute("DELETE FROM checkpoint_stock"); c.execute("DELETE FROM checkpoints")
+        self.assertEqual(as_of(), before)
+        lg.rebuild_stock()
+        self.assertEqual(sorted(lg.stock_table()), live)
+        lg.clear_all()
+        self.assertEqual(list((self.dir / "archive").glob("*")), [])
+        self.assertEqual(lg.daily_history("A"), [])
+        lg.close()
+
+if __name__=='__main__': unittest.main()
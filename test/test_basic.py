@@ -1,6 +1,13 @@
-import unittest
+import unittest, tempfile, shutil
 from barcode_lib.reader import BarcodeReader
+from barcode_lib.db.logger import ScanLogger
+from barcode_lib.bench.dispatch import offline_scrape
 class T(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.lg = ScanLogger(db_dir=self.dir, scrape=offline_scrape)
+    def tearDown(self):
+        self.lg.close(); shutil.rmtree(self.dir, ignore_errors=True)
     def test_main(self):
-        r=BarcodeReader(); self.assertIsNotNone(r)
+        r=BarcodeReader(logger=self.lg); self.assertIsNotNone(r)
 if __name__=='__main__': unittest.main()
@@ -0,0 +1,43 @@
+import unittest, tempfile, shutil, io
+from pathlib import Path
+from barcode_lib.db.logger import ScanLogger
+from barcode_lib.bench.dispatch import offline_scrape
+from barcode_lib import bulk
+
+class T(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.lg = ScanLogger(db_dir=self.dir, scrape=offline_scrape)
+    def tearDown(self):
+        self.lg.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_products_upsert_keeps_existing_fields(self):
+        self.lg.catalog.upsert("A", {"product": "Leche", "brand": "Colun"})
+        self.assertEqual(self.lg.catalog.get("A")["brand"], "Colun")  # queda en el LRU
+        feed = io.StringIO("sku,product,brand\nA,Leche entera,\nB,Pan,Ideal\n,sin sku,\n")
+        res = bulk.import_products(self.lg, bulk.read_rows(feed, "csv"), batch=1)
+        self.assertEqual(res, {"rows": 2, "skipped": 1})
+        a = self.lg.catalog.get("A")
+        self.assertEqual((a["product"], a["brand"]), ("Leche entera", "Colun"))
+        self.assertEqual([r[0] for r in self.lg.catalog.search("pan")], ["B"])
+        out = io.StringIO()
+        self.assertEqual(bulk.export_table(self.lg, "products", out, "jsonl"), 2)
+        back = list(bulk.read_rows(io.StringIO(out.getvalue()), "jsonl"))
+        self.assertEqual([r["sku"] for r in back], ["A", "B"])
+
+    def test_scans_roundtrip_rebuilds_stock(self):
+        for sku in "AAB":
+            self.lg.log_input(sku)
+        self.lg.log_output("A")
+        out = io.StringIO()
+        self.assertEqual(bulk.export_table(self.lg, "scans", out, "csv"), 4)
+        other = ScanLogger(db_dir=self.dir / "other", scrape=offline_scrape)
+        try:
+            res = bulk.import_scans(other, bulk.read_rows(io.StringIO(out.getvalue()), "csv"))
+            self.assertEqual(res["rows"], 4)
+            self.assertEqual({r[0]: r[6] for r in other.stock_table()}, {"A": 1, "B": 1})
+        finally:
+            other.close()
+
+if __name__=='__main__': unittest.main()
@@ -0,0 +1,103 @@
+import unittest, tempfile, shutil, threading, time, json
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from barcode_lib.db.logger import Catalog
+from barcode_lib.db.enrich import EnrichmentPool
+from barcode_lib.web.http import HostRateLimiter
+from barcode_lib.web.cache import ScrapeCache, MISS
+
+class Stub(BaseHTTPRequestHandler):
+    hits = Counter()
+    times = []
+    def do_GET(self):
+        sku = self.path.rsplit("/", 1)[-1]
+        Stub.hits[sku] += 1; Stub.times.append(time.monotonic())
+        time.sleep(0.05)
+        body = json.dumps({"product": f"Producto {sku}", "brand": "Stub"}).encode()
+        self.send_response(200); self.send_header("Content-Length", str(len(body))); self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *a): pass
+
+class T(unittest.TestCase):
+    def setUp(self):
+        Stub.hits.clear(); Stub.times.clear()
+        self.srv = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+        threading.Thread(target=self.srv.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.srv.server_port}"
+        self.dir = Path(tempfile.mkdtemp())
+        self.catalog = Catalog(self.dir / "catalog.db")
+    def tearDown(self):
+        self.srv.shutdown(); self.srv.server_close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def scrape(self, sku, force_refresh=False, session=None):
+        return session.get(f"{self.base}/p/{sku}").json()
+
+    def test_coalesces_duplicate_skus(self):
+        pool = EnrichmentPool(self.catalog, self.scrape, workers=4, limiter=HostRateLimiter(0))
+        for _ in range(12):
+            pool.submit("A")
+        for sku in "BCD":
+            pool.submit(sku)
+        self.assertTrue(pool.join(5))
+        self.assertEqual(Stub.hits["A"], 1)
+        self.assertEqual(sum(Stub.hits.values()), 4)
+        self.assertEqual(self.catalog.get("A")["product"], "Producto A")
+        st = pool.stats()
+        self.assertEqual((st["done"], st["coalesced"], st["queued"], st["inflight"]), (4, 11, 0, 0))
+        self.assertIsNotNone(st["latency_ms"]["p95"])
+
+    def test_rate_limit_per_host(self):
+        pool = EnrichmentPool(self.catalog, self.scrape, workers=4, limiter=HostRateLimiter(0.1))
+        for sku in "ABCD":
+            pool.submit(sku)
+        self.assertTrue(pool.join(5))
+        gaps = [b - a for a, b in zip(Stub.times, Stub.times[1:])]
+        self.assertTrue(all(g >= 0.09 for g in gaps), gaps)
+
+    def test_close_finishes_inflight_and_drops_the_rest(self):
+        pool = EnrichmentPool(self.catalog, self.scrape, workers=1, limiter=HostRateLimiter(0))
+        for sku in "ABCDE":
+            pool.submit(sku)
+        while not Stub.hits:
+            time.sleep(0.005)  # A en vuelo, el resto en cola
+        self.assertTrue(pool.close(5))
+        self.assertEqual(Stub.hits["A"], 1)
+        self.assertEqual(self.catalog.get("A")["product"], "Producto A")
+        self.assertLess(sum(Stub.hits.values()), 5)
+        self.assertFalse(pool.submit("F"))
+        self.assertTrue(pool.join(1))  # nada pendiente tras cerrar
+        self.assertEqual(pool.stats()["queued"], 0)
+
+class TCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_ttl_negative_and_persistence(self):
+        c = ScrapeCache(self.dir / "cache.db", ttl=60, negative_ttl=0.05)
+        self.assertIs(c.get("A"), MISS)
+        c.put("A", {"product": "Leche"}); c.put("B", None)
+        self.assertEqual(c.get("A"), {"product": "Leche"})
+        self.assertIsNone(c.get("B"))
+        time.sleep(0.06)
+        self.assertIs(c.get("B"), MISS)  # el negativo vence antes
+        st = c.stats()
+        self.assertEqual((st["hits"], st["negative_hits"], st["misses"], st["expired"]), (1, 1, 1, 1))
+        c.db.close()
+        self.assertEqual(ScrapeCache(self.dir / "cache.db").get("A"), {"product": "Leche"})
+
+    def test_lru_eviction(self):
+        c = ScrapeCache(self.dir / "cache.db", max_entries=10)
+        for i in range(10):
+            c.put(str(i), {"product": str(i)})
+        c.get("0")  # 0 pasa a ser el más reciente
+        c.put("10", {"product": "10"})
+        st = c.stats()
+        self.assertEqual((st["entries"], st["evictions"]), (9, 2))
+        self.assertIsNot(c.get("0"), MISS)
+        self.assertIs(c.get("1"), MISS)
+
+if __name__=='__main__': unittest.main()
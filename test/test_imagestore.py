@@ -0,0 +1,72 @@
+import unittest, tempfile, shutil, threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from PIL import Image
+from barcode_lib.db import imagestore
+from barcode_lib.db.logger import ScanLogger
+from barcode_lib.bench.dispatch import offline_scrape
+
+class Stub(BaseHTTPRequestHandler):
+    hits = Counter()
+    body = b""
+    def do_GET(self):
+        Stub.hits[self.path] += 1
+        self.send_response(200); self.send_header("Content-Length", str(len(Stub.body))); self.end_headers()
+        self.wfile.write(Stub.body)
+    def log_message(self, *a): pass
+
+class T(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def picture(self, name, size=(1600, 400), color="red") -> Path:
+        path = self.dir / name
+        Image.new("RGB", size, color).save(path, "PNG")
+        return path
+
+    def test_upload_dedup_and_variants(self):
+        lg = ScanLogger(db_dir=self.dir / "db", archive_retention_days=None, scrape=offline_scrape)
+        a, b = self.picture("a.png"), self.picture("copia.png")
+        lg.upsert_product("A", {"product": "Arroz", "image": str(a)})
+        lg.upsert_product("B", {"product": "Azúcar", "image": str(b)})
+        ref = lg.catalog.get("A")["image"]
+        self.assertTrue(imagestore.is_ref(ref))
+        self.assertEqual(lg.catalog.get("B")["image"], ref)
+        self.assertEqual(len(list((self.dir / "db" / "images" / "orig").rglob("*.png"))), 1)
+        self.assertTrue(lg.images.join(60))
+        a.unlink(); b.unlink()  # mostrarla ya no depende del archivo subido
+        with Image.open(lg.images.path(ref, "thumb")) as im:
+            self.assertEqual(im.size, imagestore.THUMB_SIZE)
+        with Image.open(lg.images.path(ref, "display")) as im:
+            self.assertEqual(im.size, (800, 200))
+        (self.dir / "no.png").write_text("no es una imagen")
+        with self.assertRaises(ValueError):
+            lg.upsert_product("A", {"product": "Arroz", "image": str(self.dir / "no.png")})
+        self.assertEqual(lg.catalog.get("A")["image"], ref)
+        lg.close()
+
+    def test_enrichment_downloads_once(self):
+        self.picture("web.png", (300, 300), "blue")
+        Stub.hits.clear(); Stub.body = (self.dir / "web.png").read_bytes()
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{srv.server_port}/img/1.png"
+        lg = ScanLogger(db_dir=self.dir / "db", archive_retention_days=None,
+                        scrape=lambda sku, force_refresh=False, session=None: {"product": f"P {sku}", "image": url})
+        try:
+            for sku in ("A", "B"):
+                lg.add_or_refresh_product(sku)
+                self.assertTrue(lg.enricher.join(10))
+            refs = {lg.catalog.get(s)["image"] for s in "AB"}
+            self.assertEqual(len(refs), 1)
+            self.assertTrue(imagestore.is_ref(refs.pop()))
+            self.assertEqual(Stub.hits["/img/1.png"], 1)
+            self.assertTrue(lg.images.join(60))
+        finally:
+            lg.close()
+            srv.shutdown(); srv.server_close()
+
+if __name__=='__main__': unittest.main()
@@ -0,0 +1,231 @@
+import unittest, tempfile, shutil, threading, random
+from pathlib import Path
+from barcode_lib.db.logger import ScanLogger, Catalog
+from barcode_lib.bench.dispatch import offline_scrape
+from barcode_lib.db.journal import ScanJournal
+
+class T(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def stock_of(self, lg, sku):
+        return lg.stock.execute("SELECT qty, percent FROM stock WHERE sku=?", (sku,)).fetchone()
+
+    def test_write_behind_matches_sync(self):
+        for wb in (False, True):
+            lg = ScanLogger(db_dir=self.dir / str(wb), write_behind=wb, scrape=offline_scrape)
+            lg.log_input("A"); lg.log_input("A"); lg.log_set("A", 40)
+            self.assertTrue(lg.log_output("A"))
+            self.assertFalse(lg.log_output("B"))
+            lg.flush()
+            self.assertEqual(self.stock_of(lg, "A"), (1, 100))
+            self.assertEqual(len(lg.last(10)), 5)
+            lg.close()
+
+    def test_journal_replayed_on_startup(self):
+        lg = ScanLogger(db_dir=self.dir, write_behind=True, scrape=offline_scrape)
+        lg.log_input("A"); lg.close()
+        # simular crash: escaneos anotados en el journal pero nunca aplicados
+        j = ScanJournal(self.dir / "scans.journal"); j.bump(1)
+        j.append({"sku": "A", "mode": "input", "ts": "2024-01-01 00:00:00"})
+        j.append({"sku": "A", "mode": "set", "pct": 50, "value": "50|-1", "ts": "2024-01-01 00:00:01"})
+        j.close()
+        lg = ScanLogger(db_dir=self.dir, write_behind=True, scrape=offline_scrape)
+        self.assertEqual(self.stock_of(lg, "A"), (1, 50))
+        self.assertEqual(len(lg.last(10)), 3)
+        lg.close()
+
+    def test_threads_share_logger(self):
+        lg = ScanLogger(db_dir=self.dir, scrape=offline_scrape)
+        errors = []
+        def scan():
+            try:
+                for i in range(200): lg.log_input(f"S{i % 7}")
+            except Exception as e:
+                errors.append(e)
+        ts = [threading.Thread(target=scan) for _ in range(3)]
+        for t in ts: t.start()
+        while any(t.is_alive() for t in ts):
+            lg.stock_table(); lg.last(50); lg.catalog.search("s")
+        for t in ts: t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(lg.stock.execute("SELECT SUM(qty) FROM stock").fetchone()[0], 600)
+        lg.close()
+    def test_rebuild_matches_live_stock(self):
+        lg = ScanLogger(db_dir=self.dir, scrape=offline_scrape)
+        rnd = random.Random(7)
+        for _ in range(600):
+            sku, op = f"S{rnd.randint(0, 9)}", rnd.random()
+            if op < 0.5: lg.log_input(sku)
+            elif op < 0.8: lg.log_output(sku)
+            else: lg.log_set(sku, rnd.randint(0, 100))
+        live = sorted(lg.stock.execute("SELECT sku, qty, percent FROM stock").fetchall())
+        for workers in (1, 2):
+            with lg.scans.write() as c:
+                c.execute("DELETE FROM checkpoint_stock"); c.execute("DELETE FROM checkpoints")
+            lg.rebuild_stock(workers=workers)
+            self.assertEqual(sorted(lg.stock.execute("SELECT sku, qty, percent FROM stock").fetchall()), live)
+        # el siguiente rebuild parte del checkpoint y solo replaya la cola
+        lg.log_input("S1"); lg.log_input("NEW")
+        live = sorted(lg.stock.execute("SELECT sku, qty, percent FROM stock").fetchall())
+        lg.rebuild_stock()
+        self.assertEqual(sorted(lg.stock.execute("SELECT sku, qty, percent FROM stock").fetchall()), live)
+        lg.close()
+    def test_undo_redo(self):
+        for wb in (False, True):
+            lg = ScanLogger(db_dir=self.dir / str(wb), write_behind=wb, scrape=offline_scrape)
+            lg.log_input("A"); lg.log_input("A"); lg.log_set("A", 30)
+            lg.enricher.join()
+            before = lg.catalog.get("A")
+            lg.upsert_product("A", {"product": "Arroz"})
+            self.assertEqual(lg.undo_last(2), 2)   # producto + set
+            self.assertEqual(lg.catalog.get("A"), before)
+            self.assertEqual(self.stock_of(lg, "A"), (2, 100))
+            self.assertEqual(len(lg.last(10)), 2)
+            self.assertEqual(lg.redo(), 1)         # vuelve el set
+            self.assertEqual(self.stock_of(lg, "A"), (1, 30))
+            lg.log_output("A")                      # acción nueva descarta el redo
+            self.assertEqual(lg.redo(), 0)
+            self.assertEqual(lg.undo_last(10), 4)
+            self.assertIsNone(self.stock_of(lg, "A"))
+            self.assertEqual(lg.last(10), [])
+            lg.close()
+    def test_catalog_search(self):
+        cat = Catalog(self.dir / "catalog.db")
+        cat.upsert("7801", {"product": "Azúcar flor", "brand": "Iansa"})
+        cat.upsert("7802", {"product": "Arroz", "brand": "Tucapel"})
+        self.assertEqual([r[0] for r in cat.search("azucar")], ["7801"])
+        self.assertEqual([r[0] for r in cat.search("780")], ["7801", "7802"])
+        self.assertEqual([r[0] for r in cat.search("rroz")], ["7802"])  # subcadena: cae al LIKE
+        cat.upsert("7802", {"product": "Fideos"})
+        self.assertEqual(cat.search("arroz"), [])
+        cat.remove("7801")
+        self.assertEqual(cat.search("flor"), [])
+
+    def test_catalog_cache(self):
+        lg = ScanLogger(db_dir=self.dir, scrape=offline_scrape)
+        cat = lg.catalog
+        cat.upsert("X", {"product": "Leche"})
+        self.assertIsNone(cat.get("NOPE")); self.assertIsNone(cat.get("NOPE"))  # ausencia también se cachea
+        self.assertEqual(cat.get("X")["product"], "Leche")
+        self.assertEqual(cat.record("X").product, "Leche")
+        cat.upsert("X", {"product": "Leche descremada"})
+        self.assertEqual(cat.get("X")["product"], "Leche descremada")
+        cat.remove("X")
+        self.assertIsNone(cat.get("X"))
+        import sqlite3
+        ext = sqlite3.connect(self.dir / "catalog.db")
+        ext.execute("INSERT INTO products (sku, product) VALUES ('NOPE', 'Pan')"); ext.commit(); ext.close()
+        self.assertIsNone(cat.get("NOPE"))
+        lg.poll_external()  # 'reload' de otro proceso vacía el LRU
+        self.assertEqual(cat.get("NOPE")["product"], "Pan")
+        st = cat.cache_stats()
+        self.assertGreaterEqual(st["hits"], 3)
+        self.assertGreater(st["hit_ratio"], 0)
+    def test_change_events(self):
+        lg = ScanLogger(db_dir=self.dir, scrape=offline_scrape)
+        v0 = lg.bus.version
+        lg.log_input("A"); lg.log_output("B")
+        lg.enricher.join()
+        events = [(t, op) for _, t, op, _ in lg.bus.since(v0)[1] if t != "products"]  # products: enrichment
+        self.assertEqual(events, [("scans", "upsert"), ("stock", "upsert"), ("scans", "upsert")])
+        v1 = lg.bus.version
+        lg.undo_last()
+        self.assertEqual([(t, op, k) for _, t, op, k in lg.bus.since(v1)[1]][1], ("stock", "delete", "B"))
+        # escritura desde otra conexión (otro proceso) -> 'reload'
+        import sqlite3
+        ext = sqlite3.connect(self.dir / "stock.db"); ext.execute("DELETE FROM stock_level"); ext.commit(); ext.close()
+        v2 = lg.bus.version
+        self.assertTrue(lg.poll_external())
+        self.assertEqual(lg.bus.since(v2)[1][0][1:3], ("stock", "reload"))
+        lg.close()
+
+    def test_legacy_schema_migrates_online(self):
+        import sqlite3
+        sc = sqlite3.connect(self.dir / "scans.db")
+        sc.execute("""CREATE TABLE scans (id INTEGER PRIMARY KEY AUTOINCREMENT, sku TEXT, product TEXT, brand TEXT,
+                      category TEXT, image TEXT, url TEXT, mode TEXT, ts TEXT, value TEXT)""")
+        rows = [("A", "Arroz", "input"), ("A", "Arroz", "input"), ("B", None, "input"), ("A", "Arroz", "output"),
+                ("A", "Arroz", "set")]
+        sc.executemany("INSERT INTO scans (sku, product, mode, ts, value) VALUES (?,?,?,?,?)",
+                       [(sku, p, m, f"2024-01-0{i + 1} 10:00:00", "50|-1" if m == "set" else None)
+                        for i, (sku, p, m) in enumerate(rows)])
+        sc.commit(); sc.close()
+        st = sqlite3.connect(self.dir / "stock.db")
+        st.execute("CREATE TABLE stock (sku TEXT PRIMARY KEY, product TEXT, brand TEXT, category TEXT, image TEXT, url TEXT, qty INTEGER, percent INTEGER)")
+        st.executemany("INSERT INTO stock (sku, product, qty, percent) VALUES (?,?,?,?)", [("A", "Arroz", 0, 50), ("B", None, 1, 100)])
+        st.commit(); st.close()
+
+        lg = ScanLogger(db_dir=self.dir, migrate_batch=2, scrape=offline_scrape)
+        lg.log_input("C")  # escanear no espera a la migración
+        self.assertTrue(lg.migration.wait(10))
+        self.assertEqual(self.stock_of(lg, "A"), (0, 50))
+        self.assertEqual(lg.catalog.get("A")["product"], "Arroz")  # adoptado desde las filas viejas
+        last = lg.last(10)
+        self.assertEqual([(r[0], r[1], r[7]) for r in last[:3]], [(6, "C", "input"), (5, "A", "set"), (4, "A", "output")])
+        self.assertEqual((last[-1][2], last[-1][8]), ("Arroz", "2024-01-01 10:00:00"))
+        live = sorted(lg.stock.execute("SELECT sku, qty, percent FROM stock").fetchall())
+        lg.rebuild_stock()
+        self.assertEqual(sorted(lg.stock.execute("SELECT sku, qty, percent FROM stock").fetchall()), live)
+        lg.close()
+        lg = ScanLogger(db_dir=self.dir, scrape=offline_scrape)  # ya migrado: nada que mover
+        self.assertIsNone(lg.migration)
+        self.assertEqual(len(lg.last(10)), 6)
+        lg.close()
+
+    def test_stock_as_of_matches_history_up_to_date(self):
+        from barcode_lib import bulk
+        hist = [("A", "input", 1), ("A", "input", 2), ("A", "set", 3), ("A", "output", 4), ("B", "input", 5),
+                ("B", "input", 3)]  # la última llega importada después, con fecha vieja
+        rows = lambda upto: [{"sku": s, "mode": m, "ts": f"2024-01-0{d} 12:00:00", "value": "40" if m == "set" else None}
+                             for s, m, d in hist if d <= upto]
+        lg = ScanLogger(db_dir=self.dir / "live", snapshot_every=2, scrape=offline_scrape)
+        bulk.import_scans(lg, rows(9)[:5], rebuild=False)
+        self.assertEqual(lg.snapshots.snapshot(), 5)
+        bulk.import_scans(lg, rows(9)[5:], rebuild=False)
+        self.assertEqual(lg.snapshots.snapshot(), 6)
+        self.assertIsNone(lg.snapshots.snapshot())  # nada nuevo
+        for d in range(1, 6):
+            ref = ScanLogger(db_dir=self.dir / str(d), scrape=offline_scrape)
+            bulk.import_scans(ref, rows(d))
+            self.assertEqual(sorted(lg.stock_as_of(f"2024-01-0{d} 23:59:59")), sorted(ref.stock_table()), d)
+            ref.close()
+        lg.close()
+
+    def test_keyset_pages_walk_everything_both_ways(self):
+        from barcode_lib.db import pages
+        lg = ScanLogger(db_dir=self.dir, scrape=offline_scrape)
+        names = ["arroz", "Arroz", None, "fideos", "Azucar", None, "sal", "te", "Cafe", "cafe"]
+        for i, name in enumerate(names):
+            lg.upsert_product(f"P{i}", {"product": name, "brand": "B" if i % 2 else None})
+            for _ in range(i % 4):
+                lg.log_input(f"P{i}")
+        lg.log_input("UNKNOWN")  # stock sin fila en products
+        lg.log_set("P2", 50)
+        lg.enricher.join()
+        def walk(page, **kw):
+            rows = page(limit=3, **kw); out = list(rows)
+            while rows:
+                rows = page(after=pages.cursor(rows[-1]), limit=3, **kw); out += rows
+            back, rows = list(out[-1:]), [out[-1]]
+            while rows:
+                rows = page(after=pages.cursor(rows[0]), limit=3, back=True, **kw); back[:0] = rows
+            self.assertEqual(back, out)
+            return [r[0] for r in out]
+        live = lg.stock_table(1000)
+        for sort in pages.STOCK_SORTS:
+            for desc in (False, True):
+                want = [r[0] for r in pages.RowPages(live, sort, desc).page(limit=1000)]
+                self.assertEqual(walk(lg.stock_page, sort=sort, desc=desc), want, (sort, desc))
+        known = sorted(r[0] for r in lg.catalog.db.execute("SELECT sku FROM products"))
+        for sort in pages.CATALOG_SORTS:
+            for desc in (False, True):
+                self.assertEqual(sorted(walk(lg.catalog.page, sort=sort, desc=desc)), known, (sort, desc))
+        self.assertEqual(walk(lg.catalog.page, sort="product", desc=False, text="cafe"), ["P8", "P9"])
+        with self.assertRaises(ValueError):
+            lg.stock_page("qty")
+        lg.close()
+
+if __name__=='__main__': unittest.main()
@@ -1,59 +1,122 @@
 # test_main.py
 
-import unittest
-from unittest.mock import patch, MagicMock
-from src.main import init_db, main
+import unittest, tempfile, shutil, io, subprocess, sys, threading, queue
+from contextlib import redirect_stdout
+from pathlib import Path
+from barcode_lib.db.logger import ScanLogger
+from barcode_lib.reader import BarcodeReader
+from barcode_lib.bench import dispatch
+from barcode_lib import main, metrics
+from barcode_lib.dispatcher import Dispatcher
 
 class TestMain(unittest.TestCase):
-    @patch('src.main.sqlite3.connect')
-    def test_init_db(self, mock_connect):
-        # Arrange
-        expected_db_path = "scans.db"
-        
-        # Act
-        conn = init_db(expected_db_path)
-        
-        # Assert
-        mock_connect.assert_called_once_with(expected_db_path)
-        cursor = conn.cursor()
-        cursor.execute.assert_called_once_with("""
-            CREATE TABLE IF NOT EXISTS scans (
-                id        INTEGER PRIMARY KEY AUTOINCREMENT,
-                sku       TEXT    NOT NULL,
-                mode      TEXT    CHECK(mode IN ('input','output')) NOT NULL,
-                timestamp TEXT    NOT NULL
-            )
-        """)
-        conn.commit.assert_called_once()
-
-    @patch('src.main.sqlite3.connect')
-    def test_main(self, mock_connect):
-        # Arrange
-        expected_mode = "input"
-        
-        def mock_input(prompt):
-            if prompt.strip().lower() == "sku":
-                return "SKU12345"
-            elif prompt.strip().lower() == "exit":
-                return "exit"
-            else:
-                return ""
-        
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value = mock_conn
-        
-        with patch('builtins.input', side_effect=mock_input), patch('src.main.args', args=['--mode', 'input']):
-            main()
-        
-        # Assert
-        mock_cursor.execute.assert_has_calls([
-            unittest.mock.call("INSERT INTO scans (sku, mode, timestamp) VALUES (?, ?, ?)", ('SKU12345', expected_mode, unittest.mock.ANY)),
-            unittest.mock.call().commit(),
-            unittest.mock.call()
-        ])
-        mock_conn.close.assert_called_once()
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.lg = ScanLogger(db_dir=self.dir, scrape=dispatch.offline_scrape)
+        self.reader = BarcodeReader(logger=self.lg)
+    def tearDown(self):
+        self.lg.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def feed(self, *codes):
+        with redirect_stdout(io.StringIO()):
+            for code in codes:
+                self.reader._dispatch(code)
+
+    def test_dispatch_modes(self):
+        self.feed("A", "A", "B", "output", "A", "set", "B", "25%", "input", "C")
+        stock = {r[0]: (r[6], r[7]) for r in self.lg.stock_table()}
+        self.assertEqual(stock, {"A": (1, 100), "B": (0, 25), "C": (1, 100)})
+        self.assertEqual(self.reader.current_mode.__class__.__name__, "InputMode")
+        self.feed("back")
+        self.assertNotIn("C", {r[0] for r in self.lg.stock_table()})
+
+    def test_set_mode_command_bypass(self):
+        self.feed("A", "set", "A", "output", "A")  # 'output' a mitad del par no es un porcentaje
+        self.assertEqual(self.reader.current_mode.__class__.__name__, "OutputMode")
+        self.assertEqual([(r[6], r[7]) for r in self.lg.stock_table()], [(0, 100)])
+
+    def test_dispatcher_batches_in_order(self):
+        batches = []
+        d = Dispatcher(self.reader, on_batch=batches.append)
+        for code in ["A"] * 50 + ["output"] + ["A"] * 10 + ["set", "B", "25%", "input", "C"]:
+            d.post(code)  # encolado antes de arrancar: los lotes son deterministas
+        with redirect_stdout(io.StringIO()):
+            d.start(); d.join()
+        self.assertEqual(batches, [50, 1, 10, 1, 1, 1, 1, 1])
+        stock = {r[0]: (r[6], r[7]) for r in self.lg.stock_table()}
+        self.assertEqual(stock, {"A": (40, 100), "B": (0, 25), "C": (1, 100)})
+        with redirect_stdout(io.StringIO()):
+            d.call(self.reader.undo_last, 11); d.join()
+        self.assertEqual({r[0]: r[6] for r in self.lg.stock_table()}["A"], 49)  # undo por escaneo, no por lote
+        d.stop()
+
+    def test_gui_catalog_edit_goes_through_dispatcher(self):
+        from PIL import Image
+        from barcode_lib import gui
+        d = Dispatcher(self.reader).start()
+        res = queue.Queue()
+        save = lambda sku, info: gui.save_product(d, sku, info, done=lambda: res.put(threading.current_thread().name),
+                                                  failed=lambda msg: res.put("failed"))
+        save("A", {"product": "Arroz", "brand": "Tucapel"})
+        self.assertEqual(res.get(timeout=10), "dispatcher")  # en el hilo del actor, no en el de Tk
+        (self.dir / "no.png").write_text("no es una imagen")
+        save("A", {"product": "Otro", "image": str(self.dir / "no.png")})
+        self.assertEqual(res.get(timeout=10), "failed")
+        self.assertEqual(self.lg.catalog.get("A")["product"], "Arroz")
+        # la imagen del formulario (archivo o URL del autofill) llega al almacén por upsert_product
+        Image.new("RGB", (40, 40), "red").save(self.dir / "b.png")
+        save("B", {"product": "Azúcar", "image": str(self.dir / "b.png")})
+        self.assertEqual(res.get(timeout=10), "dispatcher")
+        self.assertTrue(self.lg.catalog.get("B")["image"].startswith("sha256:"))
+        self.assertTrue(self.lg.enricher.join(10))
+        d.call(self.reader.undo_last, 2); d.join()  # deshacible como cualquier alta manual
+        self.assertIsNone(self.lg.catalog.get("A"))
+        self.assertIsNone(self.lg.catalog.get("B"))
+        self.assertTrue(self.lg.images.join(60))
+        d.stop()
+
+    def test_replay_matches_live_dispatch(self):
+        log = ["A"] * 30 + ["output", "A", "B", "set", "A", "40%", "rebuild_stock", "REBUILD", "input", "C", "C", "exit", "D"]
+        out = io.StringIO()
+        with redirect_stdout(out):
+            stats = main.replay(self.reader, io.StringIO("\n".join(log) + "\n"), batch=8)
+        self.assertEqual(out.getvalue(), "")  # ni escaneos ni la pregunta de rebuild_stock
+        self.assertFalse(self.reader.quiet or self.lg.defer_enrich)  # restaurados al terminar
+        self.assertEqual(self.lg.enricher.stats()["submitted"], 0)  # enrichment diferido
+        self.assertEqual((stats["codes"], stats["scans"], stats["commands"], stats["rejected"]), (41, 36, 5, 1))
+        self.assertTrue(stats["stopped"])
+        ref = ScanLogger(db_dir=self.dir / "ref", scrape=dispatch.offline_scrape)
+        self.reader, lg = BarcodeReader(logger=ref), self.lg
+        self.feed(*log[:log.index("rebuild_stock")], "input", "C", "C")
+        self.assertEqual(sorted(lg.stock_table()), sorted(ref.stock_table()))
+        self.assertEqual(len(lg.last(100)), len(ref.last(100)))
+        ref.close()
+
+    def test_metrics(self):
+        self.feed("A", "output", "A")
+        names = {(r[0], r[1]) for r in metrics.REGISTRY.rows()}
+        for key in [("dispatch_seconds", "kind=input"), ("dispatch_seconds", "kind=mode"),
+                    ("scanlogger_seconds", "method=log_output"), ("sqlite_commit_seconds", "db=scans")]:
+            self.assertIn(key, names)
+        prom = self.dir / "metrics.prom"
+        metrics.REGISTRY.write_prometheus(prom)
+        text = prom.read_text()
+        self.assertIn('barcode_dispatch_seconds_bucket{kind="input",le="+Inf"}', text)
+        self.assertIn("# TYPE barcode_dispatch_seconds histogram", text)
+
+    def test_no_gui_path_stays_light(self):
+        code = ("import sys, tempfile; from barcode_lib import main; from barcode_lib.db.logger import ScanLogger; "
+                "main.BarcodeReader(logger=ScanLogger(db_dir=tempfile.mkdtemp())); "
+                "print(','.join(m for m in ('tkinter', 'PIL', 'requests', 'tabulate', 'concurrent.futures.process', 'multiprocessing') if m in sys.modules))")
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), "")
+
+    def test_bench_smoke(self):
+        run = dispatch.run_size(300)
+        self.assertEqual(run["scans"], 300)
+        self.assertTrue(run["rebuild_matches_live"])
+        self.assertGreater(run["latency_ms"]["input"]["count"], 0)
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
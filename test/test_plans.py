@@ -0,0 +1,44 @@
+import unittest, tempfile, shutil, sqlite3, io
+from pathlib import Path
+from barcode_lib.db import migrate, plans
+from barcode_lib.db.logger import ScanLogger
+from barcode_lib.bench.dispatch import offline_scrape
+
+class T(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_hot_queries_use_indexes(self):
+        lg = ScanLogger(db_dir=self.dir, scrape=offline_scrape)
+        try:
+            results = plans.check(lg)
+            failed = plans.report(results, io.StringIO())
+            self.assertEqual(failed, [], "\n".join(f"{r[0]}: {r[3]}" for r in results if r[3]))
+            with lg.catalog.db.write() as c:
+                c.execute("DROP INDEX idx_products_updated_at")
+            self.assertEqual(plans.report(plans.check(lg), io.StringIO()), ["search_recent"])
+        finally:
+            lg.close()
+
+    def test_user_version_upgrades_and_refuses_newer(self):
+        c = sqlite3.connect(self.dir / "catalog.db")  # catálogo de antes de las versiones
+        c.execute("CREATE TABLE products (sku TEXT PRIMARY KEY, product TEXT, brand TEXT, category TEXT, image TEXT, url TEXT, updated_at TEXT)")
+        c.execute("INSERT INTO products (sku, product) VALUES ('A', 'Arroz')")
+        c.commit(); c.close()
+        lg = ScanLogger(db_dir=self.dir, scrape=offline_scrape)
+        self.assertEqual(lg.catalog.get("A")["product"], "Arroz")
+        for pool, steps in ((lg.catalog.db, migrate.CATALOG_STEPS), (lg.scans, migrate.SCANS_STEPS),
+                            (lg.stock, migrate.STOCK_STEPS)):
+            self.assertEqual(pool.execute("PRAGMA user_version").fetchone()[0], len(steps))
+        self.assertIsNotNone(lg.catalog.db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name='idx_products_updated_at'").fetchone())
+        with lg.stock.write() as c:
+            c.execute(f"PRAGMA user_version={len(migrate.STOCK_STEPS) + 1}")
+        lg.close()
+        with self.assertRaises(RuntimeError):
+            ScanLogger(db_dir=self.dir, scrape=offline_scrape)
+
+if __name__ == "__main__":
+    unittest.main()
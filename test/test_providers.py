@@ -0,0 +1,98 @@
+import unittest, threading, time, json
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from barcode_lib.web.http import HostRateLimiter, LimitedSession
+from barcode_lib.web.providers import CircuitBreaker, Provider, ProviderChain
+
+OFF = {"status": 1, "product": {"code": "780", "product_name": "Arroz grado 1", "brands": "Tucapel,Otra",
+                                "categories": "Alimentos, Arroces", "image_front_url": "http://img/arroz.jpg"}}
+PAGE = """<html><head><meta property="og:image" content="http://img/te.jpg">
+<script type="application/ld+json">{"@context": "https://schema.org", "@graph": [
+ {"@type": "BreadcrumbList"},
+ {"@type": "Product", "name": "Té verde", "brand": {"@type": "Brand", "name": "Supremo"}, "category": "Infusiones"}]}
+</script></head><body></body></html>"""
+
+class Fixture(BaseHTTPRequestHandler):
+    hits = Counter()
+    def do_GET(self):
+        kind = self.path.split("/")[1]
+        Fixture.hits[kind] += 1
+        status, body, ctype = 200, b"", "application/json"
+        if kind == "slow":           # completo, pero tarde
+            time.sleep(0.6); body = json.dumps(OFF).encode()
+        elif kind == "page":         # completo, HTML
+            body, ctype = PAGE.encode(), "text/html; charset=utf-8"
+        elif kind == "partial":      # solo nombre y marca
+            body = json.dumps({"items": [{"title": "Arroz", "brand": "Tucapel"}]}).encode()
+        elif kind == "rest":         # categoría e imagen (y otro nombre)
+            body = json.dumps({"items": [{"title": "Otro", "category": "Food > Rice", "images": ["http://img/a.jpg"]}]}).encode()
+        elif kind == "missing":
+            status = 404
+        else:                        # fail
+            status = 500
+        self.send_response(status); self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body))); self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *a): pass
+
+class T(unittest.TestCase):
+    def setUp(self):
+        Fixture.hits.clear()
+        self.srv = ThreadingHTTPServer(("127.0.0.1", 0), Fixture)
+        threading.Thread(target=self.srv.serve_forever, daemon=True).start()
+        self.session = LimitedSession(HostRateLimiter(0))
+    def tearDown(self):
+        self.srv.shutdown(); self.srv.server_close()
+
+    def provider(self, kind, parser, budget_ms=100, **kw):
+        return Provider(kind, f"http://127.0.0.1:{self.srv.server_port}/{kind}/{{code}}", parser, budget_ms, 2, **kw)
+
+    def test_hedged_request_wins_with_html_parsed_off_thread(self):
+        chain = ProviderChain([self.provider("slow", "openfoodfacts"), self.provider("page", "html")])
+        t = time.monotonic()
+        data = chain.lookup("780", self.session)
+        self.assertLess(time.monotonic() - t, 0.6)  # no esperó al lento
+        self.assertEqual(data["product"], "Té verde")
+        self.assertEqual((data["brand"], data["category"], data["image"]), ("Supremo", "Infusiones", "http://img/te.jpg"))
+        self.assertTrue(data["url"].endswith("/page/780"))
+        self.assertEqual((Fixture.hits["slow"], Fixture.hits["page"]), (1, 1))
+        # solo el lento, sin apuro: su respuesta también es completa
+        chain = ProviderChain([self.provider("slow", "openfoodfacts")])
+        self.assertEqual(chain.lookup("780", self.session)["brand"], "Tucapel")
+        chain.close()
+
+    def test_partials_merge_field_by_field(self):
+        chain = ProviderChain([self.provider("missing", "upcitemdb"), self.provider("partial", "upcitemdb"),
+                               self.provider("rest", "upcitemdb", budget_ms=0)])
+        data = chain.lookup("780", self.session)
+        self.assertEqual(data, {"product": "Arroz", "brand": "Tucapel", "category": "Rice", "image": "http://img/a.jpg"})
+        self.assertIsNone(ProviderChain([self.provider("missing", "upcitemdb")]).lookup("780", self.session))
+        self.assertEqual(chain.stats()["missing"], "closed")  # 404: no lo tiene, no es un error
+
+    def test_circuit_breaker_skips_failing_provider(self):
+        now = [0.0]
+        failing = self.provider("fail", "html", breaker=CircuitBreaker(failures=2, reset=30, clock=lambda: now[0]))
+        chain = ProviderChain([failing, self.provider("partial", "upcitemdb")])
+        for _ in range(4):
+            self.assertEqual(chain.lookup("780", self.session)["product"], "Arroz")
+        self.assertEqual(Fixture.hits["fail"], 2)
+        self.assertEqual(chain.stats()["fail"], "open")
+        now[0] = 31  # una sola prueba; falla y vuelve a abrir
+        chain.lookup("780", self.session); chain.lookup("780", self.session)
+        self.assertEqual(Fixture.hits["fail"], 3)
+        self.assertEqual(chain.stats()["fail"], "open")
+
+    def test_half_open_probe_not_lost_when_earlier_provider_wins(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failures=1, reset=30, clock=lambda: now[0])
+        breaker.failure()
+        now[0] = 31  # half-open
+        chain = ProviderChain([self.provider("page", "html", budget_ms=5000),
+                               self.provider("partial", "upcitemdb", breaker=breaker)])
+        self.assertEqual(chain.lookup("780", self.session)["product"], "Té verde")  # gana sin llegar al segundo
+        self.assertEqual(Fixture.hits["partial"], 0)
+        chain = ProviderChain([self.provider("partial", "upcitemdb", breaker=breaker)])
+        self.assertEqual(chain.lookup("780", self.session)["product"], "Arroz")
+        self.assertEqual((Fixture.hits["partial"], breaker.state), (1, "closed"))
+
+if __name__=='__main__': unittest.main()
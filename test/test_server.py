@@ -0,0 +1,101 @@
+import unittest, tempfile, shutil, asyncio, json, io
+from contextlib import redirect_stdout
+from pathlib import Path
+from barcode_lib.db.logger import ScanLogger
+from barcode_lib.server import IngestServer
+from barcode_lib.bench import server as bench
+from barcode_lib.bench.dispatch import offline_scrape
+
+class T(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.lg = ScanLogger(db_dir=self.dir, scrape=offline_scrape)
+        self.srv = IngestServer(self.lg, port=0, http_port=0, max_batch=8)
+        self.loop = bench.start_background(self.srv)
+    def tearDown(self):
+        bench.stop_background(self.srv, self.loop)
+        self.lg.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def stock(self):
+        return {r[0]: (r[6], r[7]) for r in self.lg.stock_table()}
+
+    def test_tcp_stations_keep_their_own_mode(self):
+        async def go():
+            a_r, a_w = await asyncio.open_connection("127.0.0.1", self.srv.port)
+            b_r, b_w = await asyncio.open_connection("127.0.0.1", self.srv.port)
+            a_w.write(b"STATION a\nA\nA\nset\nA\n")          # 'a' queda con SKU pendiente
+            b_w.write(b"STATION b\nB\nset\nB\n25%\noutput\nB\nB\n")
+            await a_w.drain(); await b_w.drain()
+            b = [(await b_r.readline()).decode().strip() for _ in range(8)]
+            a_w.write(b"50%\nexit\nQUIT\n")
+            a = [(await a_r.readline()).decode().strip() for _ in range(7)]
+            for w in (a_w, b_w):
+                w.close()
+            return a, b
+        a, b = asyncio.run(go())
+        self.assertEqual(a[:4], ["OK station a", "OK input", "OK input", "OK set"])
+        self.assertTrue(a[4].startswith("OK set [set] SKU A"))
+        self.assertTrue(a[5].startswith("OK set [set] A 50%"))
+        self.assertTrue(a[6].startswith("ERR set 'exit'"))
+        self.assertEqual(b[5:7], ["OK output", "OK output"])
+        self.assertTrue(b[7].startswith("WARN output [OutputMode] Warning: SKU B not in stock"))
+        self.assertEqual(self.stock(), {"A": (1, 50), "B": (0, 100)})
+
+    def test_station_cannot_undo_another_station(self):
+        async def go():
+            a_r, a_w = await asyncio.open_connection("127.0.0.1", self.srv.port)
+            b_r, b_w = await asyncio.open_connection("127.0.0.1", self.srv.port)
+            a_w.write(b"STATION a\nA\nA\n"); await a_w.drain()
+            a = [(await a_r.readline()).decode().strip() for _ in range(3)]
+            b_w.write(b"STATION b\nback\nredo\n0%*\n"); await b_w.drain()
+            b = [(await b_r.readline()).decode().strip() for _ in range(4)]
+            for w in (a_w, b_w):
+                w.close()
+            return a, b
+        a, b = asyncio.run(go())
+        self.assertEqual(a, ["OK station a", "OK input", "OK input"])
+        self.assertEqual([x.split()[0] for x in b], ["OK", "ERR", "ERR", "ERR"])
+        self.assertEqual(self.stock(), {"A": (2, 100)})
+
+    def test_idle_stations_are_evicted_quietly(self):
+        self.srv.max_stations = 2
+        async def go():
+            r, w = await asyncio.open_connection("127.0.0.1", self.srv.port)
+            w.write(b"STATION a\noutput\nSTATION b\nB\nSTATION c\nC\nSTATION a\nA\n"); await w.drain()
+            lines = [(await r.readline()).decode().strip() for _ in range(8)]
+            w.close()
+            return lines
+        out = io.StringIO()
+        with redirect_stdout(out):
+            lines = asyncio.run(go())
+        self.assertEqual(lines[-1], "OK input")  # 'a' fue desplazada: vuelve en modo input
+        self.assertEqual(sorted(self.srv.stations), ["a", "c"])
+        self.assertEqual(out.getvalue(), "")  # readers quiet, sin redirigir sys.stdout en el servidor
+
+    def test_http_batch_endpoint(self):
+        async def post(payload: bytes, ctype: str, target: str = "/scan"):
+            r, w = await asyncio.open_connection("127.0.0.1", self.srv.http_port)
+            req = (f"POST {target} HTTP/1.1\r\nContent-Type: {ctype}\r\nContent-Length: {len(payload)}\r\n"
+                   f"Connection: close\r\n\r\n").encode() + payload
+            w.write(req)
+            raw = await r.read()
+            w.close()
+            head, _, body = raw.partition(b"\r\n\r\n")
+            return int(head.split()[1]), json.loads(body)
+        status, res = asyncio.run(post(json.dumps({"station": "s1", "codes": ["A"] * 20 + ["output", "A"]}).encode(),
+                                       "application/json"))
+        self.assertEqual(status, 200)
+        self.assertEqual((res["station"], res["mode"], len(res["results"])), ("s1", "output", 22))
+        status, res = asyncio.run(post(b"A\nA\n", "text/plain", "/scan?station=s1"))
+        self.assertEqual([r["mode"] for r in res["results"]], ["output", "output"])  # mismo modo que dejó s1
+        self.assertEqual(self.stock()["A"], (17, 100))
+        self.assertEqual(asyncio.run(post(b"x" * 10, "text/plain", "/nope"))[0], 404)
+
+    def test_load_smoke(self):
+        run = bench.run(clients=4, scans=100, http_clients=2, http_batch=30)
+        self.assertTrue(run["stock_matches"])
+        self.assertEqual(run["status"].get("WARN", 0), 0)
+
+if __name__ == "__main__":
+    unittest.main()
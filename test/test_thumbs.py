@@ -0,0 +1,83 @@
+import unittest, tempfile, shutil, threading, queue, os, time
+from collections import Counter
+from pathlib import Path
+from PIL import Image
+from barcode_lib.thumbs import ThumbnailLoader
+
+class T(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.done = queue.Queue()
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def picture(self, name, color="red") -> str:
+        path = self.dir / f"{name}.png"
+        Image.new("RGB", (120, 80), color).save(path, "PNG")
+        return str(path)
+
+    def loader(self, **kw) -> ThumbnailLoader:
+        lt = ThumbnailLoader(self.dir / "cache", size=(32, 32), workers=2, **kw)
+        self.addCleanup(lt.shutdown)
+        return lt
+
+    def load(self, lt, src):
+        lt.request(src, lambda s, im: self.done.put((s, im)))
+        return self.done.get(timeout=5)[1]
+
+    def disk(self):
+        return sorted((self.dir / "cache").glob("*.png"))
+
+    def test_memory_lru(self):
+        lt = self.loader(mem_items=2)
+        a, b, c = (self.picture(n, col) for n, col in zip("abc", ("red", "green", "blue")))
+        self.assertEqual(self.load(lt, a).size, (32, 32))
+        self.load(lt, b)
+        lt.cached(a)  # 'a' pasa a ser la más reciente
+        self.load(lt, c)
+        self.assertIsNotNone(lt.cached(a))
+        self.assertIsNone(lt.cached(b))
+        self.assertIsNotNone(lt.cached(c))
+        self.assertIsNone(self.load(lt, str(self.dir / "no.png")))
+
+    def test_concurrent_requests_share_one_load(self):
+        lt = self.loader()
+        src = self.picture("a")
+        gate, calls, fetch = threading.Event(), Counter(), lt._fetch
+        def slow(s):
+            calls[s] += 1
+            gate.wait(5)
+            return fetch(s)
+        lt._fetch = slow
+        for _ in range(3):
+            lt.request(src, lambda s, im: self.done.put(im))
+        gate.set()
+        ims = [self.done.get(timeout=5) for _ in range(3)]
+        self.assertEqual(calls[src], 1)
+        self.assertTrue(all(im is ims[0] for im in ims))
+
+    def test_disk_cache_bounded_by_size(self):
+        first = self.loader()
+        self.load(first, self.picture("x"))
+        one = self.disk()[0].stat().st_size
+        shutil.rmtree(self.dir / "cache")
+        lt = self.loader(disk_bytes=int(one * 2.5))
+        a, b, c = (self.picture(n, col) for n, col in zip("abc", ("red", "green", "blue")))
+        now = time.time()
+        for i, src in enumerate((a, b)):
+            self.load(lt, src)
+            for p in self.disk():
+                if os.path.getmtime(p) > now - 10:
+                    os.utime(p, (now - 100 + i, now - 100 + i))  # a más vieja que b
+        oldest = min(self.disk(), key=os.path.getmtime)
+        self.load(lt, c)  # pasa el tope: se borra la más vieja (a)
+        self.assertEqual(len(self.disk()), 2)
+        self.assertNotIn(oldest, self.disk())
+        self.assertEqual(lt._disk_used, sum(p.stat().st_size for p in self.disk()))
+        # al reabrir cuenta lo que ya está en disco; reescribir una que ya está no la cuenta dos veces
+        big = self.loader()
+        self.assertEqual(big._disk_used, lt._disk_used)
+        big._store(c, Image.new("RGBA", (32, 32), "blue"))
+        self.assertEqual(big._disk_used, sum(p.stat().st_size for p in self.disk()))
+
+if __name__=='__main__': unittest.main()